@@ -1,5 +1,6 @@
+import uuid
 from django.contrib import admin
-from bookings.models import Booking
+from bookings.models import Booking, Admission
 
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
@@ -13,7 +14,10 @@ class BookingAdmin(admin.ModelAdmin):
         'created_at',
     ]
     list_filter = ['payment_status', 'created_at', 'showtime__movie']
-    search_fields = ['booking_reference', 'customer_name', 'customer_email']
+    # see get_search_results, the lookups are picked from the shape of the search term
+    search_fields = ['booking_reference', 'customer_email', 'customer_name']
+    # no COUNT(*) over the whole table on every page, only the filtered count is shown
+    show_full_result_count = False
     readonly_fields = ['booking_reference', 'created_at', 'updated_at']
     
     def get_queryset(self, request):
@@ -22,4 +26,25 @@ class BookingAdmin(admin.ModelAdmin):
             'showtime__movie',
             'showtime__room',
             'showtime__room__cinema'
-        )
\ No newline at end of file
+        )
+    
+    def get_search_results(self, request, queryset, search_term):
+        # the default '=' / '^' lookups compare UPPER(column::text) which no index covers on postgres. a uuid
+        # term is an exact reference lookup (unique index), an email goes through booking_email_upper_idx and
+        # anything else is a name prefix, the only search left that scans (paged, no full count)
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        try:
+            return queryset.filter(booking_reference=uuid.UUID(term)), False
+        except ValueError:
+            pass
+        if '@' in term:
+            return queryset.filter(customer_email__iexact=term), False
+        return queryset.filter(customer_name__istartswith=term), False
+
+@admin.register(Admission)
+class AdmissionAdmin(admin.ModelAdmin):
+    list_display = ['booking', 'showtime', 'device', 'admitted_at']
+    list_filter = ['device', 'admitted_at']
+    raw_id_fields = ['booking', 'showtime']
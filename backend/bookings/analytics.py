@@ -0,0 +1,222 @@
+import datetime
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+from showtimes.models import Showtime
+from showtimes.seatmap import seat_indexes
+from bookings.models import Booking
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+OPEN_PERIOD_CACHE_TTL = 60  # seconds, periods that are not over yet still change
+MAX_REPORT_DAYS = 366
+
+
+# OCCUPANCY ANALYTICS
+# seat states are read straight from the packed seats_bitmap column (no json decoding): all showtimes of a
+# room on the same layout version share one layout so their bitmaps stack into a (showtimes x seats) boolean
+# matrix with np.unpackbits and every report below is a vectorized sum over that matrix or a bincount over
+# the per showtime totals. shows that were over before the room was resized keep the bitmap of their old
+# layout (showtimes/layouts.py), they are decoded with their own seat count (booked + available) and count
+# in the totals but not in the seat heatmaps, the old grid is not known anymore.
+# reports for periods that are over never change again so they are cached forever
+class _RoomMatrix:
+    def __init__(self, room_id, room_name, cinema_id, capacity, seats_per_row, current=True):
+        self.room_id = room_id
+        self.room_name = room_name
+        self.cinema_id = cinema_id
+        self.capacity = capacity
+        self.seats_per_row = seats_per_row
+        self.current = current  # on the room's current layout, False for showtimes of an older one
+        self.seat_indexes = seat_indexes(capacity, seats_per_row) if current else {}
+        self.showtime_ids = []
+        self.movie_ids = []
+        self.weekdays = []
+        self.hours = []
+        self.bitmaps = []
+
+    @property
+    def row_count(self):
+        return -(-self.capacity // self.seats_per_row)
+
+    def booked_matrix(self):
+        width = (self.capacity + 7) // 8
+        packed = np.frombuffer(
+            b"".join(bytes(bitmap or b"").ljust(width, b"\0")[:width] for bitmap in self.bitmaps),
+            dtype=np.uint8,
+        ).reshape(len(self.bitmaps), width)
+        return np.unpackbits(packed, axis=1, bitorder="little")[:, :self.capacity].astype(bool)
+
+    def as_rows(self, values):
+        """seat vector -> list of seat rows as laid out in the room, None for the gap after the last seat"""
+        padded = np.full(self.row_count * self.seats_per_row, np.nan)
+        padded[:self.capacity] = values
+        return [
+            [None if np.isnan(value) else round(float(value), 4) for value in row]
+            for row in padded.reshape(self.row_count, self.seats_per_row)
+        ]
+
+
+def _load_rooms(showtimes):
+    """{(room id, layout version): _RoomMatrix}, {movie id: title}"""
+    rooms = {}
+    movie_titles = {}
+    for row in showtimes.values_list(
+        "id", "room_id", "room__name", "room__cinema_id", "room__capacity", "room__seats_per_row",
+        "room__layout_version", "layout_version", "seats_booked", "seats_available",
+        "movie_id", "movie__title", "show_date", "show_time", "seats_bitmap",
+    ).order_by("room_id", "layout_version", "id").iterator(chunk_size=2000):
+        (
+            showtime_id, room_id, room_name, cinema_id, capacity, per_row, room_version, version, seats_booked,
+            seats_available, movie_id, title, show_date, show_time, bitmap,
+        ) = row
+        room = rooms.get((room_id, version))
+        if room is None:
+            if version == room_version:
+                room = _RoomMatrix(room_id, room_name, cinema_id, capacity, per_row)
+            else:
+                room = _RoomMatrix(room_id, room_name, cinema_id, seats_booked + seats_available, None, current=False)
+            rooms[room_id, version] = room
+        room.showtime_ids.append(showtime_id)
+        room.movie_ids.append(movie_id)
+        room.weekdays.append(show_date.weekday())
+        room.hours.append(show_time.hour)
+        room.bitmaps.append(bitmap)
+        movie_titles[movie_id] = title
+    return rooms, movie_titles
+
+
+def _first_sold(showtimes, rooms):
+    """
+    per room and seat the average share of the house that was already sold when the seat was booked,
+    0 means it goes in the first booking and 1 means it is the last seat left: low values sell first
+    """
+    current_rooms = {room.room_id: room for room in rooms.values() if room.current}
+    room_of = {showtime_id: room for room in current_rooms.values() for showtime_id in room.showtime_ids}
+    entries = {room_id: ([], []) for room_id in current_rooms}
+
+    current_showtime = None
+    sold_before = 0
+    for showtime_id, seats in Booking.objects.filter(
+        showtime__in=showtimes,
+        payment_status=Booking.PAYMENT_STATUS_PAID,
+    ).order_by("showtime_id", "created_at", "id").values_list("showtime_id", "seats").iterator(chunk_size=2000):
+        if showtime_id != current_showtime:
+            current_showtime = showtime_id
+            sold_before = 0
+        room = room_of.get(showtime_id)
+        if room is None:
+            continue  # seat codes of an older layout
+        indexes, ranks = entries[room.room_id]
+        rank = sold_before / room.capacity
+        for seat in seats:
+            if seat in room.seat_indexes:
+                indexes.append(room.seat_indexes[seat])
+                ranks.append(rank)
+        sold_before += len(seats)
+
+    result = {}
+    for room_id, (indexes, ranks) in entries.items():
+        sums = np.zeros(current_rooms[room_id].capacity)
+        counts = np.zeros(current_rooms[room_id].capacity)
+        np.add.at(sums, indexes, ranks)
+        np.add.at(counts, indexes, 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result[room_id] = np.where(counts > 0, sums / counts, np.nan)
+    return result
+
+
+def _group(keys, booked, capacity, labels=None):
+    """load factor per distinct key, one bincount per measure instead of a python loop over showtimes"""
+    if not len(keys):
+        return []
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    showtimes = np.bincount(inverse)
+    sold = np.bincount(inverse, weights=booked)
+    seats = np.bincount(inverse, weights=capacity)
+    return [
+        {
+            "key": key.item(),
+            "label": labels.get(key.item()) if labels else None,
+            "showtimes": int(showtimes[position]),
+            "seats_sold": int(sold[position]),
+            "seats": int(seats[position]),
+            "occupancy": round(float(sold[position] / seats[position]), 4) if seats[position] else 0.0,
+        }
+        for position, key in enumerate(unique_keys)
+    ]
+
+
+def occupancy_report(date_from, date_to, cinema_id=None, room_id=None, movie_id=None):
+    """occupancy by weekday, hour, room and movie plus a sold-rate and sell-order heatmap per room"""
+    showtimes = Showtime.objects.filter(
+        show_date__gte=date_from,
+        show_date__lte=date_to,
+        room__capacity__gt=0,
+        room__seats_per_row__gt=0,
+    )
+    if cinema_id:
+        showtimes = showtimes.filter(room__cinema_id=cinema_id)
+    if room_id:
+        showtimes = showtimes.filter(room_id=room_id)
+    if movie_id:
+        showtimes = showtimes.filter(movie_id=movie_id)
+
+    rooms, movie_titles = _load_rooms(showtimes)
+    first_sold = _first_sold(showtimes, rooms)
+
+    booked, capacity, heatmaps = [], [], []
+    for room in rooms.values():
+        matrix = room.booked_matrix()
+        booked.append(matrix.sum(axis=1))
+        capacity.append(np.full(len(room.showtime_ids), room.capacity))
+        if not room.current:
+            continue
+        heatmaps.append({
+            "room": room.room_id,
+            "room_name": room.room_name,
+            "cinema": room.cinema_id,
+            "showtimes": len(room.showtime_ids),
+            "seats_per_row": room.seats_per_row,
+            "rows": [chr(65 + row) for row in range(room.row_count)],
+            "sold_rate": room.as_rows(matrix.mean(axis=0)),
+            "first_sold": room.as_rows(first_sold[room.room_id]),
+        })
+
+    def per_showtime(attribute):
+        return np.array([value for room in rooms.values() for value in getattr(room, attribute)], dtype=np.int64)
+
+    booked = np.concatenate(booked) if booked else np.zeros(0, dtype=np.int64)
+    capacity = np.concatenate(capacity) if capacity else np.zeros(0, dtype=np.int64)
+    room_keys = np.concatenate([np.full(len(room.showtime_ids), room.room_id) for room in rooms.values()] or [np.zeros(0, dtype=np.int64)])
+    total_sold = int(booked.sum())
+    total_seats = int(capacity.sum())
+
+    return {
+        "from": date_from,
+        "to": date_to,
+        "showtimes": len(booked),
+        "seats_sold": total_sold,
+        "seats": total_seats,
+        "occupancy": round(total_sold / total_seats, 4) if total_seats else 0.0,
+        "by_weekday": _group(per_showtime("weekdays"), booked, capacity, dict(enumerate(WEEKDAYS))),
+        "by_hour": _group(per_showtime("hours"), booked, capacity),
+        "by_room": _group(room_keys, booked, capacity, {room.room_id: room.room_name for room in rooms.values()}),
+        "by_movie": _group(per_showtime("movie_ids"), booked, capacity, movie_titles),
+        "heatmaps": heatmaps,
+    }
+
+
+def get_occupancy_report(date_from, date_to, cinema_id=None, room_id=None, movie_id=None):
+    """cached occupancy_report, forever once the period is over"""
+    cache_key = f"occupancy-report:{date_from}:{date_to}:{cinema_id}:{room_id}:{movie_id}"
+    report = cache.get(cache_key)
+    if report is None:
+        report = occupancy_report(date_from, date_to, cinema_id, room_id, movie_id)
+        finished = date_to < timezone.localdate()
+        cache.set(cache_key, report, None if finished else OPEN_PERIOD_CACHE_TTL)
+    return report
+
+
+def default_period(days=30):
+    today = timezone.localdate()
+    return today - datetime.timedelta(days=days), today
@@ -1,9 +1,17 @@
 from rest_framework import serializers
+from django.urls import reverse
 from bookings.models import Booking
+from showtimes.models import Showtime
+from showtimes.holds import get_held_seats
 
 class BookingSerializer(serializers.ModelSerializer):
+    # everything the response (showtime_details) needs comes in with the one showtime lookup of validation
+    showtime = serializers.PrimaryKeyRelatedField(
+        queryset=Showtime.objects.select_related('movie__genre', 'room__cinema')
+    )
     showtime_details = serializers.SerializerMethodField()
     qr_code_url = serializers.SerializerMethodField()
+    hold_token = serializers.UUIDField(write_only=True, required=False)
     
     class Meta:
         model = Booking
@@ -26,6 +34,7 @@ class BookingSerializer(serializers.ModelSerializer):
             'created_at',
             'expires_at',
             'qr_code_url',
+            'hold_token',
         ]
         read_only_fields = [
             'booking_reference',
@@ -45,9 +54,8 @@ class BookingSerializer(serializers.ModelSerializer):
         return ShowtimeDetailSerializer(obj.showtime).data
     
     def get_qr_code_url(self, obj):
-        if obj.qr_code:
-            return obj.qr_code.url
-        return None
+        # rendered on demand from the signed ticket token, nothing is stored anymore
+        return reverse('booking-qr', kwargs={'booking_reference': obj.booking_reference})
     
     def validate_seats(self, value):
         if not value or not isinstance(value, list):
@@ -56,6 +64,9 @@ class BookingSerializer(serializers.ModelSerializer):
         if len(value) == 0:
             raise serializers.ValidationError("At least one seat must be selected.")
         
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError("Each seat can only be selected once.")
+        
         return value
     
     def validate(self, data):
@@ -63,17 +74,84 @@ class BookingSerializer(serializers.ModelSerializer):
         seats = data.get('seats', [])
         
         if showtime and seats:
-            # check if seats are available
-            available_seats = [
-                seat_code for seat_code, seat_info in showtime.seats_data.items()
-                if seat_info.get('available', True)
+            # quick pre-check only, the seats are claimed atomically under a row lock
+            # when the booking is created (see showtimes/reservations.py)
+            indexes = showtime.get_seat_indexes()
+            bitmap = showtime.get_seat_bitmap()
+            unavailable_seats = [
+                seat for seat in seats
+                if seat not in indexes or bitmap.is_booked(indexes[seat])
             ]
             
-            unavailable_seats = [seat for seat in seats if seat not in available_seats]
+            # seats held by another customer count as taken, seats under our own hold are fine
+            unavailable_seats += sorted(
+                get_held_seats(showtime.id, seats, exclude_token=data.get('hold_token'))
+                - set(unavailable_seats)
+            )
             
             if unavailable_seats:
                 raise serializers.ValidationError({
                     'seats': f"Seats {unavailable_seats} are not available."
                 })
         
-        return data
\ No newline at end of file
+        return data
+
+
+class BookingListSerializer(serializers.ModelSerializer):
+    """flat row for the staff booking list, no seat map so a page stays small"""
+    showtime_date = serializers.DateField(source='showtime.show_date', read_only=True)
+    showtime_time = serializers.TimeField(source='showtime.show_time', read_only=True)
+    movie_title = serializers.CharField(source='showtime.movie.title', read_only=True)
+    cinema_name = serializers.CharField(source='showtime.room.cinema.name', read_only=True)
+    room_name = serializers.CharField(source='showtime.room.name', read_only=True)
+    
+    class Meta:
+        model = Booking
+        fields = [
+            'id',
+            'booking_reference',
+            'showtime',
+            'showtime_date',
+            'showtime_time',
+            'movie_title',
+            'cinema_name',
+            'room_name',
+            'customer_name',
+            'customer_email',
+            'customer_phone',
+            'seats',
+            'number_of_tickets',
+            'total_amount',
+            'payment_status',
+            'payment_method',
+            'payment_reference',
+            'created_at',
+        ]
+        read_only_fields = fields
+
+
+class CheckInScanSerializer(serializers.Serializer):
+    token = serializers.CharField(max_length=100)
+    scanned_at = serializers.DateTimeField(required=False)  # scan time on the device for offline syncs
+
+
+class CheckInSerializer(serializers.Serializer):
+    showtime = serializers.IntegerField()
+    device = serializers.CharField(max_length=50, required=False, allow_blank=True, default='')
+    # a single live scan or a batch of scans synced from a scanner
+    token = serializers.CharField(max_length=100, required=False)
+    scans = CheckInScanSerializer(many=True, required=False)
+    
+    def validate(self, data):
+        scans = data.get('scans') or []
+        if data.get('token'):
+            scans = [{'token': data['token']}] + scans
+        
+        if not scans:
+            raise serializers.ValidationError("Provide a token or a list of scans.")
+        
+        if len(scans) > 500:
+            raise serializers.ValidationError({'scans': "Sync at most 500 scans per request."})
+        
+        data['scans'] = scans
+        return data
@@ -0,0 +1,64 @@
+import uuid
+import datetime
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from bookings.models import Booking
+from showtimes.api.v1.services import parse_positive_int_param
+
+
+def parse_date_param(value, name):
+    if value is None:
+        return None
+
+    try:
+        return datetime.date.fromisoformat(value.strip())
+    except ValueError:
+        raise ValidationError({name: f"{name} must be a date in YYYY-MM-DD format"})
+
+
+def _start_of_day(date):
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+
+
+# staff booking search, every filter is an indexed equality or range predicate so it stays fast with
+# millions of rows: no icontains and no __date (a date range becomes a created_at range on the index)
+def filter_bookings(queryset, params):
+    showtime_id = parse_positive_int_param(params.get("showtime"), "showtime")
+    movie_id = parse_positive_int_param(params.get("movie"), "movie")
+    cinema_id = parse_positive_int_param(params.get("cinema"), "cinema")
+    created_from = parse_date_param(params.get("created_from"), "created_from")
+    created_to = parse_date_param(params.get("created_to"), "created_to")
+    payment_status = params.get("status")
+    email = params.get("email")
+    reference = params.get("reference")
+
+    if showtime_id:
+        queryset = queryset.filter(showtime_id=showtime_id)
+    if movie_id:
+        queryset = queryset.filter(showtime__movie_id=movie_id)
+    if cinema_id:
+        queryset = queryset.filter(showtime__room__cinema_id=cinema_id)
+
+    if payment_status:
+        if payment_status not in dict(Booking.PAYMENT_STATUS_CHOICES):
+            raise ValidationError({"status": f"status must be one of {', '.join(dict(Booking.PAYMENT_STATUS_CHOICES))}"})
+        queryset = queryset.filter(payment_status=payment_status)
+
+    # both ends are dates and created_to is inclusive
+    if created_from:
+        queryset = queryset.filter(created_at__gte=_start_of_day(created_from))
+    if created_to:
+        queryset = queryset.filter(created_at__lt=_start_of_day(created_to + datetime.timedelta(days=1)))
+
+    # case insensitive exact match, backed by the upper(customer_email) index
+    if email:
+        queryset = queryset.filter(customer_email__iexact=email.strip())
+
+    if reference:
+        try:
+            reference = uuid.UUID(reference.strip())
+        except ValueError:
+            raise ValidationError({"reference": "reference must be a booking reference uuid"})
+        queryset = queryset.filter(booking_reference=reference)
+
+    return queryset
@@ -1,16 +1,32 @@
 from django.urls import path
 from .views import (
-    BookingCreateView,
+    BookingListCreateView,
     BookingDetailView,
     DownloadTicketView,
     BookingOverviewView,
     BookingSummaryView,
+    RenderStatsView,
+    OccupancyReportView,
+    BookingTimeSeriesView,
+    TicketExportView,
+    BookingExportView,
+    BookingQRCodeView,
+    CheckInView,
+    CheckInManifestView,
 )
 
 urlpatterns = [
-    path('bookings/', BookingCreateView.as_view(), name='booking-create'),
+    path('bookings/', BookingListCreateView.as_view(), name='booking-list-create'),
     path('bookings/<uuid:booking_reference>/', BookingDetailView.as_view(), name='booking-detail'),
     path('bookings/<uuid:booking_reference>/download-ticket/', DownloadTicketView.as_view(), name='download-ticket'),
+    path('bookings/<uuid:booking_reference>/qr/', BookingQRCodeView.as_view(), name='booking-qr'),
     path('bookings/overview/', BookingOverviewView.as_view(), name='booking-overview'),
     path('bookings/summary/', BookingSummaryView.as_view(), name='booking-summary'),
+    path('bookings/export/', BookingExportView.as_view(), name='booking-export'),
+    path('bookings/tickets/export/', TicketExportView.as_view(), name='booking-ticket-export'),
+    path('bookings/checkin/', CheckInView.as_view(), name='booking-checkin'),
+    path('bookings/checkin/manifest/<int:showtime_id>/', CheckInManifestView.as_view(), name='booking-checkin-manifest'),
+    path('bookings/timeseries/', BookingTimeSeriesView.as_view(), name='booking-timeseries'),
+    path('bookings/analytics/occupancy/', OccupancyReportView.as_view(), name='booking-occupancy-report'),
+    path('bookings/render-stats/', RenderStatsView.as_view(), name='booking-render-stats'),
 ]
\ No newline at end of file
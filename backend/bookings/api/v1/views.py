@@ -2,25 +2,100 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from bookings.models import Booking
-from bookings.api.v1.serializers import BookingSerializer
-from config.permissions import AllowAny
-from config.throttles import PublicEndpointThrottle
-from django.http import HttpResponse
-from xhtml2pdf import pisa
-from django.template.loader import render_to_string
-from io import BytesIO
-from django.db.models import Sum, Count
+from bookings.api.v1.serializers import BookingSerializer, BookingListSerializer, CheckInSerializer
+from bookings.api.v1.services import filter_bookings, parse_date_param
+from bookings.analytics import get_occupancy_report, default_period, MAX_REPORT_DAYS
+from bookings.timeseries import revenue_timeseries, GRANULARITIES, GROUP_FIELDS, MAX_DAYS
+from showtimes.api.v1.services import parse_positive_int_param
+from showtimes.holds import release_hold
+from bookings.rendering import render_stats
+from bookings.exports import get_export_bookings, stream_tickets_zip, BOOKING_EXPORT_FORMATS
+from bookings.qr import render_qr_png, render_qr_svg
+from bookings.checkin import check_in, export_manifest
+from bookings.rollups import get_overview, get_summary
+from bookings.idempotency import (
+    get_idempotency_key,
+    request_fingerprint,
+    begin_request,
+    finish_request,
+    abandon_request,
+    replay_response,
+    IdempotencyKeyReused,
+)
+from config.permissions import AllowAny, StaffUserOnly
+from config.throttles import PublicEndpointThrottle, AdminOperationThrottle
+from config.pagination import KeysetPagination
+import uuid
 from django.utils import timezone
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
 from rest_framework.permissions import IsAuthenticated
 
-class BookingCreateView(APIView):
-    permission_classes = [AllowAny]
-    throttle_classes = [PublicEndpointThrottle]
+class BookingPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
+    page_size = 25
+    max_page_size = 200
+
+
+class BookingListCreateView(APIView):
+    def get_throttles(self):
+        if self.request.method == 'GET':
+            return [AdminOperationThrottle()]
+        return [PublicEndpointThrottle()]
+    
+    def get_permissions(self):
+        if self.request.method == 'GET':
+            return [StaffUserOnly()]
+        return [AllowAny()]
+    
+    def get(self, request):
+        """staff booking search, newest first with keyset pagination (?cursor= from the next link)"""
+        bookings = filter_bookings(
+            Booking.objects.select_related('showtime__movie', 'showtime__room__cinema'),
+            request.query_params,
+        )
+        
+        paginator = BookingPagination()
+        page = paginator.paginate_queryset(bookings, request)
+        serializer = BookingListSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
     
     def post(self, request):
+        idempotency_key = get_idempotency_key(request)
+        if not idempotency_key:
+            return self.create_booking(request)
+        
+        # retries with the same Idempotency-Key replay the first response instead of booking again
+        fingerprint = request_fingerprint(request.data)
+        stored = begin_request('booking-create', idempotency_key, fingerprint)
+        if stored:
+            return replay_response(stored)
+        
+        try:
+            # the cache can lose a finished key (eviction, restart), the booking row still has it
+            booking = Booking.objects.select_related(
+                'showtime__movie__genre',
+                'showtime__room__cinema',
+            ).filter(idempotency_key=idempotency_key).first()
+            if booking:
+                # bookings made before the fingerprint was stored have none, they are replayed as is
+                if booking.idempotency_fingerprint and booking.idempotency_fingerprint != fingerprint:
+                    raise IdempotencyKeyReused()
+                response = self.created_response(booking, booking.payment_response())
+                response['Idempotent-Replayed'] = 'true'
+            else:
+                response = self.create_booking(request, idempotency_key, fingerprint)
+        except Exception:
+            abandon_request('booking-create', idempotency_key)
+            raise
+        
+        finish_request('booking-create', idempotency_key, fingerprint, response)
+        return response
+    
+    def create_booking(self, request, idempotency_key=None, fingerprint=''):
         serializer = BookingSerializer(data=request.data)
         
         if serializer.is_valid():
+            hold_token = serializer.validated_data.pop('hold_token', None)
             showtime = serializer.validated_data['showtime']
             seats = serializer.validated_data['seats']
             total_amount = showtime.ticket_price * len(seats)
@@ -28,17 +103,25 @@ class BookingCreateView(APIView):
             booking, payment_result = Booking.create_booking(
                 **serializer.validated_data,
                 total_amount=total_amount,
-                payment_method=payment_method
+                payment_method=payment_method,
+                idempotency_key=idempotency_key,
+                idempotency_fingerprint=fingerprint,
             )
-            response_data = BookingSerializer(booking).data
-            response_data.update({
-                'payment_result': payment_result,
-                'message': 'Booking created and payment processed successfully'
-            })
             
-            return Response(response_data, status=status.HTTP_201_CREATED)
+            # seats are booked now so the temporary hold is not needed anymore
+            if hold_token:
+                release_hold(showtime.id, hold_token)
+            return self.created_response(booking, payment_result)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    def created_response(self, booking, payment_result):
+        response_data = BookingSerializer(booking).data
+        response_data.update({
+            'payment_result': payment_result,
+            'message': 'Booking created and payment processed successfully'
+        })
+        return Response(response_data, status=status.HTTP_201_CREATED)
 
 class BookingDetailView(APIView):
     permission_classes = [AllowAny]
@@ -61,7 +144,10 @@ class DownloadTicketView(APIView):
     
     def get(self, request, booking_reference):
         try:
-            booking = Booking.objects.get(booking_reference=booking_reference)
+            booking = Booking.objects.select_related(
+                'showtime__movie',
+                'showtime__room__cinema',
+            ).get(booking_reference=booking_reference)
             
             if booking.payment_status != Booking.PAYMENT_STATUS_PAID:
                 return Response(
@@ -69,92 +155,206 @@ class DownloadTicketView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # generate pdf using xhtml2pdf
-            context = {
-                'booking': booking,
-                'showtime': booking.showtime,
-                'movie': booking.showtime.movie,
-                'cinema': booking.showtime.room.cinema,
-                'room': booking.showtime.room,
-            }
-            
-            html_string = render_to_string('bookings/ticket_pdf.html', context)
-            
-            result = BytesIO()
-            pdf = pisa.pisaDocument(BytesIO(html_string.encode("UTF-8")), result)
-            
-            if not pdf.err:
-                response = HttpResponse(result.getvalue(), content_type='application/pdf')
-                response['Content-Disposition'] = f'attachment; filename="ticket_{booking_reference}.pdf"'
+            # the rendered pdf is stored and reused until something printed on the ticket changes
+            etag = f'"{booking.get_ticket_version()}"'
+            if request.headers.get('If-None-Match') == etag and booking.ticket_version:
+                response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+                response['ETag'] = etag
                 return response
-            else:
+            
+            ticket_pdf = booking.get_ticket_pdf()
+            if not ticket_pdf:
                 return Response(
                     {"error": "Failed to generate PDF ticket."},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
             
+            response = FileResponse(
+                ticket_pdf.open('rb'),
+                as_attachment=True,
+                filename=f'ticket_{booking_reference}.pdf',
+                content_type='application/pdf',
+            )
+            response['Content-Length'] = ticket_pdf.size
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+            
         except Booking.DoesNotExist:
             return Response(
                 {"error": "Booking not found."},
                 status=status.HTTP_404_NOT_FOUND
             )
         
+class BookingQRCodeView(APIView):
+    permission_classes = [AllowAny]
+    throttle_classes = [PublicEndpointThrottle]
+    
+    def get(self, request, booking_reference):
+        booking = Booking.objects.filter(
+            booking_reference=booking_reference,
+            payment_status=Booking.PAYMENT_STATUS_PAID,
+        ).only('booking_reference').first()
+        if not booking:
+            return Response(
+                {"error": "Booking not found."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        # ?format= is taken by drf content negotiation so the image type is picked with ?type=
+        if request.query_params.get('type', 'png').lower() == 'svg':
+            response = HttpResponse(render_qr_svg(booking.ticket_token), content_type='image/svg+xml')
+        else:
+            response = HttpResponse(render_qr_png(booking.ticket_token), content_type='image/png')
+        
+        # the token never changes for a booking so clients can keep the image
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
+
+class CheckInView(APIView):
+    permission_classes = [StaffUserOnly]
+    throttle_classes = [AdminOperationThrottle]
+    
+    def post(self, request):
+        # door scans: signed token verified in pure cpu against the cached showtime manifest (see bookings/checkin.py)
+        serializer = CheckInSerializer(data=request.data)
+        if serializer.is_valid():
+            results = check_in(
+                serializer.validated_data['showtime'],
+                serializer.validated_data['scans'],
+                device=serializer.validated_data['device'],
+            )
+            return Response({'results': results}, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class CheckInManifestView(APIView):
+    permission_classes = [StaffUserOnly]
+    throttle_classes = [AdminOperationThrottle]
+    
+    def get(self, request, showtime_id):
+        # compact list of valid tickets so door scanners keep working when the backend is slow
+        return Response(export_manifest(showtime_id), status=status.HTTP_200_OK)
+
+class TicketExportView(APIView):
+    permission_classes = [StaffUserOnly]
+    
+    def get(self, request):
+        # box office bulk printing: every paid ticket of a showtime and/or a list of booking references as one zip
+        showtime_id = request.query_params.get('showtime')
+        references = [ref.strip() for ref in request.query_params.get('references', '').split(',') if ref.strip()]
+        
+        if not showtime_id and not references:
+            return Response(
+                {"error": "Provide a showtime and/or references query parameter."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if showtime_id and not showtime_id.isdigit():
+            return Response({"showtime": "Showtime must be an id."}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            references = [uuid.UUID(ref) for ref in references]
+        except ValueError:
+            return Response({"references": "References must be booking reference UUIDs."}, status=status.HTTP_400_BAD_REQUEST)
+        
+        bookings = get_export_bookings(showtime_id=showtime_id, references=references)
+        if not bookings.exists():
+            return Response({"error": "No paid bookings found."}, status=status.HTTP_404_NOT_FOUND)
+        
+        filename = f'tickets_showtime_{showtime_id}.zip' if showtime_id else 'tickets.zip'
+        response = StreamingHttpResponse(stream_tickets_zip(bookings), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+class BookingExportView(APIView):
+    permission_classes = [StaffUserOnly]
+    throttle_classes = [AdminOperationThrottle]
+    
+    def get(self, request):
+        """
+        accounting dump streamed as ?type=csv (default) or ndjson, takes the staff booking list filters
+        e.g. ?created_from=2025-07-01&created_to=2025-07-31&status=paid
+        """
+        # ?format= is taken by drf content negotiation so the file type is picked with ?type=
+        export_type = request.query_params.get('type', 'csv').lower()
+        if export_type not in BOOKING_EXPORT_FORMATS:
+            return Response({"type": "type must be csv or ndjson"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        bookings = filter_bookings(Booking.objects.all(), request.query_params)
+        stream, content_type = BOOKING_EXPORT_FORMATS[export_type]
+        
+        response = StreamingHttpResponse(stream(bookings), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="bookings_{timezone.localdate():%Y%m%d}.{export_type}"'
+        return response
+
 class BookingOverviewView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        # total metrics
-        total_bookings = Booking.objects.count()
-        total_revenue = Booking.objects.filter(
-            payment_status=Booking.PAYMENT_STATUS_PAID
-        ).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        
-        # todays metrics
-        today = timezone.now().date()
-        today_bookings = Booking.objects.filter(created_at__date=today).count()
-        today_revenue = Booking.objects.filter(
-            created_at__date=today,
-            payment_status=Booking.PAYMENT_STATUS_PAID
-        ).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        
-        # this months trends (daily breakdown)
-        monthly_data = Booking.objects.filter(
-            created_at__year=timezone.now().year,
-            created_at__month=timezone.now().month
-        ).values('created_at__date').annotate(
-            daily_bookings=Count('id'),
-            daily_revenue=Sum('total_amount')
-        ).order_by('created_at__date')
-        
-        return Response({
-            'total_bookings': total_bookings,
-            'total_revenue': float(total_revenue),
-            'today_bookings': today_bookings,
-            'today_revenue': float(today_revenue),
-            'monthly_trends': list(monthly_data)
-        })
+        # totals, today and this months daily trend from the rollup tables (see bookings/rollups.py)
+        return Response(get_overview())
 
 class BookingSummaryView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        # payment status breakdown
-        payment_stats = Booking.objects.values('payment_status').annotate(
-            count=Count('id'),
-            revenue=Sum('total_amount')
-        )
+        # payment status breakdown and top 5 movies from the rollup tables
+        return Response(get_summary())
+
+class OccupancyReportView(APIView):
+    permission_classes = [StaffUserOnly]
+    throttle_classes = [AdminOperationThrottle]
+    
+    def get(self, request):
+        """load factor by weekday, hour, room and movie plus seat heatmaps, ?from=&to= are show dates"""
+        date_from, date_to = default_period()
+        date_from = parse_date_param(request.query_params.get('from'), 'from') or date_from
+        date_to = parse_date_param(request.query_params.get('to'), 'to') or date_to
+        if date_from > date_to:
+            return Response({'from': 'from must be before to'}, status=status.HTTP_400_BAD_REQUEST)
+        if (date_to - date_from).days > MAX_REPORT_DAYS:
+            return Response({'to': f'the period can be at most {MAX_REPORT_DAYS} days'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # popular movies (through showtime relationship)
-        popular_movies = Booking.objects.filter(
-            payment_status=Booking.PAYMENT_STATUS_PAID
-        ).values(
-            'showtime__movie__title'
-        ).annotate(
-            bookings=Count('id'),
-            revenue=Sum('total_amount')
-        ).order_by('-bookings')[:5]
+        return Response(get_occupancy_report(
+            date_from,
+            date_to,
+            cinema_id=parse_positive_int_param(request.query_params.get('cinema'), 'cinema'),
+            room_id=parse_positive_int_param(request.query_params.get('room'), 'room'),
+            movie_id=parse_positive_int_param(request.query_params.get('movie'), 'movie'),
+        ))
+
+class BookingTimeSeriesView(APIView):
+    permission_classes = [StaffUserOnly]
+    throttle_classes = [AdminOperationThrottle]
+    
+    def get(self, request):
+        """paid bookings and revenue per hour/day/week/month of ?from=&to= (created dates), optionally per group"""
+        granularity = request.query_params.get('granularity', 'day').lower()
+        group_by = request.query_params.get('group_by')
+        if granularity not in GRANULARITIES:
+            return Response({'granularity': f"granularity must be one of {', '.join(GRANULARITIES)}"}, status=status.HTTP_400_BAD_REQUEST)
+        if group_by and group_by not in GROUP_FIELDS:
+            return Response({'group_by': f"group_by must be one of {', '.join(GROUP_FIELDS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        today = timezone.localdate()
+        date_from = parse_date_param(request.query_params.get('from'), 'from') or today.replace(day=1)
+        date_to = parse_date_param(request.query_params.get('to'), 'to') or today
+        if date_from > date_to:
+            return Response({'from': 'from must be before to'}, status=status.HTTP_400_BAD_REQUEST)
+        if (date_to - date_from).days > MAX_DAYS[granularity]:
+            return Response({'to': f"a series by {granularity} can cover at most {MAX_DAYS[granularity]} days"}, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
-            'payment_stats': list(payment_stats),
-            'popular_movies': list(popular_movies)
+            'from': date_from,
+            'to': date_to,
+            'granularity': granularity,
+            'group_by': group_by,
+            'series': revenue_timeseries(date_from, date_to, granularity, group_by),
         })
+
+class RenderStatsView(APIView):
+    permission_classes = [StaffUserOnly]
+    
+    def get(self, request):
+        # pdf render pool counters and timings of the web process that answered
+        return Response(render_stats())
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BookingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bookings'
+
+    def ready(self):
+        # connects the showtime delete receiver that keeps the rollups right (see bookings/rollups.py)
+        from bookings import rollups
@@ -0,0 +1,122 @@
+import base64
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from bookings.models import Booking, Admission, checkin_manifest_key
+from bookings.qr import verify_ticket_token
+from showtimes.models import Showtime
+from showtimes.seatmap import SeatBitmap
+
+# DOOR CHECK-IN
+# a scan never looks up the booking: the token signature is checked in pure cpu and the booking is found in
+# the cached per-showtime manifest (one query per showtime every few minutes). duplicates are caught with an
+# atomic cache.add per booking and the admissions of a request are written with a single bulk insert
+MANIFEST_TTL = 300  # seconds, the manifest is also dropped whenever a booking of the showtime changes
+ADMITTED_TTL = 60 * 60 * 24
+
+
+def _admitted_key(reference_hex):
+    return f"checkin-admitted:{reference_hex}"
+
+
+def _b32(reference):
+    return base64.b32encode(reference.bytes).decode().rstrip("=")
+
+
+def get_manifest(showtime_id):
+    """paid bookings of a showtime keyed by reference hex, built once and cached"""
+    manifest = cache.get(checkin_manifest_key(showtime_id))
+    if manifest is not None:
+        return manifest
+
+    showtime = Showtime.objects.select_related("room").filter(pk=showtime_id).first()
+    if not showtime:
+        raise NotFound(detail="Showtime not found")
+
+    indexes = showtime.get_seat_indexes()
+    bookings = {}
+    for booking_id, reference, seats in Booking.objects.filter(
+        showtime_id=showtime_id,
+        payment_status=Booking.PAYMENT_STATUS_PAID,
+    ).values_list("id", "booking_reference", "seats").iterator():
+        bitmap = SeatBitmap(len(indexes))
+        bitmap.book(indexes[seat] for seat in seats if seat in indexes)
+        bookings[reference.hex] = {
+            "id": booking_id,
+            "reference": _b32(reference),
+            "seats": base64.b64encode(bitmap.to_bytes()).decode(),
+            "tickets": len(seats),
+        }
+
+    # admissions already in the database are flagged in the cache too so a cache flush cant admit twice
+    admitted = Admission.objects.filter(showtime_id=showtime_id).values_list("booking__booking_reference", flat=True)
+    admitted = [reference.hex for reference in admitted]
+    cache.set_many({_admitted_key(reference_hex): 1 for reference_hex in admitted}, ADMITTED_TTL)
+
+    manifest = {
+        "showtime": showtime_id,
+        "seat_codes": list(showtime.get_seat_codes()),
+        "generated_at": timezone.now().isoformat(),
+        "bookings": bookings,
+        "admitted": [bookings[reference_hex]["reference"] for reference_hex in admitted if reference_hex in bookings],
+    }
+    cache.set(checkin_manifest_key(showtime_id), manifest, MANIFEST_TTL)
+    return manifest
+
+
+def export_manifest(showtime_id):
+    """
+    compact manifest for door scanners to keep working offline: booking references in the same base32 form
+    as in the qr token (a 128 bit random reference is not guessable so a match is enough offline) and a seat
+    bitmap per booking decoded with seat_codes
+    """
+    manifest = get_manifest(showtime_id)
+    return {
+        "showtime": manifest["showtime"],
+        "seat_codes": manifest["seat_codes"],
+        "generated_at": manifest["generated_at"],
+        "bookings": [
+            {"reference": entry["reference"], "seats": entry["seats"], "tickets": entry["tickets"]}
+            for entry in manifest["bookings"].values()
+        ],
+        "admitted": manifest["admitted"],
+    }
+
+
+def check_in(showtime_id, scans, device=""):
+    """verify and admit a batch of scans [{"token", "scanned_at"}], returns one result per scan"""
+    manifest = get_manifest(showtime_id)
+    results = []
+    admissions = []
+
+    for scan in scans:
+        token = scan["token"]
+        reference = verify_ticket_token(token)
+        entry = manifest["bookings"].get(reference.hex) if reference else None
+
+        if reference is None:
+            scan_status = "invalid"
+        elif entry is None:
+            # not paid, cancelled or a ticket for another showtime
+            scan_status = "not_found"
+        elif not cache.add(_admitted_key(reference.hex), 1, ADMITTED_TTL):
+            scan_status = "already_admitted"
+        else:
+            scan_status = "admitted"
+            admissions.append(Admission(
+                booking_id=entry["id"],
+                showtime_id=showtime_id,
+                device=device,
+                admitted_at=scan.get("scanned_at") or timezone.now(),
+            ))
+
+        results.append({
+            "token": token,
+            "status": scan_status,
+            "booking_reference": str(reference) if entry else None,
+            "tickets": entry["tickets"] if entry else 0,
+        })
+
+    # the unique booking constraint is the last line of defence if the cache lost an admitted flag
+    Admission.objects.bulk_create(admissions, ignore_conflicts=True)
+    return results
@@ -0,0 +1,193 @@
+import io
+import csv
+import json
+import logging
+import zipfile
+from collections import deque
+from django.conf import settings
+from bookings.models import Booking
+from bookings.rendering import RenderUnavailable, submit_pdf, wait_pdf
+
+logger = logging.getLogger(__name__)
+
+
+class _ZipStream:
+    """write-only target for zipfile that hands out what was written so far, keeps memory at ~one pdf"""
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def get_export_bookings(showtime_id=None, references=None):
+    """paid bookings for a showtime and/or a list of booking references, oldest first"""
+    bookings = Booking.objects.filter(payment_status=Booking.PAYMENT_STATUS_PAID).select_related(
+        'showtime__movie',
+        'showtime__room__cinema',
+    ).order_by('created_at', 'id')
+
+    if showtime_id:
+        bookings = bookings.filter(showtime_id=showtime_id)
+    if references:
+        bookings = bookings.filter(booking_reference__in=references)
+    return bookings
+
+
+def iter_ticket_pdfs(bookings):
+    """
+    (booking, pdf bytes) in booking order. stored tickets that are still current are reused, the rest are
+    rendered in the pdf process pool with at most PDF_RENDER_WORKERS renders in flight so a 500 seat
+    house never holds more than a handful of pdfs in memory
+    """
+    max_in_flight = max(settings.PDF_RENDER_WORKERS, 1)
+    pending = deque()
+
+    for booking in bookings.iterator(chunk_size=100):
+        if booking.has_current_ticket_pdf():
+            with booking.ticket_pdf.open('rb') as ticket_file:
+                pending.append((booking, ticket_file.read()))
+        else:
+            pending.append((booking, _submit(booking)))
+
+        while len(pending) > max_in_flight:
+            yield _resolve(*pending.popleft())
+
+    while pending:
+        yield _resolve(*pending.popleft())
+
+
+# the zip is already streaming when a render gives up (pool saturated or too slow), raising would cut the
+# download off halfway. that ticket gets the failed_<reference>.txt entry instead and the rest go on
+def _submit(booking):
+    try:
+        return submit_pdf(booking.render_ticket_html(), block=True)
+    except RenderUnavailable:
+        logger.warning("ticket export: no render slot for booking %s", booking.booking_reference)
+        return None
+
+
+def _resolve(booking, pdf):
+    if pdf is None or isinstance(pdf, bytes):
+        return booking, pdf
+    try:
+        return booking, wait_pdf(pdf)
+    except RenderUnavailable:
+        logger.warning("ticket export: render of booking %s timed out", booking.booking_reference)
+        return booking, None
+
+
+def stream_tickets_zip(bookings):
+    """yield a zip archive with one pdf ticket per booking chunk by chunk"""
+    stream = _ZipStream()
+    # pdfs are already compressed so they are stored as is
+    with zipfile.ZipFile(stream, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for booking, pdf in iter_ticket_pdfs(bookings):
+            if pdf is None:
+                archive.writestr(f'failed_{booking.booking_reference}.txt', 'Failed to generate PDF ticket.')
+            else:
+                seats = '-'.join(booking.seats)
+                archive.writestr(f'ticket_{seats}_{booking.booking_reference}.pdf', pdf)
+            yield stream.pop()
+    yield stream.pop()
+
+
+# ACCOUNTING EXPORT
+# flat values() rows read through a server side cursor (iterator) and written out chunk by chunk, no model
+# instances, no serializer and no seat maps so memory stays flat no matter how many bookings are exported
+BOOKING_EXPORT_FIELDS = {
+    'booking_reference': 'booking_reference',
+    'created_at': 'created_at',
+    'payment_date': 'payment_date',
+    'payment_status': 'payment_status',
+    'payment_method': 'payment_method',
+    'payment_gateway': 'payment_gateway',
+    'payment_reference': 'payment_reference',
+    'total_amount': 'total_amount',
+    'number_of_tickets': 'number_of_tickets',
+    'seats': 'seats',
+    'customer_name': 'customer_name',
+    'customer_email': 'customer_email',
+    'showtime_id': 'showtime_id',
+    'show_date': 'showtime__show_date',
+    'show_time': 'showtime__show_time',
+    'movie': 'showtime__movie__title',
+    'cinema': 'showtime__room__cinema__name',
+    'room': 'showtime__room__name',
+}
+EXPORT_CHUNK_SIZE = 2000
+
+
+def iter_booking_rows(bookings):
+    """export rows as dicts keyed by the export column names, oldest first"""
+    columns = list(BOOKING_EXPORT_FIELDS)
+    lookups = list(BOOKING_EXPORT_FIELDS.values())
+    for values in bookings.order_by('created_at', 'id').values_list(*lookups).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield dict(zip(columns, values))
+
+
+# customer names and payment references are user input, a cell starting with one of these is run as a
+# formula when the csv is opened in a spreadsheet so it gets a leading quote to stay plain text
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _export_value(value):
+    if isinstance(value, list):
+        value = ' '.join(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+def _json_value(value):
+    # dates as iso strings, decimals and uuids as strings so amounts keep their exact value
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def stream_bookings_csv(bookings):
+    """yield the csv export a few hundred rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(BOOKING_EXPORT_FIELDS)
+
+    for count, row in enumerate(iter_booking_rows(bookings), start=1):
+        writer.writerow([_export_value(value) for value in row.values()])
+        if count % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_bookings_ndjson(bookings):
+    """yield the export as newline delimited json, one booking object per line"""
+    lines = []
+    for row in iter_booking_rows(bookings):
+        lines.append(json.dumps(row, default=_json_value))
+        if len(lines) == 500:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+BOOKING_EXPORT_FORMATS = {
+    'csv': (stream_bookings_csv, 'text/csv'),
+    'ndjson': (stream_bookings_ndjson, 'application/x-ndjson'),
+}
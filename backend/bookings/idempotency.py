@@ -0,0 +1,90 @@
+import json
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = "HTTP_IDEMPOTENCY_KEY"
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyInProgress(APIException):
+    """the first request with this key is still running, the client should retry in a moment"""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is still being processed, retry shortly."
+    default_code = "idempotency_in_progress"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used for a different request."
+    default_code = "idempotency_key_reused"
+
+
+# IDEMPOTENT POST
+# retries of a POST that carry the same Idempotency-Key header get the first response back from the cache
+# instead of running validation, payment and the booking again. cache.add on the key is the lock so two
+# concurrent retries never both run, the body fingerprint stops a key from being reused for another request
+def _cache_key(scope, idempotency_key):
+    return f"idempotency:{scope}:{hashlib.sha256(idempotency_key.encode()).hexdigest()}"
+
+
+def get_idempotency_key(request):
+    """the Idempotency-Key header of the request or None"""
+    idempotency_key = request.META.get(IDEMPOTENCY_HEADER, "").strip()
+    if not idempotency_key:
+        return None
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        raise ValidationError({"idempotency_key": f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters."})
+    return idempotency_key
+
+
+def request_fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def begin_request(scope, idempotency_key, fingerprint):
+    """
+    lock the key for this request, returns None when the caller should do the work or the stored
+    response of an earlier request with the same key. raises while that request is still running
+    """
+    cache_key = _cache_key(scope, idempotency_key)
+    if cache.add(cache_key, {"state": "in_progress", "fingerprint": fingerprint}, settings.IDEMPOTENCY_LOCK_TTL):
+        return None
+
+    entry = cache.get(cache_key)
+    if entry is None:
+        # the lock expired between add and get, the other request counts as still running
+        raise IdempotencyInProgress()
+    if entry["fingerprint"] != fingerprint:
+        raise IdempotencyKeyReused()
+    if entry["state"] == "in_progress":
+        raise IdempotencyInProgress()
+    return entry
+
+
+def finish_request(scope, idempotency_key, fingerprint, response):
+    """store the response for replays, server errors free the key again so a retry does the work"""
+    cache_key = _cache_key(scope, idempotency_key)
+    if response.status_code >= 500:
+        cache.delete(cache_key)
+        return
+
+    cache.set(cache_key, {
+        "state": "done",
+        "fingerprint": fingerprint,
+        "status_code": response.status_code,
+        "data": response.data,
+    }, settings.IDEMPOTENCY_KEY_TTL)
+
+
+def abandon_request(scope, idempotency_key):
+    cache.delete(_cache_key(scope, idempotency_key))
+
+
+def replay_response(entry):
+    response = Response(entry["data"], status=entry["status_code"])
+    response["Idempotent-Replayed"] = "true"
+    return response
@@ -0,0 +1,14 @@
+from jobs.queue import job
+from bookings.models import Booking
+
+
+@job('bookings.send_confirmation')
+def send_confirmation(booking_id):
+    """pdf ticket + outbox confirmation email for a new paid booking, raising makes the job retry"""
+    booking = Booking.objects.select_related(
+        'showtime__movie__genre',
+        'showtime__room__cinema',
+    ).get(pk=booking_id)
+
+    if not booking.queue_confirmation_email():
+        raise RuntimeError(f"Confirmation email for booking {booking.booking_reference} could not be queued")
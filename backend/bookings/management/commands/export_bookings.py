@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from bookings.models import Booking
+from bookings.api.v1.services import filter_bookings
+from bookings.exports import BOOKING_EXPORT_FORMATS
+
+
+class Command(BaseCommand):
+    help = "Stream bookings to a csv or ndjson file for accounting (constant memory, any number of rows)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='created_from', help="first created date YYYY-MM-DD")
+        parser.add_argument('--to', dest='created_to', help="last created date YYYY-MM-DD (inclusive)")
+        parser.add_argument('--status', help="only bookings with this payment status")
+        parser.add_argument('--type', choices=list(BOOKING_EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', help="path of the file to write, stdout when left out")
+
+    def handle(self, *args, **options):
+        params = {
+            key: options[key] for key in ('created_from', 'created_to', 'status')
+            if options[key]
+        }
+        bookings = filter_bookings(Booking.objects.all(), params)
+        stream, _ = BOOKING_EXPORT_FORMATS[options['type']]
+
+        if not options['output']:
+            for chunk in stream(bookings):
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            for chunk in stream(bookings):
+                output.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Exported bookings to {options['output']}"))
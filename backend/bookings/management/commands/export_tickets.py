@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from bookings.exports import get_export_bookings, stream_tickets_zip
+
+
+class Command(BaseCommand):
+    help = "Export the pdf tickets of a showtime or a list of booking references into one zip file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--showtime', type=int, help="export every paid booking of this showtime id")
+        parser.add_argument('--reference', action='append', default=[], help="booking reference, can be repeated")
+        parser.add_argument('--output', required=True, help="path of the zip file to write")
+
+    def handle(self, *args, **options):
+        if not options['showtime'] and not options['reference']:
+            raise CommandError("Provide --showtime and/or at least one --reference")
+
+        bookings = get_export_bookings(showtime_id=options['showtime'], references=options['reference'])
+        total = bookings.count()
+        if total == 0:
+            raise CommandError("No paid bookings found")
+
+        with open(options['output'], 'wb') as output:
+            for chunk in stream_tickets_zip(bookings):
+                output.write(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {total} ticket(s) to {options['output']}"))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from bookings.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the booking dashboard rollup tables from the bookings table"
+
+    def handle(self, *args, **options):
+        daily_rows, total_rows = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {daily_rows} daily row(s) and {total_rows} total row(s)"))
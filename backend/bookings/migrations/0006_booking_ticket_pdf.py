@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:14
+
+import bookings.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_remove_booking_payment_expiry_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='ticket_pdf',
+            field=models.FileField(blank=True, null=True, storage=bookings.models.get_ticket_storage, upload_to='tickets/'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='ticket_version',
+            field=models.CharField(blank=True, max_length=40),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0006_booking_ticket_pdf'),
+        ('showtimes', '0007_showtime_seats_available'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Admission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device', models.CharField(blank=True, max_length=50)),
+                ('admitted_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='admission', to='bookings.booking')),
+                ('showtime', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='admissions', to='showtimes.showtime')),
+            ],
+            options={
+                'ordering': ['-admitted_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:24
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0008_booking_idempotency_key'),
+        ('showtimes', '0007_showtime_seats_available'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['-created_at', '-id'], name='booking_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['showtime', '-created_at', '-id'], name='booking_showtime_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['payment_status', '-created_at', '-id'], name='booking_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(django.db.models.functions.text.Upper('customer_email'), name='booking_email_upper_idx'),
+        ),
+    ]
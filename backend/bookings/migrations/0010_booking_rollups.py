@@ -0,0 +1,58 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_rollups(apps, schema_editor):
+    from bookings.rollups import rebuild_rollups
+    rebuild_rollups(
+        booking_model=apps.get_model('bookings', 'Booking'),
+        daily_model=apps.get_model('bookings', 'BookingDailyStat'),
+        total_model=apps.get_model('bookings', 'BookingTotalStat'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0009_booking_list_indexes'),
+        ('movies', '0005_alter_movie_title'),
+        ('showtimes', '0007_showtime_seats_available'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('payment_status', models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('failed', 'Failed'), ('cancelled', 'Cancelled'), ('refunded', 'Refunded')], max_length=20)),
+                ('bookings', models.IntegerField(default=0)),
+                ('tickets', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cinema', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='booking_daily_stats', to='showtimes.cinema')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_daily_stats', to='movies.movie')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'payment_status'], name='bookings_bo_day_2361f5_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'movie', 'cinema', 'payment_status'), name='unique_booking_daily_stat')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BookingTotalStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_status', models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('failed', 'Failed'), ('cancelled', 'Cancelled'), ('refunded', 'Refunded')], max_length=20)),
+                ('bookings', models.IntegerField(default=0)),
+                ('tickets', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_total_stats', to='movies.movie')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['payment_status', '-bookings'], name='bookings_bo_payment_17e20a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('movie', 'payment_status'), name='unique_booking_total_stat')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0010_booking_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='idempotency_fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
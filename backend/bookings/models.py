@@ -1,16 +1,42 @@
 import uuid
-from django.db import models
+import hashlib
+from functools import lru_cache
+from django.db import models, transaction
+from django.db.models.functions import Upper
 from django.core.validators import EmailValidator
-from showtimes.models import Showtime
-from django.core.mail import EmailMessage
+from movies.models import Movie
+from showtimes.models import Cinema, Showtime
+from showtimes.reservations import SEAT_STATE_FIELDS, claim_seats, release_seats
+from jobs.queue import enqueue
+from outbox.sender import queue_email
 from django.template.loader import render_to_string
-from django.conf import settings
-import qrcode
-from io import BytesIO
+from django.core.cache import cache
 from django.core.files.base import ContentFile
-from xhtml2pdf import pisa
+from django.core.files.storage import storages
+from django.template.loader import get_template
+from bookings.rendering import render_pdf
+from bookings.qr import make_ticket_token, qr_png_data_uri
 from django.utils import timezone
 
+TICKET_TEMPLATE = 'bookings/ticket_pdf.html'
+
+
+def get_ticket_storage():
+    # rendered pdf tickets go to their own storage alias (raw files on cloudinary, media folder locally)
+    return storages['tickets']
+
+
+def checkin_manifest_key(showtime_id):
+    # cached door manifest of a showtime (see bookings/checkin.py), dropped whenever its bookings change
+    return f"checkin-manifest:{showtime_id}"
+
+
+@lru_cache(maxsize=1)
+def _ticket_template_fingerprint():
+    # template edits change every ticket version, the cache is per process so a deploy picks them up
+    return hashlib.sha1(get_template(TICKET_TEMPLATE).template.source.encode()).hexdigest()
+
+
 class Booking(models.Model):
     PAYMENT_STATUS_PENDING = 'pending'
     PAYMENT_STATUS_PAID = 'paid'
@@ -73,11 +99,29 @@ class Booking(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     expires_at = models.DateTimeField(blank=True, null=True)  # made optional since payments are instant
     
-    # QR Code for ticket validation
+    # Idempotency-Key of the create request, backs up the cached response if the cache lost it
+    idempotency_key = models.CharField(max_length=255, unique=True, blank=True, null=True, editable=False)
+    idempotency_fingerprint = models.CharField(max_length=64, blank=True, editable=False)  # sha256 of that request body
+    
+    # QR Code for ticket validation (legacy stored images, the qr is now rendered on demand from ticket_token)
     qr_code = models.ImageField(upload_to='qr_codes/', blank=True, null=True)
     
+    # rendered PDF ticket cache, re-rendered only when ticket_version no longer matches the booking data
+    ticket_pdf = models.FileField(upload_to='tickets/', storage=get_ticket_storage, blank=True, null=True)
+    ticket_version = models.CharField(max_length=40, blank=True)
+    
     class Meta:
         ordering = ['-created_at']
+        # keyset pagination of the staff booking list walks (created_at, id) newest first, per filter
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='booking_created_idx'),
+            models.Index(fields=['showtime', '-created_at', '-id'], name='booking_showtime_created_idx'),
+            models.Index(fields=['payment_status', '-created_at', '-id'], name='booking_status_created_idx'),
+            # iexact compares upper() on postgres
+            models.Index(Upper('customer_email'), name='booking_email_upper_idx'),
+        ]
+    
+    _rollup_state = None
     
     def __str__(self):
         return f"Booking {self.booking_reference} - {self.customer_name}"
@@ -95,71 +139,116 @@ class Booking(models.Model):
         if not self.pk and self.payment_status == self.PAYMENT_STATUS_PENDING:
             self.payment_status = self.PAYMENT_STATUS_PAID
         
-        # generate qr code when booking is created
-        if not self.pk and not self.qr_code:
-            super().save(*args, **kwargs)
-            self.generate_qr_code()
-            kwargs['force_insert'] = False
-        
-        super().save(*args, **kwargs)
-    
-    def generate_qr_code(self):
-        """Generate QR code with booking information"""
-        qr_data = f"""
-        Booking Reference: {self.booking_reference}
-        Customer: {self.customer_name}
-        Movie: {self.showtime.movie.title}
-        Showtime: {self.showtime.show_date} {self.showtime.show_time}
-        Cinema: {self.showtime.room.cinema.name}
-        Room: {self.showtime.room.name}
-        Seats: {', '.join(self.seats)}
-        Payment Reference: {self.payment_reference}
-        """
-        
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_data)
-        qr.make(fit=True)
+        from bookings.rollups import record_booking_change, rollup_state, stored_rollup_state
         
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Save QR code to image field
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        file_name = f'qr_{self.booking_reference}.png'
+        with transaction.atomic():
+            # loaded with .only() and the rollup fields were left out, read them once before they change
+            old_state = self._rollup_state
+            if old_state is None and self.pk and not self._state.adding:
+                old_state = stored_rollup_state(self)
+            
+            super().save(*args, **kwargs)
+            
+            # dashboard counters follow right after the booking commits (see rollups._bump_after_commit)
+            record_booking_change(self, old_state)
+            self._rollup_state = rollup_state(self)
+    
+    def delete(self, *args, **kwargs):
+        from bookings.rollups import record_booking_deleted, stored_rollup_state
         
-        self.qr_code.save(
-            file_name,
-            ContentFile(buffer.getvalue()),
-            save=False
-        )
+        with transaction.atomic():
+            record_booking_deleted(self, self._rollup_state or stored_rollup_state(self))
+            return super().delete(*args, **kwargs)
     
-    def generate_pdf_ticket(self):
-        """Generate PDF ticket for download using xhtml2pdf"""
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        booking = super().from_db(db, field_names, values)
+        # remembered so save() knows which rollup buckets the booking leaves
+        from bookings.rollups import loaded_rollup_state
+        booking._rollup_state = loaded_rollup_state(field_names, values)
+        return booking
+    
+    @property
+    def ticket_token(self):
+        """Compact signed token encoded in the ticket QR code (see bookings/qr.py)"""
+        return make_ticket_token(self.booking_reference)
+    
+    def render_ticket_html(self):
+        """Render the ticket template that xhtml2pdf turns into the PDF ticket"""
         context = {
             'booking': self,
             'showtime': self.showtime,
             'movie': self.showtime.movie,
             'cinema': self.showtime.room.cinema,
             'room': self.showtime.room,
+            'qr_code_data_uri': qr_png_data_uri(self.ticket_token),
         }
         
-        html_string = render_to_string('bookings/ticket_pdf.html', context)
+        return render_to_string(TICKET_TEMPLATE, context)
+    
+    def generate_pdf_ticket(self):
+        """Generate PDF ticket for download using xhtml2pdf"""
+        # rendered in the render process pool (raises RenderUnavailable when saturated)
+        return render_pdf(self.render_ticket_html())
+    
+    def has_current_ticket_pdf(self):
+        """True when the stored PDF ticket still matches the booking data"""
+        return bool(self.ticket_pdf) and self.ticket_version == self.get_ticket_version()
+    
+    def get_ticket_version(self):
+        """Hash of everything printed on the ticket, changes when the booking, showtime or template changes"""
+        showtime = self.showtime
+        parts = [
+            _ticket_template_fingerprint(),
+            str(self.booking_reference),
+            self.customer_name,
+            ','.join(self.seats),
+            str(self.total_amount),
+            str(self.number_of_tickets),
+            self.payment_status,
+            self.payment_method,
+            self.ticket_token,
+            str(showtime.show_date),
+            str(showtime.show_time),
+            showtime.movie.title,
+            showtime.movie.age_rating,
+            str(showtime.movie.duration),
+            showtime.room.name,
+            showtime.room.cinema.name,
+        ]
+        return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+    
+    def get_ticket_pdf(self):
+        """Return the stored PDF ticket file, rendering it only when missing or outdated"""
+        version = self.get_ticket_version()
+        if self.ticket_pdf and self.ticket_version == version:
+            return self.ticket_pdf
+        
+        pdf_ticket = self.generate_pdf_ticket()
+        if not pdf_ticket:
+            return None
         
-        # Generate PDF using xhtml2pdf
-        result = BytesIO()
-        pdf = pisa.pisaDocument(BytesIO(html_string.encode("UTF-8")), result)
+        # two requests can render the same outdated ticket at once. only the one that still finds the version
+        # it started from in the row keeps its file, the other deletes its copy and serves the stored one
+        old_name, old_version = self.ticket_pdf.name, self.ticket_version
+        self.ticket_pdf.save(f'ticket_{self.booking_reference}_{version[:12]}.pdf', ContentFile(pdf_ticket), save=False)
+        stored = Booking.objects.filter(pk=self.pk, ticket_version=old_version).update(
+            ticket_pdf=self.ticket_pdf.name,
+            ticket_version=version,
+            updated_at=timezone.now(),
+        )
+        if not stored:
+            self.ticket_pdf.delete(save=False)
+            self.refresh_from_db(fields=['ticket_pdf', 'ticket_version'])
+            return self.ticket_pdf
         
-        if not pdf.err:
-            return result.getvalue()
-        return None
+        if old_name:
+            self.ticket_pdf.storage.delete(old_name)
+        self.ticket_version = version
+        return self.ticket_pdf
     
-    def send_confirmation_email(self):
-        """Send booking confirmation email with PDF ticket"""
+    def queue_confirmation_email(self):
+        """Queue booking confirmation email with PDF ticket in the outbox"""
         subject = f'Booking Confirmation - {self.booking_reference}'
         
         context = {
@@ -172,40 +261,36 @@ class Booking(models.Model):
         
         html_message = render_to_string('bookings/email_confirmation.html', context)
         
-        # Generate PDF ticket
-        pdf_ticket = self.generate_pdf_ticket()
+        # Generate PDF ticket (or reuse the stored one)
+        ticket_pdf = self.get_ticket_pdf()
         
-        if not pdf_ticket:
+        if not ticket_pdf:
             print("Failed to generate PDF ticket")
             return False
         
-        email = EmailMessage(
+        # the outbox sends it later in a batch over a shared smtp connection, the pdf is attached from
+        # the ticket storage at send time
+        queue_email(
             subject=subject,
             body=html_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
             to=[self.customer_email],
+            attachments=[{
+                'filename': f'ticket_{self.booking_reference}.pdf',
+                'storage': 'tickets',
+                'name': ticket_pdf.name,
+                'mimetype': 'application/pdf',
+            }],
         )
-        email.content_subtype = 'html'
-        
-        # Attach PDF ticket
-        email.attach(
-            f'ticket_{self.booking_reference}.pdf',
-            pdf_ticket,
-            'application/pdf'
-        )
-        
-        try:
-            email.send()
-            return True
-        except Exception as e:
-            print(f"Failed to send email: {e}")
-            return False
+        return True
     
     def process_payment(self, payment_method=None):
         """
         Mock payment processing - automatically successful
         Returns payment response similar to real gateway
         """
+        # seats are already claimed when the booking was paid before
+        already_paid = self.pk is not None and self.payment_status == self.PAYMENT_STATUS_PAID
+        
         if payment_method:
             self.payment_method = payment_method
         
@@ -216,15 +301,21 @@ class Booking(models.Model):
         # auto-mark as paid with stable reference
         self.payment_status = self.PAYMENT_STATUS_PAID
         self.payment_gateway = 'mock_payment_gateway'
-        self.save()
         
-        # send confirmation email
-        self.send_confirmation_email()
-        
-        # update seat availability
-        self.update_seat_availability()
+        # one transaction: claim the seats first so a taken seat fails before anything is written, then a
+        # single INSERT (or UPDATE) of the already paid booking and the confirmation job row
+        with transaction.atomic():
+            if not already_paid:
+                self.update_seat_availability()
+            self.save()
+            
+            # qr code, pdf ticket and email run in the background once the booking and seats are committed
+            self.queue_confirmation()
         
-        # return mock payment response
+        return self.payment_response()
+    
+    def payment_response(self):
+        """mock gateway response of the payment, the same again for replayed create requests"""
         return {
             'success': True,
             'payment_reference': self.payment_reference,  # this will always be the same
@@ -237,6 +328,9 @@ class Booking(models.Model):
     
     def mark_as_paid(self, payment_reference=None, gateway='mock_payment_gateway'):
         """Mark booking as paid and send confirmation"""
+        # seats are already claimed when the booking was paid before
+        already_paid = self.pk is not None and self.payment_status == self.PAYMENT_STATUS_PAID
+        
         # use existing payment reference or generate stable one
         if payment_reference:
             self.payment_reference = payment_reference
@@ -246,45 +340,50 @@ class Booking(models.Model):
         self.payment_status = self.PAYMENT_STATUS_PAID
         self.payment_gateway = gateway
         self.payment_date = timezone.now()
-        self.save()
-        
-        # Send confirmation email
-        self.send_confirmation_email()
         
-        # Update seat availability
-        self.update_seat_availability()
+        with transaction.atomic():
+            self.save()
+            if not already_paid:
+                self.update_seat_availability()
+            
+            # Send confirmation email
+            self.queue_confirmation()
         
         return True
     
+    def queue_confirmation(self):
+        """Queue the qr code + pdf ticket + confirmation email job (see bookings/jobs.py)"""
+        enqueue('bookings.send_confirmation', booking_id=self.pk)
+    
     def update_seat_availability(self):
-        """Update seat availability in showtime"""
+        """Claim the booked seats on the showtime (all or nothing, raises SeatsUnavailable)"""
         if self.payment_status == self.PAYMENT_STATUS_PAID:
-            showtime = self.showtime
-            seats_data = showtime.seats_data.copy()
-            
-            for seat in self.seats:
-                if seat in seats_data:
-                    seats_data[seat]['available'] = False
-            
-            showtime.seats_data = seats_data
-            showtime.save()
+            self._apply_seat_state(claim_seats(self.showtime_id, self.seats))
+            self.invalidate_checkin_manifest()
+    
+    def _apply_seat_state(self, locked_showtime):
+        # keep the showtime that is already loaded (with movie, room and cinema for the response) and only
+        # copy the new seat state over from the locked row instead of lazy loading all of it again
+        if Booking.showtime.is_cached(self):
+            for field in SEAT_STATE_FIELDS:
+                setattr(self.showtime, field, getattr(locked_showtime, field))
+        else:
+            self.showtime = locked_showtime
+    
+    def invalidate_checkin_manifest(self):
+        showtime_id = self.showtime_id
+        transaction.on_commit(lambda: cache.delete(checkin_manifest_key(showtime_id)))
     
     def cancel_booking(self):
         """Cancel booking and free up seats"""
-        if self.payment_status == self.PAYMENT_STATUS_PAID:
-            # Free up seats
-            showtime = self.showtime
-            seats_data = showtime.seats_data.copy()
-            
-            for seat in self.seats:
-                if seat in seats_data:
-                    seats_data[seat]['available'] = True
+        with transaction.atomic():
+            if self.payment_status == self.PAYMENT_STATUS_PAID:
+                # Free up seats
+                self._apply_seat_state(release_seats(self.showtime_id, self.seats))
+                self.invalidate_checkin_manifest()
             
-            showtime.seats_data = seats_data
-            showtime.save()
-        
-        self.payment_status = self.PAYMENT_STATUS_CANCELLED
-        self.save()
+            self.payment_status = self.PAYMENT_STATUS_CANCELLED
+            self.save()
     
     def is_expired(self):
         """Check if booking has expired - now less relevant since payments are instant"""
@@ -310,13 +409,64 @@ class Booking(models.Model):
         """
         booking = cls(**kwargs)
         
-        # generate stable payment reference before saving
-        if not booking.payment_reference:
-            booking.payment_reference = booking._generate_payment_reference()
-            
-        booking.save()
-        
-        # auto-process payment
+        # the booking is inserted already paid together with the seat claim, a taken seat writes nothing
         payment_result = booking.process_payment()
         
-        return booking, payment_result
\ No newline at end of file
+        return booking, payment_result
+
+
+class Admission(models.Model):
+    """a scanned ticket at the door, one row per booking (the whole group enters together)"""
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name='admission')
+    showtime = models.ForeignKey(Showtime, on_delete=models.CASCADE, related_name='admissions')
+    device = models.CharField(max_length=50, blank=True)  # scanner / gate that admitted the ticket
+    admitted_at = models.DateTimeField()  # scan time on the device, can be earlier than created_at for offline syncs
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-admitted_at']
+    
+    def __str__(self):
+        return f"Admission {self.booking_id} @ {self.admitted_at}"
+
+
+class BookingDailyStat(models.Model):
+    """bookings per creation day, movie, cinema and current payment status (see bookings/rollups.py)"""
+    day = models.DateField()
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='booking_daily_stats')
+    cinema = models.ForeignKey(Cinema, on_delete=models.CASCADE, null=True, blank=True, related_name='booking_daily_stats')
+    payment_status = models.CharField(max_length=20, choices=Booking.PAYMENT_STATUS_CHOICES)
+    bookings = models.IntegerField(default=0)
+    tickets = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'movie', 'cinema', 'payment_status'], name='unique_booking_daily_stat'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'payment_status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} {self.movie_id}/{self.cinema_id} {self.payment_status}: {self.bookings}"
+
+
+class BookingTotalStat(models.Model):
+    """all time bookings per movie and current payment status, a few rows per movie no matter the history"""
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='booking_total_stats')
+    payment_status = models.CharField(max_length=20, choices=Booking.PAYMENT_STATUS_CHOICES)
+    bookings = models.IntegerField(default=0)
+    tickets = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['movie', 'payment_status'], name='unique_booking_total_stat'),
+        ]
+        indexes = [
+            models.Index(fields=['payment_status', '-bookings']),
+        ]
+    
+    def __str__(self):
+        return f"{self.movie_id} {self.payment_status}: {self.bookings}"
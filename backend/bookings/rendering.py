@@ -0,0 +1,174 @@
+import time
+import logging
+import threading
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from xhtml2pdf import pisa
+
+logger = logging.getLogger(__name__)
+
+
+class RenderUnavailable(APIException):
+    """pdf render pool is saturated or the render took too long, the client should retry later"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Ticket rendering is busy right now, please try again in a few seconds."
+    default_code = "render_unavailable"
+
+
+def html_to_pdf(html_string):
+    """runs inside the pool worker process, pure xhtml2pdf work without django"""
+    result = BytesIO()
+    pdf = pisa.pisaDocument(BytesIO(html_string.encode("UTF-8")), result)
+    if pdf.err:
+        return None
+    return result.getvalue()
+
+
+# PDF RENDER POOL
+# xhtml2pdf is pure python cpu work that holds the GIL, rendering it in the web worker stalls every other
+# request on that worker. renders go to a small process pool instead with a bounded number of slots
+# (running + waiting), when all slots are taken new renders fail fast with a 503 instead of piling up
+_executor = None
+_executor_lock = threading.Lock()
+_slots = None
+
+_stats_lock = threading.Lock()
+_stats = {
+    "renders": 0,
+    "failures": 0,
+    "rejected": 0,
+    "timeouts": 0,
+    "in_flight": 0,
+    "total_ms": 0.0,
+    "max_ms": 0.0,
+}
+
+
+def _get_executor():
+    global _executor, _slots
+    with _executor_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(settings.PDF_RENDER_WORKERS + settings.PDF_RENDER_QUEUE_SIZE)
+        if _executor is None:
+            workers = settings.PDF_RENDER_WORKERS
+            # spawn so the workers dont inherit the open database connections of the web process
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=100,
+            )
+        return _executor
+
+
+def _recycle_executor(executor):
+    """
+    kill the workers of a pool with a stuck render and start a fresh pool for the next render. the other
+    renders of the old pool fail with BrokenProcessPool, their callers get the same 503 as a timeout
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _record(key, elapsed_ms=None):
+    with _stats_lock:
+        _stats[key] += 1
+        if elapsed_ms is not None:
+            _stats["total_ms"] += elapsed_ms
+            _stats["max_ms"] = max(_stats["max_ms"], elapsed_ms)
+
+
+def _change_in_flight(delta):
+    with _stats_lock:
+        _stats["in_flight"] += delta
+
+
+def submit_pdf(html_string, block=False):
+    """
+    queue a render and return its future, raises RenderUnavailable when all slots are busy.
+    block=True waits for a free slot instead (bulk exports) but still gives up after PDF_RENDER_TIMEOUT
+    """
+    started = time.monotonic()
+
+    # PDF_RENDER_WORKERS=0 renders inline in the calling process (local development and tests)
+    if settings.PDF_RENDER_WORKERS <= 0:
+        future = Future()
+        future.set_result(html_to_pdf(html_string))
+        _record("renders" if future.result() else "failures", (time.monotonic() - started) * 1000)
+        return future
+
+    executor = _get_executor()
+    acquired = _slots.acquire(timeout=settings.PDF_RENDER_TIMEOUT) if block else _slots.acquire(blocking=False)
+    if not acquired:
+        _record("rejected")
+        logger.warning("pdf render rejected, all %s render slots are busy", settings.PDF_RENDER_WORKERS + settings.PDF_RENDER_QUEUE_SIZE)
+        raise RenderUnavailable()
+
+    # the slot is given back once, either when the worker is done or when wait_pdf gives up on a stuck render
+    released = threading.Lock()
+
+    def _release_slot():
+        if released.acquire(blocking=False):
+            _change_in_flight(-1)
+            _slots.release()
+
+    _change_in_flight(1)
+    future = executor.submit(html_to_pdf, html_string)
+    future.render_executor = executor
+    future.release_slot = _release_slot
+
+    def _done(done_future):
+        _release_slot()
+        if done_future.cancelled() or done_future.exception():
+            _record("failures")
+            return
+        elapsed_ms = (time.monotonic() - started) * 1000
+        _record("renders" if done_future.result() else "failures", elapsed_ms)
+        logger.info("pdf rendered in %.0fms", elapsed_ms)
+    future.add_done_callback(_done)
+    return future
+
+
+def wait_pdf(future):
+    """pdf bytes of a submitted render (None when xhtml2pdf reports an error)"""
+    try:
+        return future.result(timeout=settings.PDF_RENDER_TIMEOUT)
+    except FutureTimeoutError:
+        _record("timeouts")
+        logger.warning("pdf render timed out after %ss", settings.PDF_RENDER_TIMEOUT)
+        # cancel() only stops a render still waiting for a worker. one that is already running would keep
+        # its worker and slot forever if it hangs, so that pool is torn down and the slot handed back now
+        if not future.cancel():
+            _recycle_executor(future.render_executor)
+            future.release_slot()
+        raise RenderUnavailable(detail="Ticket rendering took too long, please try again.")
+    except BrokenProcessPool:
+        logger.warning("pdf render lost its worker")
+        raise RenderUnavailable(detail="Ticket rendering took too long, please try again.")
+
+
+def render_pdf(html_string):
+    """render html to pdf bytes (None when xhtml2pdf reports an error), raises RenderUnavailable when saturated"""
+    return wait_pdf(submit_pdf(html_string))
+
+
+def render_stats():
+    """render counters and timings of this web process"""
+    with _stats_lock:
+        stats = dict(_stats)
+    completed = stats["renders"] + stats["failures"]
+    stats["avg_ms"] = round(stats["total_ms"] / completed, 1) if completed else 0.0
+    stats["total_ms"] = round(stats["total_ms"], 1)
+    stats["max_ms"] = round(stats["max_ms"], 1)
+    stats["workers"] = settings.PDF_RENDER_WORKERS
+    stats["queue_size"] = settings.PDF_RENDER_QUEUE_SIZE
+    return stats
@@ -0,0 +1,257 @@
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from showtimes.models import Showtime
+from bookings.models import Booking, BookingDailyStat, BookingTotalStat
+from bookings.timeseries import touch_booking_period
+
+# BOOKING ROLLUPS
+# the dashboard reads counters that are kept up to date as bookings are saved instead of aggregating the
+# whole bookings table on every poll. a booking counts in the bucket of its creation day and CURRENT payment
+# status, so a cancellation moves it from "paid" to "cancelled". the counters change right after the booking
+# commits, see _bump_after_commit.
+# `python manage.py rebuild_booking_rollups` recomputes everything from the bookings table if they drift
+# (raw sql, queryset.update or bulk deletes skip Booking.save). bookings deleted with their showtime (a
+# showtime, room, cinema or movie deleted) skip Booking.delete too, see showtime_deleted
+
+
+STATE_FIELDS = ('showtime_id', 'payment_status', 'number_of_tickets', 'total_amount')
+
+
+def rollup_state(booking):
+    """the part of a booking the rollups depend on, compared before and after a save"""
+    if booking.pk is None:
+        return None
+    return tuple(getattr(booking, field) for field in STATE_FIELDS)
+
+
+def loaded_rollup_state(field_names, values):
+    """rollup state straight from the loaded row, None when a queryset.only() left some of it out"""
+    row = dict(zip(field_names, values))
+    if not all(field in row for field in STATE_FIELDS):
+        return None
+    return tuple(row[field] for field in STATE_FIELDS)
+
+
+def stored_rollup_state(booking):
+    return Booking.objects.filter(pk=booking.pk).values_list(*STATE_FIELDS).first()
+
+
+def _bump(model, keys, bookings, tickets, revenue):
+    changes = {
+        'bookings': F('bookings') + bookings,
+        'tickets': F('tickets') + tickets,
+        'revenue': F('revenue') + revenue,
+    }
+    if model.objects.filter(**keys).update(**changes):
+        return
+
+    # first booking of this bucket, a concurrent booking may create it at the same moment
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, bookings=bookings, tickets=tickets, revenue=revenue)
+    except IntegrityError:
+        model.objects.filter(**keys).update(**changes)
+
+
+def _apply(booking, state, sign):
+    """the (model, bucket keys, deltas) one booking state adds (sign 1) or removes (sign -1)"""
+    showtime_id, payment_status, tickets, revenue = state
+    if showtime_id == booking.showtime_id:
+        showtime = booking.showtime
+    else:
+        showtime = Showtime.objects.select_related('room').get(pk=showtime_id)
+
+    day = timezone.localdate(booking.created_at)
+    cinema_id = showtime.room.cinema_id if showtime.room_id else None
+    deltas = (sign, sign * tickets, sign * Decimal(revenue or 0))
+    return [
+        (
+            BookingDailyStat,
+            {'day': day, 'movie_id': showtime.movie_id, 'cinema_id': cinema_id, 'payment_status': payment_status},
+            deltas,
+        ),
+        (BookingTotalStat, {'movie_id': showtime.movie_id, 'payment_status': payment_status}, deltas),
+    ]
+
+
+def _bump_after_commit(changes):
+    # the counters are shared by every booking of a movie, updating them inside the booking transaction
+    # would hold their row locks until that commits and serialize all bookings of the movie behind each
+    # other. the deltas go in after the commit in a short transaction of their own instead (always daily
+    # then total so two of them can't deadlock). a crash right between the two commits loses the delta,
+    # rebuild_booking_rollups puts it back
+    def bump():
+        with transaction.atomic():
+            for model, keys, deltas in changes:
+                _bump(model, keys, *deltas)
+
+    if changes:
+        transaction.on_commit(bump)
+
+
+def record_booking_change(booking, old_state):
+    """move a saved booking from its old rollup buckets to the new ones (old_state None for new bookings)"""
+    new_state = rollup_state(booking)
+    if new_state == old_state:
+        return
+    changes = []
+    if old_state is not None:
+        changes += _apply(booking, old_state, -1)
+        # the cached revenue series of the month the booking was made in is outdated now
+        touch_booking_period(booking)
+    if new_state is not None:
+        changes += _apply(booking, new_state, 1)
+    _bump_after_commit(changes)
+
+
+def record_booking_deleted(booking, old_state):
+    if old_state is not None:
+        _bump_after_commit(_apply(booking, old_state, -1))
+        touch_booking_period(booking)
+
+
+@receiver(pre_delete, sender=Showtime)
+def showtime_deleted(sender, instance, origin=None, **kwargs):
+    # the bookings of a deleted showtime go with it in the cascade, one per row through Booking.delete would
+    # be a query and two counter updates each. the movies involved are rebuilt from the bookings table once
+    # after the commit instead, one set per delete() call (a deleted movie takes its rollup rows along)
+    target = origin if origin is not None else instance
+    movie_ids = target.__dict__.get('_rollup_movie_ids')
+    if movie_ids is None:
+        movie_ids = target._rollup_movie_ids = set()
+        transaction.on_commit(lambda: rebuild_rollups(movie_ids=movie_ids))
+    movie_ids.add(instance.movie_id)
+
+
+def rebuild_rollups(booking_model=Booking, daily_model=BookingDailyStat, total_model=BookingTotalStat, movie_ids=None):
+    """
+    recompute both rollup tables from the bookings table (only the rows of movie_ids when given), returns
+    (daily rows, total rows). the models can be swapped for the historical ones in a migration
+    """
+    bookings = booking_model.objects.all()
+    daily_rows = daily_model.objects.all()
+    total_rows = total_model.objects.all()
+    if movie_ids is not None:
+        bookings = bookings.filter(showtime__movie_id__in=movie_ids)
+        daily_rows = daily_rows.filter(movie_id__in=movie_ids)
+        total_rows = total_rows.filter(movie_id__in=movie_ids)
+
+    daily = bookings.annotate(day=TruncDate('created_at')).values(
+        'day',
+        'showtime__movie_id',
+        'showtime__room__cinema_id',
+        'payment_status',
+    ).annotate(
+        bookings=Count('id'),
+        tickets=Sum('number_of_tickets'),
+        revenue=Sum('total_amount'),
+    ).order_by()
+
+    totals = bookings.values(
+        'showtime__movie_id',
+        'payment_status',
+    ).annotate(
+        bookings=Count('id'),
+        tickets=Sum('number_of_tickets'),
+        revenue=Sum('total_amount'),
+    ).order_by()
+
+    with transaction.atomic():
+        daily_rows.delete()
+        total_rows.delete()
+        daily_rows = daily_model.objects.bulk_create([
+            daily_model(
+                day=row['day'],
+                movie_id=row['showtime__movie_id'],
+                cinema_id=row['showtime__room__cinema_id'],
+                payment_status=row['payment_status'],
+                bookings=row['bookings'],
+                tickets=row['tickets'] or 0,
+                revenue=row['revenue'] or 0,
+            )
+            for row in daily.iterator()
+        ], batch_size=1000)
+        total_rows = total_model.objects.bulk_create([
+            total_model(
+                movie_id=row['showtime__movie_id'],
+                payment_status=row['payment_status'],
+                bookings=row['bookings'],
+                tickets=row['tickets'] or 0,
+                revenue=row['revenue'] or 0,
+            )
+            for row in totals.iterator()
+        ], batch_size=1000)
+    return len(daily_rows), len(total_rows)
+
+
+def get_overview():
+    """numbers for BookingOverviewView, read from the rollups"""
+    today = timezone.localdate()
+    paid = Booking.PAYMENT_STATUS_PAID
+
+    totals = BookingTotalStat.objects.values('payment_status').annotate(
+        bookings=Sum('bookings'),
+        revenue=Sum('revenue'),
+    ).order_by()
+    total_bookings = sum(row['bookings'] for row in totals)
+    total_revenue = sum((row['revenue'] for row in totals if row['payment_status'] == paid), Decimal(0))
+
+    month_rows = BookingDailyStat.objects.filter(
+        day__gte=today.replace(day=1),
+        day__lte=today,
+    ).values('day').annotate(
+        daily_bookings=Sum('bookings'),
+        daily_revenue=Sum('revenue'),
+        paid_revenue=Sum('revenue', filter=Q(payment_status=paid)),
+    ).order_by('day')
+
+    today_bookings = 0
+    today_revenue = Decimal(0)
+    monthly_trends = []
+    for row in month_rows:
+        if row['day'] == today:
+            today_bookings = row['daily_bookings']
+            today_revenue = row['paid_revenue'] or Decimal(0)
+        monthly_trends.append({
+            'created_at__date': row['day'],
+            'daily_bookings': row['daily_bookings'],
+            'daily_revenue': row['daily_revenue'],
+        })
+
+    return {
+        'total_bookings': total_bookings,
+        'total_revenue': float(total_revenue),
+        'today_bookings': today_bookings,
+        'today_revenue': float(today_revenue),
+        'monthly_trends': monthly_trends,
+    }
+
+
+def get_summary():
+    """numbers for BookingSummaryView, read from the rollups"""
+    payment_stats = BookingTotalStat.objects.values('payment_status').annotate(
+        count=Sum('bookings'),
+        revenue=Sum('revenue'),
+    ).filter(count__gt=0).order_by()
+
+    popular_movies = BookingTotalStat.objects.filter(
+        payment_status=Booking.PAYMENT_STATUS_PAID,
+        bookings__gt=0,
+    ).values(
+        'movie__title',
+        'bookings',
+        'revenue',
+    ).order_by('-bookings')[:5]
+
+    return {
+        'payment_stats': list(payment_stats),
+        'popular_movies': [
+            {'showtime__movie__title': row['movie__title'], 'bookings': row['bookings'], 'revenue': row['revenue']}
+            for row in popular_movies
+        ],
+    }
@@ -1,3 +1,646 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import wait as wait_futures
+from unittest import mock
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from movies.models import Movie, Genre
+from showtimes.models import Cinema, ScreeningRoom, Showtime
+from showtimes.reservations import SeatsUnavailable, claim_seats
+from jobs.models import Job
+from jobs.queue import run_pending
+from outbox.models import OutboundEmail
+from bookings.admin import BookingAdmin
+from bookings.analytics import occupancy_report
+from bookings.exports import BOOKING_EXPORT_FIELDS, _export_value, get_export_bookings, stream_tickets_zip
+from bookings.models import Admission, Booking, BookingDailyStat, BookingTotalStat, get_ticket_storage
+from bookings import rendering
+from bookings.qr import _make_qr, verify_ticket_token
+from bookings.rendering import RenderUnavailable
+from bookings.rollups import get_overview, get_summary, rebuild_rollups
+from bookings.timeseries import revenue_timeseries
+from config.throttles import AdminOperationThrottle
 
-# Create your tests here.
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def count_statements(captured_queries):
+    """(reads, writes) of the captured sql, savepoints and transaction control are not counted"""
+    reads = writes = 0
+    for query in captured_queries:
+        statement = query['sql'].lstrip().split(' ', 1)[0].upper()
+        if statement in WRITE_STATEMENTS:
+            writes += 1
+        elif statement == 'SELECT':
+            reads += 1
+    return reads, writes
+
+
+def fake_ticket_rendering(test):
+    """stored tickets go to a temporary media folder and rendering returns fixed bytes, returns the render mock"""
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+    media = override_settings(MEDIA_ROOT=media_root)
+    media.enable()
+    test.addCleanup(media.disable)
+    render = mock.patch.object(Booking, 'generate_pdf_ticket', autospec=True, return_value=b'%PDF-1.4 ticket')
+    test.addCleanup(render.stop)
+    return render.start()
+
+
+class BookingTestMixin:
+    def setUp(self):
+        genre = Genre.objects.create(name='Action', description='Action movies')
+        movie = Movie.objects.create(
+            title='Test Movie',
+            description='Test',
+            genre=genre,
+            duration=120,
+            release_date=datetime.date(2025, 1, 1),
+        )
+        cinema = Cinema.objects.create(name='Test Cinema')
+        room = ScreeningRoom.objects.create(cinema=cinema, name='Room 1', capacity=20, seats_per_row=5)
+        self.showtime = Showtime.objects.create(
+            movie=movie,
+            room=room,
+            show_date=datetime.date.today() + datetime.timedelta(days=1),
+            show_time=datetime.time(18, 0),
+        )
+        self.client = APIClient()
+
+    def login_staff(self):
+        staff = get_user_model().objects.create_user(username='staff', password='x', is_staff=True)
+        self.client.force_authenticate(staff)
+
+    def book(self, seats, **headers):
+        return self.client.post('/api/v1/bookings/', {
+            'showtime': self.showtime.id,
+            'customer_name': 'Test Customer',
+            'customer_email': 'customer@example.com',
+            'seats': seats,
+            'number_of_tickets': len(seats),
+        }, format='json', headers=headers)
+
+
+class BookingCreateWriteAmplificationTest(BookingTestMixin, TestCase):
+    """
+    budget for POST /bookings/: one showtime read for validation, the locked seat read, the seat UPDATE,
+    the booking INSERT and the confirmation job INSERT. the two rollup UPDATEs run after the commit.
+    raise these numbers only on purpose
+    """
+    MAX_READS = 2
+    MAX_WRITES = 3
+
+    def test_create_booking_statement_budget(self):
+        # the first booking of the day also creates the rollup rows, measure the steady state
+        self.assertEqual(self.book(['B1']).status_code, 201)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.book(['A1', 'A2'])
+
+        self.assertEqual(response.status_code, 201, response.content)
+        reads, writes = count_statements(queries.captured_queries)
+        self.assertLessEqual(reads, self.MAX_READS, [query['sql'] for query in queries.captured_queries])
+        self.assertLessEqual(writes, self.MAX_WRITES, [query['sql'] for query in queries.captured_queries])
+
+        booking = Booking.objects.get(seats=['A1', 'A2'])
+        self.assertEqual(booking.payment_status, Booking.PAYMENT_STATUS_PAID)
+        self.assertTrue(booking.payment_reference)
+
+    def test_taken_seat_writes_nothing(self):
+        self.assertEqual(self.book(['A1']).status_code, 201)
+
+        # taken seats that slip past the validation pre-check fail on the locked claim before any insert
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertRaises(SeatsUnavailable):
+                Booking.create_booking(
+                    showtime=self.showtime,
+                    customer_name='Late Customer',
+                    customer_email='late@example.com',
+                    seats=['A1', 'A3'],
+                    number_of_tickets=2,
+                    total_amount=self.showtime.ticket_price * 2,
+                )
+
+        self.assertEqual(count_statements(queries.captured_queries)[1], 0)
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+class BookingRollupTest(BookingTestMixin, TestCase):
+    def test_rollups_follow_create_and_cancel(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(['A1', 'A2'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(['A3'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.get(seats=['A3']).cancel_booking()
+
+        expected = (get_overview(), get_summary())
+        rebuild_rollups()
+        self.assertEqual((get_overview(), get_summary()), expected)
+
+        overview = expected[0]
+        self.assertEqual(overview['total_bookings'], 2)
+        self.assertEqual(overview['today_bookings'], 2)
+        self.assertEqual(overview['today_revenue'], float(self.showtime.ticket_price * 2))
+
+    def test_rollups_are_bumped_after_commit(self):
+        # the first booking creates the rollup rows
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(['A1'])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.book(['A2'])
+        self.assertEqual(BookingTotalStat.objects.get().bookings, 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            for callback in callbacks:
+                callback()
+        self.assertEqual(BookingTotalStat.objects.get().bookings, 2)
+        self.assertEqual(BookingDailyStat.objects.get().bookings, 2)
+        self.assertEqual(count_statements(queries.captured_queries)[1], 2)
+
+    def test_cascade_deletes_take_the_bookings_out_of_the_rollups(self):
+        other_showtime = Showtime.objects.create(
+            movie=self.showtime.movie,
+            room=ScreeningRoom.objects.create(cinema=Cinema.objects.create(name='Other Cinema'), name='Room 2', capacity=20, seats_per_row=5),
+            show_date=self.showtime.show_date,
+            show_time=datetime.time(12, 0),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(['A1', 'A2'])
+            self.client.post('/api/v1/bookings/', {
+                'showtime': other_showtime.id,
+                'customer_name': 'Other Customer',
+                'customer_email': 'other@example.com',
+                'seats': ['A1'],
+                'number_of_tickets': 1,
+            }, format='json')
+        self.assertEqual(BookingTotalStat.objects.get().bookings, 2)
+
+        # the room goes, its showtime and booking with it, the other cinema keeps its numbers
+        with self.captureOnCommitCallbacks(execute=True):
+            self.showtime.room.delete()
+        self.assertEqual(BookingTotalStat.objects.get().bookings, 1)
+        self.assertEqual(BookingDailyStat.objects.get().cinema_id, other_showtime.room.cinema_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other_showtime.room.cinema.delete()
+        self.assertFalse(BookingTotalStat.objects.exists())
+        self.assertFalse(BookingDailyStat.objects.exists())
+
+    def test_deleting_the_movie_drops_its_rollups(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(['A1'])
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.showtime.movie.delete()
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(BookingTotalStat.objects.exists())
+        self.assertFalse(BookingDailyStat.objects.exists())
+
+
+class RevenueTimeSeriesTest(BookingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        # a monday and a sunday of the same week, on both sides of a month border
+        for seat, created in (('A1', datetime.datetime(2025, 6, 30, 10)), ('A2', datetime.datetime(2025, 7, 6, 20))):
+            self.book([seat])
+            Booking.objects.filter(seats=[seat]).update(created_at=timezone.make_aware(created))
+        self.price = self.showtime.ticket_price
+
+    def test_weeks_across_a_month_border_add_up(self):
+        series = revenue_timeseries(datetime.date(2025, 6, 1), datetime.date(2025, 7, 31), 'week')
+
+        self.assertEqual(len(series), 1)
+        self.assertEqual((series[0]['bookings'], series[0]['tickets'], series[0]['revenue']), (2, 2, self.price * 2))
+
+    def test_late_cancellation_refreshes_a_cached_month(self):
+        june = (datetime.date(2025, 6, 1), datetime.date(2025, 6, 30))
+        self.assertEqual(revenue_timeseries(*june)[0]['bookings'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.get(seats=['A1']).cancel_booking()
+
+        self.assertEqual(revenue_timeseries(*june), [])
+
+    def test_api_groups_and_validates(self):
+        self.login_staff()
+        url = '/api/v1/bookings/timeseries/'
+
+        response = self.client.get(url, {'from': '2025-06-01', 'to': '2025-07-31', 'granularity': 'month', 'group_by': 'movie'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([row['label'] for row in response.json()['series']], ['Test Movie', 'Test Movie'])
+
+        self.assertEqual(self.client.get(url, {'granularity': 'year'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'group_by': 'customer'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'from': '2025-01-01', 'to': '2025-03-01', 'granularity': 'hour'}).status_code, 400)
+
+
+@override_settings(PDF_RENDER_WORKERS=0)
+class TicketExportTest(BookingTestMixin, TestCase):
+    def test_render_giving_up_mid_stream_becomes_a_failed_entry(self):
+        self.book(['A1'])
+        self.book(['A2'])
+        first, second = Booking.objects.order_by('id')
+
+        with mock.patch('bookings.exports.wait_pdf', side_effect=[RenderUnavailable(), b'%PDF-1.4 ticket']):
+            archive = zipfile.ZipFile(io.BytesIO(b''.join(stream_tickets_zip(get_export_bookings(self.showtime.id)))))
+
+        self.assertEqual(archive.namelist(), [
+            f'failed_{first.booking_reference}.txt',
+            f'ticket_A2_{second.booking_reference}.pdf',
+        ])
+
+
+@override_settings(JOBS_RUN_EAGERLY=False)
+class BookingConfirmationJobTest(BookingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.render = fake_ticket_rendering(self)
+
+    def test_booking_leaves_the_ticket_and_email_to_a_job(self):
+        response = self.book(['A1'])
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.render.assert_not_called()
+        booking = Booking.objects.get()
+        confirmation = Job.objects.get(name='bookings.send_confirmation')
+        self.assertEqual(confirmation.payload, {'booking_id': booking.pk})
+
+        run_pending()
+
+        confirmation.refresh_from_db()
+        self.assertEqual(confirmation.status, Job.STATUS_DONE)
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.to, [booking.customer_email])
+        booking.refresh_from_db()
+        self.assertEqual(email.attachments[0]['name'], booking.ticket_pdf.name)
+
+    def test_failed_render_retries_the_job(self):
+        self.render.return_value = None
+        self.book(['A1'])
+
+        run_pending()
+
+        confirmation = Job.objects.get(name='bookings.send_confirmation')
+        self.assertEqual((confirmation.status, confirmation.attempts), (Job.STATUS_PENDING, 1))
+        self.assertFalse(OutboundEmail.objects.exists())
+
+
+class TicketPdfCacheTest(BookingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.render = fake_ticket_rendering(self)
+        self.book(['A1'])
+        self.booking = Booking.objects.get()
+        self.url = f'/api/v1/bookings/{self.booking.booking_reference}/download-ticket/'
+
+    def stored_tickets(self):
+        return sorted(get_ticket_storage().listdir('tickets')[1])
+
+    def test_stored_pdf_is_reused_until_the_ticket_changes(self):
+        first = self.client.get(self.url)
+        etag = first['ETag']
+        self.assertEqual(b''.join(first.streaming_content), b'%PDF-1.4 ticket')
+        self.assertEqual(etag, f'"{self.booking.get_ticket_version()}"')
+
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(self.client.get(self.url)['ETag'], etag)
+        self.assertEqual(self.render.call_count, 1)
+
+        Booking.objects.filter(pk=self.booking.pk).update(customer_name='Renamed Customer')
+        changed = self.client.get(self.url, headers={'If-None-Match': etag})
+
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(self.render.call_count, 2)
+        # the outdated file is gone
+        self.assertEqual(len(self.stored_tickets()), 1)
+
+    def test_concurrent_renders_keep_one_file(self):
+        first = Booking.objects.get(pk=self.booking.pk)
+        second = Booking.objects.get(pk=self.booking.pk)
+
+        winner = first.get_ticket_pdf()
+        loser = second.get_ticket_pdf()
+
+        self.assertEqual(loser.name, winner.name)
+        self.assertEqual(self.stored_tickets(), [winner.name.split('/')[-1]])
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.ticket_pdf.name, winner.name)
+        self.assertEqual(self.booking.ticket_version, self.booking.get_ticket_version())
+
+
+class BookingExportTest(BookingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.book(['A1'])
+        self.book(['A2', 'A3'])
+        self.first, self.second = Booking.objects.order_by('id')
+        Booking.objects.filter(pk=self.first.pk).update(customer_name='=HYPERLINK("http://evil.example","x")')
+        self.login_staff()
+
+    def export(self, export_type):
+        response = self.client.get('/api/v1/bookings/export/', {'type': export_type})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_streams_one_row_per_booking(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('csv'))))
+
+        self.assertEqual(list(rows[0]), list(BOOKING_EXPORT_FIELDS))
+        self.assertEqual([row['booking_reference'] for row in rows], [str(self.first.booking_reference), str(self.second.booking_reference)])
+        self.assertEqual(rows[1]['seats'], 'A2 A3')
+        self.assertEqual(rows[1]['customer_name'], 'Test Customer')
+
+    def test_csv_cells_never_start_a_formula(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('csv'))))
+
+        self.assertEqual(rows[0]['customer_name'], '\'=HYPERLINK("http://evil.example","x")')
+        for prefix in ('+', '-', '@', '\t', '\r'):
+            self.assertEqual(_export_value(f'{prefix}1'), f"'{prefix}1")
+        self.assertEqual(_export_value(['A1', 'A2']), 'A1 A2')
+
+    def test_ndjson_keeps_values_as_they_are(self):
+        lines = self.export('ndjson').splitlines()
+
+        self.assertEqual(len(lines), 2)
+        first, second = map(json.loads, lines)
+        self.assertEqual(list(first), list(BOOKING_EXPORT_FIELDS))
+        self.assertEqual(first['customer_name'], '=HYPERLINK("http://evil.example","x")')
+        self.assertEqual(second['seats'], ['A2', 'A3'])
+        self.assertEqual(second['total_amount'], str(self.second.total_amount))
+
+    def test_unknown_type_is_rejected(self):
+        response = self.client.get('/api/v1/bookings/export/', {'type': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+
+
+# os.system blocks on the shell command it gets as html, a picklable stand-in for a render that never returns
+@override_settings(PDF_RENDER_WORKERS=1, PDF_RENDER_QUEUE_SIZE=0, PDF_RENDER_TIMEOUT=1)
+class RenderPoolTest(TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(rendering, '_executor', None),
+            mock.patch.object(rendering, '_slots', None),
+            mock.patch.object(rendering, 'html_to_pdf', os.system),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(lambda: rendering._executor and rendering._executor.shutdown(cancel_futures=True))
+
+    def test_hung_render_gives_back_its_worker_and_slot(self):
+        future = rendering.submit_pdf('sleep 3')
+        hung_pool = rendering._executor
+        workers = list(hung_pool._processes.values())
+
+        with self.assertRaises(RenderUnavailable):
+            rendering.wait_pdf(future)
+
+        self.assertIsNone(rendering._executor)
+        self.assertTrue(rendering._slots.acquire(blocking=False))
+        rendering._slots.release()
+        wait_futures([future], timeout=5)
+        for worker in workers:
+            worker.join(timeout=5)
+            self.assertFalse(worker.is_alive())
+
+        # the next render gets a fresh pool
+        self.assertEqual(rendering.wait_pdf(rendering.submit_pdf('true')), 0)
+        self.assertIsNot(rendering._executor, hung_pool)
+
+
+class IdempotentBookingTest(BookingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_retry_replays_the_first_response(self):
+        first = self.book(['A1'], idempotency_key='retry-1')
+        replay = self.book(['A1'], idempotency_key='retry-1')
+
+        self.assertEqual(first.status_code, 201, first.content)
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_replay_from_the_booking_row_when_the_cache_lost_the_key(self):
+        first = self.book(['A1'], idempotency_key='retry-1')
+        cache.clear()
+
+        replay = self.book(['A1'], idempotency_key='retry-1')
+
+        self.assertEqual(replay.status_code, 201, replay.content)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json()['payment_result'], first.json()['payment_result'])
+        self.assertEqual(replay.json()['message'], first.json()['message'])
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.book(['A1'], idempotency_key='retry-1')
+        self.assertEqual(self.book(['A2'], idempotency_key='retry-1').status_code, 422)
+
+        # also once only the booking row remembers the key
+        cache.clear()
+        self.assertEqual(self.book(['A2'], idempotency_key='retry-1').status_code, 422)
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+class OccupancyResizeTest(BookingTestMixin, TestCase):
+    def test_shows_before_a_resize_are_decoded_with_their_own_layout(self):
+        room = self.showtime.room
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        past = Showtime.objects.create(movie=self.showtime.movie, room=room, show_date=yesterday, show_time=datetime.time(18, 0))
+        claim_seats(past.pk, ['A1', 'A2', 'A3', 'A4', 'A5'])
+
+        room.capacity, room.seats_per_row = 30, 6
+        room.save()
+        claim_seats(self.showtime.pk, ['A6', 'E6', 'B1'])
+
+        report = occupancy_report(yesterday, self.showtime.show_date)
+
+        self.assertEqual((report['seats_sold'], report['seats']), (8, 50))
+        heatmap, = report['heatmaps']
+        self.assertEqual((heatmap['showtimes'], heatmap['seats_per_row'], len(heatmap['rows'])), (1, 6, 5))
+        self.assertEqual(heatmap['sold_rate'][0], [0.0, 0.0, 0.0, 0.0, 0.0, 1.0])
+
+
+class TicketTokenTest(BookingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.book(['A1'])
+        self.booking = Booking.objects.get()
+
+    def test_token_round_trips_and_fits_a_small_qr_code(self):
+        token = self.booking.ticket_token
+
+        self.assertEqual(verify_ticket_token(token), self.booking.booking_reference)
+        self.assertEqual(verify_ticket_token(f' {token.lower()} '), self.booking.booking_reference)
+        # qr alphanumeric mode only has upper case letters, digits and a few symbols
+        self.assertRegex(token, r'^[A-Z0-9.]+$')
+        self.assertLessEqual(_make_qr(token).version, 3)
+
+    def test_token_signed_with_another_key_is_rejected(self):
+        token = self.booking.ticket_token
+        with override_settings(TICKET_SIGNING_KEY='another-key'):
+            self.assertIsNone(verify_ticket_token(token))
+        self.assertIsNone(verify_ticket_token('CB2' + token[3:]))
+
+    def test_qr_endpoint_serves_png_and_svg(self):
+        url = f'/api/v1/bookings/{self.booking.booking_reference}/qr/'
+
+        png = self.client.get(url)
+        svg = self.client.get(url, {'type': 'svg'})
+
+        self.assertEqual((png.status_code, png['Content-Type']), (200, 'image/png'))
+        self.assertTrue(png.content.startswith(b'\x89PNG'))
+        self.assertEqual(svg['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'<svg', svg.content)
+        self.assertIn('max-age', png['Cache-Control'])
+
+        self.booking.cancel_booking()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class CheckInTest(BookingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.book(['A1', 'A2'])
+        self.book(['A3'])
+        self.first, self.second = Booking.objects.order_by('id')
+        self.login_staff()
+
+    def scan(self, *tokens):
+        response = self.client.post('/api/v1/bookings/checkin/', {
+            'showtime': self.showtime.id,
+            'scans': [{'token': token} for token in tokens],
+            'device': 'gate-1',
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [result['status'] for result in response.json()['results']]
+
+    def test_ticket_is_admitted_once(self):
+        self.assertEqual(self.scan(self.first.ticket_token), ['admitted'])
+        self.assertEqual(self.scan(self.first.ticket_token, self.second.ticket_token), ['already_admitted', 'admitted'])
+
+        admission = Admission.objects.get(booking=self.first)
+        self.assertEqual(admission.device, 'gate-1')
+        self.assertEqual(Admission.objects.count(), 2)
+
+    def test_double_admission_is_caught_after_a_cache_flush(self):
+        self.scan(self.first.ticket_token)
+        cache.clear()
+
+        self.assertEqual(self.scan(self.first.ticket_token), ['already_admitted'])
+        self.assertEqual(Admission.objects.count(), 1)
+
+    def test_scans_and_manifest_share_the_staff_throttle(self):
+        with mock.patch.object(AdminOperationThrottle, 'THROTTLE_RATES', {'admin': '2/minute'}):
+            self.scan(self.first.ticket_token)
+            self.assertEqual(self.client.get(f'/api/v1/bookings/checkin/manifest/{self.showtime.id}/').status_code, 200)
+            self.assertEqual(self.client.get(f'/api/v1/bookings/checkin/manifest/{self.showtime.id}/').status_code, 429)
+
+    def test_forged_or_garbled_tokens_are_invalid(self):
+        token = self.first.ticket_token
+        forged = token[:-1] + ('A' if token[-1] != 'A' else 'B')
+
+        self.assertEqual(self.scan(forged, 'junk'), ['invalid', 'invalid'])
+        self.assertFalse(Admission.objects.exists())
+
+    def test_cancelled_ticket_is_not_admitted(self):
+        self.scan(self.second.ticket_token)  # builds the manifest
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.cancel_booking()
+
+        self.assertEqual(self.scan(self.first.ticket_token), ['not_found'])
+
+    def test_manifest_lists_paid_bookings_and_admissions(self):
+        self.scan(self.first.ticket_token)
+        cache.clear()  # rebuilt from the database
+
+        manifest = self.client.get(f'/api/v1/bookings/checkin/manifest/{self.showtime.id}/').json()
+
+        self.assertEqual(len(manifest['bookings']), 2)
+        self.assertEqual(len(manifest['admitted']), 1)
+        self.assertEqual(manifest['seat_codes'][:3], ['A1', 'A2', 'A3'])
+
+
+class BookingPaginationTest(BookingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for seat in ['A1', 'A2', 'A3', 'A4', 'A5']:
+            self.book([seat])
+        # the same created_at for some rows, the id breaks the tie
+        Booking.objects.filter(seats__in=[['A2'], ['A3'], ['A4']]).update(created_at=timezone.now())
+        self.login_staff()
+
+    def test_next_links_walk_every_booking_once_newest_first(self):
+        seen = []
+        url = '/api/v1/bookings/?page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 2)
+            seen += [booking['booking_reference'] for booking in page['results']]
+            url = page['next']
+
+        expected = Booking.objects.order_by('-created_at', '-id').values_list('booking_reference', flat=True)
+        self.assertEqual(seen, [str(reference) for reference in expected])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/v1/bookings/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.json())
+
+
+class BookingAdminSearchTest(BookingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.book(['A1'])
+        self.book(['A2'])
+        Booking.objects.filter(seats=['A2']).update(customer_name='Other Person', customer_email='other@example.com')
+        self.booking = Booking.objects.get(seats=['A1'])
+        self.model_admin = BookingAdmin(Booking, admin.site)
+
+    def search(self, term):
+        queryset, may_have_duplicates = self.model_admin.get_search_results(None, Booking.objects.all(), term)
+        self.assertFalse(may_have_duplicates)
+        return queryset
+
+    def test_reference_is_an_exact_uuid_lookup(self):
+        queryset = self.search(f' {self.booking.booking_reference} ')
+
+        self.assertEqual(list(queryset), [self.booking])
+        self.assertNotIn('UPPER(', str(queryset.query))
+
+    def test_email_and_name_prefix(self):
+        self.assertEqual(list(self.search('CUSTOMER@example.com')), [self.booking])
+        self.assertEqual(list(self.search('test cust')), [self.booking])
+        self.assertFalse(self.search('example.com').exists())
+
+    def test_changelist_search(self):
+        user = get_user_model().objects.create_superuser(username='admin', password='x')
+        self.client.force_login(user)
+
+        response = self.client.get('/admin/bookings/booking/', {'q': str(self.booking.booking_reference)})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['cl'].queryset), [self.booking])
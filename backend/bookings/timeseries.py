@@ -0,0 +1,124 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from bookings.models import Booking
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+MAX_DAYS = {'hour': 31, 'day': 731, 'week': 3660, 'month': 3660}
+
+# group_by -> (id column, label column)
+GROUP_FIELDS = {
+    'movie': ('showtime__movie_id', 'showtime__movie__title'),
+    'cinema': ('showtime__room__cinema_id', 'showtime__room__cinema__name'),
+    'payment_method': ('payment_method', None),
+}
+
+
+# REVENUE TIME SERIES
+# paid bookings per truncated created_at period, a plain created_at range on the booking_created_idx index.
+# the range is computed month by month: months that are over are cached forever under a per month version
+# that is bumped whenever a booking created in that month changes status (a late cancellation), the
+# current month is always computed live. chunks are merged so weeks across a month border add up
+def _month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(value):
+    return _month_start(_month_start(value) + datetime.timedelta(days=32))
+
+
+def _version_key(month_start):
+    return f"booking-timeseries-version:{month_start:%Y-%m}"
+
+
+def touch_booking_period(booking):
+    """a booking of a (maybe closed) month changed, drop that month's cached series after commit"""
+    key = _version_key(_month_start(timezone.localtime(booking.created_at)))
+
+    def bump():
+        # add then incr so the version never goes back to an old value if the key was evicted
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+    transaction.on_commit(bump)
+
+
+def _query(start, end, granularity, group_by):
+    rows = Booking.objects.filter(
+        payment_status=Booking.PAYMENT_STATUS_PAID,
+        created_at__gte=start,
+        created_at__lt=end,
+    ).annotate(period=Trunc('created_at', granularity))
+
+    group_field, label_field = GROUP_FIELDS.get(group_by, (None, None))
+    fields = ['period'] + [field for field in (group_field, label_field) if field]
+    rows = rows.values(*fields).annotate(
+        bookings=Count('id'),
+        tickets=Sum('number_of_tickets'),
+        revenue=Sum('total_amount'),
+    ).order_by()
+
+    return [
+        {
+            'period': row['period'],
+            'group': row[group_field] if group_field else None,
+            'label': row[label_field] if label_field else (row[group_field] if group_field else None),
+            'bookings': row['bookings'],
+            'tickets': row['tickets'] or 0,
+            'revenue': row['revenue'] or Decimal(0),
+        }
+        for row in rows
+    ]
+
+
+def _chunk(start, end, granularity, group_by, current_month):
+    month = _month_start(start)
+    if month >= current_month:
+        return _query(start, end, granularity, group_by)
+
+    version = cache.get(_version_key(month), 0)
+    cache_key = f"booking-timeseries:{start.isoformat()}:{end.isoformat()}:{granularity}:{group_by}:{version}"
+    rows = cache.get(cache_key)
+    if rows is None:
+        rows = _query(start, end, granularity, group_by)
+        cache.set(cache_key, rows, None)
+    return rows
+
+
+def revenue_timeseries(date_from, date_to, granularity='day', group_by=None):
+    """paid bookings, tickets and revenue per period (and group) for created dates date_from..date_to"""
+    start = timezone.make_aware(datetime.datetime.combine(date_from, datetime.time.min))
+    end = timezone.make_aware(datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time.min))
+    current_month = _month_start(timezone.localtime())
+
+    totals = defaultdict(lambda: {'bookings': 0, 'tickets': 0, 'revenue': Decimal(0), 'label': None})
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(_next_month(chunk_start), end)
+        for row in _chunk(chunk_start, chunk_end, granularity, group_by, current_month):
+            entry = totals[(row['period'], row['group'])]
+            entry['bookings'] += row['bookings']
+            entry['tickets'] += row['tickets']
+            entry['revenue'] += row['revenue']
+            entry['label'] = row['label']
+        chunk_start = chunk_end
+
+    return [
+        {
+            'period': period,
+            'group': group,
+            'label': entry['label'],
+            'bookings': entry['bookings'],
+            'tickets': entry['tickets'],
+            'revenue': entry['revenue'],
+        }
+        for (period, group), entry in sorted(totals.items(), key=lambda item: (item[0][0], str(item[0][1])))
+    ]
@@ -0,0 +1,89 @@
+import json
+import base64
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+class KeysetPagination:
+    """
+    cursor pagination on a unique (column, id) pair: the next page is "rows after the last one" as a plain
+    WHERE on an index instead of OFFSET + COUNT(*), so page 10 000 costs the same as page 1.
+    subclasses set ordering to the newest-first or oldest-first column plus id, e.g. ("-created_at", "-id")
+    """
+    ordering = ("-created_at", "-id")
+    page_size = 25
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+
+    def paginate_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(position))
+
+        # one extra row tells if there is a next page without counting
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "page_size": self.page_size,
+            "results": data,
+        })
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param)
+        if value is None:
+            return self.page_size
+        try:
+            page_size = int(value)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: "page_size must be a positive integer"})
+        if page_size <= 0:
+            raise ValidationError({self.page_size_query_param: "page_size must be a positive integer"})
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_first_link(self):
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    def _fields(self):
+        return [field.lstrip("-") for field in self.ordering]
+
+    def _after(self, position):
+        # (a, b) after (x, y) is a > x OR (a = x AND b > y), flipped to < for descending columns
+        (column, id_field), (column_value, id_value) = self._fields(), position
+        column_lookup = "lt" if self.ordering[0].startswith("-") else "gt"
+        id_lookup = "lt" if self.ordering[1].startswith("-") else "gt"
+        return Q(**{f"{column}__{column_lookup}": column_value}) | Q(
+            **{column: column_value, f"{id_field}__{id_lookup}": id_value}
+        )
+
+    def encode_cursor(self, instance):
+        column, id_field = self._fields()
+        value = getattr(instance, column)
+        position = [value.isoformat() if hasattr(value, "isoformat") else value, getattr(instance, id_field)]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            column_value, id_value = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            return column_value, int(id_value)
+        except (ValueError, TypeError):
+            raise ValidationError({self.cursor_query_param: "Invalid cursor."})
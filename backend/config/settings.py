@@ -2,6 +2,7 @@ from pathlib import Path
 from decouple import config, Csv
 import cloudinary
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = config('SECRET_KEY')
@@ -30,6 +31,8 @@ INSTALLED_APPS = [
     'users',
     'showtimes',
     'bookings',
+    'jobs',
+    'outbox',
 ]
 
 MIDDLEWARE = [
@@ -56,6 +59,10 @@ else:
         config("FRONTEND_URL")
     ]
 
+# the frontend sends an Idempotency-Key with POST /bookings/ and can see when a response was replayed
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -94,6 +101,36 @@ else:
         }
     }
 
+# SEAT HOLDS: how long picked seats stay reserved in the cache before the booking is made
+SEAT_HOLD_TTL = config('SEAT_HOLD_TTL', default=600, cast=int)    # seconds
+SEAT_HOLD_MAX_SEATS = config('SEAT_HOLD_MAX_SEATS', default=10, cast=int)
+
+# ROOM LAYOUT CHANGES: resized rooms with more upcoming showtimes than this are synced by a background job
+ROOM_LAYOUT_SYNC_LIMIT = config('ROOM_LAYOUT_SYNC_LIMIT', default=500, cast=int)
+
+# IDEMPOTENCY KEYS: responses of POST /bookings/ with an Idempotency-Key header are replayed for retries
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=60 * 60 * 24, cast=int)    # seconds a stored response is replayed
+IDEMPOTENCY_LOCK_TTL = config('IDEMPOTENCY_LOCK_TTL', default=60, cast=int)    # seconds before a stuck request frees its key
+
+# BACKGROUND JOBS: confirmation work (qr code, pdf ticket, email) is queued in the jobs table and
+# processed by `python manage.py run_jobs`, set JOBS_RUN_EAGERLY=True to run them in-process after commit instead
+JOBS_RUN_EAGERLY = config('JOBS_RUN_EAGERLY', default=False, cast=bool)
+JOBS_MAX_ATTEMPTS = config('JOBS_MAX_ATTEMPTS', default=5, cast=int)
+JOBS_LOCK_TIMEOUT = config('JOBS_LOCK_TIMEOUT', default=600, cast=int)    # seconds before a running job is considered abandoned
+
+# EMAIL OUTBOX: emails are stored in the outbox table and sent in batches over one smtp connection by the
+# 'outbox.send_pending' job or `python manage.py send_outbox`
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=50, cast=int)    # emails per smtp connection
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+
+# PDF RENDERING: ticket pdfs render in a process pool, 0 workers renders inline in the web process
+PDF_RENDER_WORKERS = config('PDF_RENDER_WORKERS', default=2, cast=int)
+PDF_RENDER_QUEUE_SIZE = config('PDF_RENDER_QUEUE_SIZE', default=8, cast=int)    # renders allowed to wait for a worker before 503
+PDF_RENDER_TIMEOUT = config('PDF_RENDER_TIMEOUT', default=20, cast=int)    # seconds
+
+# TICKETS: key for the hmac in the ticket qr token, rotating it invalidates every issued qr code
+TICKET_SIGNING_KEY = config('TICKET_SIGNING_KEY', default=SECRET_KEY)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
@@ -179,6 +216,10 @@ if USE_CLOUDINARY:
         'staticfiles': {
             'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
         },
+        # rendered pdf tickets are not images so they need cloudinary raw storage
+        'tickets': {
+            'BACKEND': 'cloudinary_storage.storage.RawMediaCloudinaryStorage',
+        },
     }
 
     # cloudinary configuration for api calls
@@ -201,6 +242,18 @@ else:
     MEDIA_URL = config('MEDIA_URL', default='/media/')
     MEDIA_ROOT = BASE_DIR / config('MEDIA_ROOT', default='media')
 
+    STORAGES = {
+        'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
+        'staticfiles': {
+            'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+        },
+        'tickets': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
+    }
+
 # EMAIL CONFIGURATION
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
@@ -209,7 +262,9 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@yourcinema.com')
+EMAIL_TIMEOUT = config('EMAIL_TIMEOUT', default=30, cast=int)    # seconds, a hanging smtp server must not block the outbox forever
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=str(BASE_DIR / 'sent_emails'))    # for the filebased backend
 
-# for development/testing - use console email backend
-if DEBUG:
+# for development/testing - use console email backend unless another backend is configured
+if DEBUG and not config('EMAIL_BACKEND', default=''):
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
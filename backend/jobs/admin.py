@@ -0,0 +1,16 @@
+from django.contrib import admin
+from jobs.models import Job
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = [
+        'id',
+        'name',
+        'status',
+        'attempts',
+        'run_after',
+        'created_at',
+        'finished_at',
+    ]
+    list_filter = ['status', 'name']
+    readonly_fields = ['created_at', 'updated_at', 'finished_at', 'locked_at']
@@ -0,0 +1,50 @@
+import time
+import threading
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from jobs.queue import run_pending
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (ticket emails, qr codes ...), keeps polling unless --once"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="process the jobs that are due and exit")
+        parser.add_argument('--threads', type=int, default=1, help="number of worker threads")
+        parser.add_argument('--batch-size', type=int, default=10, help="jobs claimed per poll per thread")
+        parser.add_argument('--sleep', type=float, default=2.0, help="seconds to wait when the queue is empty")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            processed = self._drain(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} job(s)"))
+            return
+
+        threads = [
+            threading.Thread(target=self._work, args=(options['batch_size'], options['sleep']), daemon=True)
+            for _ in range(max(options['threads'], 1))
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f"Job worker started with {len(threads)} thread(s)")
+
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Job worker stopped")
+
+    def _drain(self, batch_size):
+        processed = 0
+        while True:
+            count = run_pending(batch_size)
+            processed += count
+            if count == 0:
+                return processed
+
+    def _work(self, batch_size, sleep):
+        while True:
+            # every thread has its own db connection, drop it when it went stale between polls
+            close_old_connections()
+            if run_pending(batch_size) == 0:
+                time.sleep(sleep)
@@ -0,0 +1,107 @@
+import logging
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+# registered handlers: job name -> function(**payload)
+_handlers = {}
+
+
+def job(name):
+    """register a function as a background job handler, usage: @job("bookings.send_confirmation")"""
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, max_attempts=None, run_after=None, **payload):
+    """
+    persist a job row, call it inside the same transaction as the data it works on so the job only
+    exists if that data was committed. with JOBS_RUN_EAGERLY it runs right after commit in this process,
+    jobs with a run_after in the future are left to the worker
+    """
+    if name not in _handlers:
+        raise ValueError(f"No job handler registered for '{name}'")
+
+    queued = Job.objects.create(
+        name=name,
+        payload=payload,
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        run_after=run_after or timezone.now(),
+    )
+    if settings.JOBS_RUN_EAGERLY and queued.run_after <= timezone.now():
+        transaction.on_commit(lambda: _run_eagerly(queued.pk))
+    return queued
+
+
+def _run_eagerly(job_id):
+    if _claim(job_id):
+        run_job(Job.objects.get(pk=job_id))
+
+
+def _claim(job_id):
+    # compare and set so two workers can never run the same job, works the same on postgres and sqlite
+    return Job.objects.filter(pk=job_id, status__in=[Job.STATUS_PENDING, Job.STATUS_RUNNING]).filter(
+        _claimable()
+    ).update(status=Job.STATUS_RUNNING, locked_at=timezone.now()) == 1
+
+
+def _claimable():
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    # running jobs with an old lock belong to a worker that died, they are picked up again
+    return (
+        Q(status=Job.STATUS_PENDING, run_after__lte=now)
+        | Q(status=Job.STATUS_RUNNING, locked_at__lt=stale)
+    )
+
+
+def claim_jobs(limit=10):
+    candidates = Job.objects.filter(_claimable()).order_by('run_after').values_list('pk', flat=True)[:limit]
+    return [job_id for job_id in candidates if _claim(job_id)]
+
+
+def run_job(queued):
+    handler = _handlers.get(queued.name)
+    queued.attempts += 1
+
+    try:
+        if handler is None:
+            raise LookupError(f"No job handler registered for '{queued.name}'")
+        handler(**queued.payload)
+    except Exception:
+        queued.last_error = traceback.format_exc()
+        if queued.attempts >= queued.max_attempts:
+            queued.status = Job.STATUS_FAILED
+            queued.finished_at = timezone.now()
+            logger.error("job %s failed permanently after %s attempts", queued, queued.attempts)
+        else:
+            # exponential backoff 30s, 60s, 120s ...
+            queued.status = Job.STATUS_PENDING
+            queued.run_after = timezone.now() + timedelta(seconds=30 * 2 ** (queued.attempts - 1))
+            logger.warning("job %s failed, retrying at %s", queued, queued.run_after)
+    else:
+        queued.status = Job.STATUS_DONE
+        queued.finished_at = timezone.now()
+        queued.last_error = ''
+
+    queued.locked_at = None
+    queued.save(update_fields=[
+        'status', 'attempts', 'run_after', 'locked_at', 'last_error', 'finished_at', 'updated_at'
+    ])
+    return queued.status == Job.STATUS_DONE
+
+
+def run_pending(limit=10):
+    """claim and run up to limit due jobs, returns how many were processed"""
+    job_ids = claim_jobs(limit)
+    for queued in Job.objects.filter(pk__in=job_ids).order_by('run_after'):
+        run_job(queued)
+    return len(job_ids)
@@ -0,0 +1,91 @@
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from jobs.models import Job
+from jobs.queue import enqueue, job, run_pending
+
+calls = []
+
+
+@job('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@job('tests.fail')
+def fail():
+    raise RuntimeError('boom')
+
+
+@override_settings(JOBS_RUN_EAGERLY=False, JOBS_MAX_ATTEMPTS=3)
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_due_job_runs_once(self):
+        queued = enqueue('tests.record', value=1)
+
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(run_pending(), 0)
+
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.STATUS_DONE, 1))
+        self.assertEqual(calls, [1])
+
+    def test_unknown_handler_is_rejected(self):
+        with self.assertRaises(ValueError):
+            enqueue('tests.missing')
+
+    def test_job_scheduled_for_later_waits(self):
+        queued = enqueue('tests.record', value=1, run_after=timezone.now() + timedelta(minutes=5))
+
+        self.assertEqual(run_pending(), 0)
+
+        Job.objects.filter(pk=queued.pk).update(run_after=timezone.now())
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [1])
+
+    def test_failed_job_backs_off_then_fails_permanently(self):
+        queued = enqueue('tests.fail')
+
+        run_pending()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.STATUS_PENDING, 1))
+        self.assertGreater(queued.run_after, timezone.now())
+        self.assertIn('boom', queued.last_error)
+
+        for _ in range(2):
+            Job.objects.filter(pk=queued.pk).update(run_after=timezone.now())
+            run_pending()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.STATUS_FAILED, 3))
+        self.assertIsNotNone(queued.finished_at)
+
+    @override_settings(JOBS_LOCK_TIMEOUT=60)
+    def test_job_of_a_dead_worker_is_picked_up_again(self):
+        queued = enqueue('tests.record', value=1)
+        Job.objects.filter(pk=queued.pk).update(status=Job.STATUS_RUNNING, locked_at=timezone.now())
+        self.assertEqual(run_pending(), 0)
+
+        Job.objects.filter(pk=queued.pk).update(locked_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [1])
+
+
+@override_settings(JOBS_RUN_EAGERLY=True)
+class EagerJobTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_job_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('tests.record', value=1)
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, [1])
+        self.assertEqual(Job.objects.get().status, Job.STATUS_DONE)
+
+    def test_job_scheduled_for_later_is_left_to_the_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('tests.record', value=1, run_after=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(calls, [])
+        self.assertEqual(Job.objects.get().status, Job.STATUS_PENDING)
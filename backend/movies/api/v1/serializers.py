@@ -2,6 +2,8 @@ from rest_framework import serializers
 from movies.models import Genre, Movie
 from showtimes.models import Showtime, ScreeningRoom
 from django.utils import timezone
+from django.db import IntegrityError
+from showtimes.scheduling import duration_conflicts, duration_conflict_messages
 
 class ScreeningRoomSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,6 +21,7 @@ class ShowtimeSerializer(serializers.ModelSerializer):
             'show_time',
             'room',
             'ticket_price',
+            'seats_available',
             'is_active']
 
 # minimall GENRE fields
@@ -117,6 +120,23 @@ class MovieSerializer(serializers.ModelSerializer):
 
         return value
 
+    def validate_duration(self, value):
+        # a longer movie can push its showtimes into the next show of their rooms
+        if self.instance is not None and value != self.instance.duration:
+            conflicts = duration_conflicts(self.instance.pk, value)
+            if conflicts:
+                raise serializers.ValidationError(duration_conflict_messages(conflicts))
+        return value
+
+    def update(self, instance, validated_data):
+        try:
+            return super().update(instance, validated_data)
+        except IntegrityError:
+            if 'duration' not in validated_data:
+                raise
+            # a showtime scheduled between the check above and the save hits the exclusion constraint (see Movie.save)
+            raise serializers.ValidationError({'duration': ["Some showtimes of this movie would overlap the next show in their room."]})
+
 # minimal fields of GENRE including the count of related movies
 class GenreMovieCountSerializer(serializers.ModelSerializer):
     movie_count = serializers.IntegerField(read_only=True)
@@ -3,9 +3,10 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.exceptions import NotFound
 from rest_framework.parsers import MultiPartParser, JSONParser
-from django.db.models import Count, Prefetch
+from django.db.models import Count, Prefetch, Exists, OuterRef
 from django.utils import timezone
 from showtimes.models import Showtime  
+from showtimes.api.v1.services import filter_by_availability, has_availability_filters
 from utils.base_views import BaseDetailView
 from .services import (
     get_movies,
@@ -157,16 +158,26 @@ class MovieListView(APIView):
         return[StaffUserOnly()]
 
     def get(self, request):
+        showtimes = filter_by_availability(
+            # starts_at is stored in utc from the cinema's local date and time, so "upcoming" is right in every
+            # time zone (a calendar date compared to the utc date is a day off around midnight)
+            Showtime.objects.filter(
+                is_active=True,
+                starts_at__gte=timezone.now()
+            ),
+            request.query_params,
+        )
         movies = Movie.objects.select_related('genre').prefetch_related(
             Prefetch(
                 'showtimes',
-                queryset=Showtime.objects.filter(
-                    is_active=True,
-                    show_date__gte=timezone.now().date()
-                ).order_by('show_date', 'show_time')
+                queryset=showtimes.order_by('starts_at', 'id')
             )
         ).all()
 
+        # when filtering by seats only keep movies that still have a matching showtime
+        if has_availability_filters(request.query_params):
+            movies = movies.filter(Exists(showtimes.filter(movie=OuterRef('pk'))))
+
         genre_id = request.query_params.get("genre")
         if genre_id:
             movies = movies.filter(genre_id=genre_id)
@@ -257,8 +268,8 @@ class MovieSearchView(APIView):
                 "showtimes",
                 queryset=Showtime.objects.filter(
                     is_active=True,
-                    show_date__gte=timezone.now().date()
-                ).order_by("show_date", "show_time")
+                    starts_at__gte=timezone.now()
+                ).order_by("starts_at", "id")
             )
         )
         if query:
@@ -1,4 +1,6 @@
-from django.db import models
+from datetime import timedelta
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 
 class Genre(models.Model):
     name = models.CharField(max_length=70, unique=True)
@@ -41,6 +43,47 @@ class Movie(models.Model):
     def __str__(self):
         return f"{self.title} - {self.genre} rated {self.age_rating}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remembered so save() knows whether the duration changed without reading the row again
+        instance._loaded_duration = dict(zip(field_names, values)).get('duration')
+        return instance
+
+    def duration_changed(self):
+        if not self.pk:
+            return False
+        loaded = getattr(self, '_loaded_duration', None)
+        if loaded is None:
+            loaded = Movie.objects.filter(pk=self.pk).values_list('duration', flat=True).first()
+        return loaded is not None and loaded != self.duration
+
+    def clean(self):
+        # showtimes store their end time (start + duration + cleanup) so a new duration moves all of them,
+        # refuse it when that makes a showtime run into the next one in its room (the api serializer runs
+        # the same check in validate_duration)
+        if self.duration_changed():
+            from showtimes.scheduling import duration_conflicts, duration_conflict_messages
+            conflicts = duration_conflicts(self.pk, self.duration)
+            if conflicts:
+                raise ValidationError({'duration': duration_conflict_messages(conflicts)})
+
+    def save(self, *args, **kwargs):
+        # no validation here, that is clean() / the serializer. a show scheduled after the check still fails
+        # the exclusion constraint on postgres with an IntegrityError and rolls the whole save back
+        if not self.duration_changed():
+            super().save(*args, **kwargs)
+            self._loaded_duration = self.duration
+            return
+
+        from showtimes.scheduling import CLEANUP_MINUTES
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.showtimes.exclude(starts_at=None).update(
+                ends_at=models.F('starts_at') + timedelta(minutes=self.duration + CLEANUP_MINUTES)
+            )
+        self._loaded_duration = self.duration
+    
     class Meta:
         ordering = ['-release_date', 'title']
         indexes = [
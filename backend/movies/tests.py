@@ -1,3 +1,50 @@
+import datetime
+from unittest import mock
 from django.test import TestCase
+from rest_framework.test import APIClient
+from movies.models import Movie, Genre
+from showtimes.models import Cinema, ScreeningRoom, Showtime
 
-# Create your tests here.
+
+class MovieListingTimeZoneTest(TestCase):
+    """upcoming shows are picked by their utc start, not by comparing the local show date to the utc date"""
+
+    def setUp(self):
+        genre = Genre.objects.create(name='Action', description='Action movies')
+        self.movie = Movie.objects.create(
+            title='Test Movie',
+            description='Test',
+            genre=genre,
+            duration=120,
+            release_date=datetime.date(2025, 1, 1),
+        )
+        self.client = APIClient()
+
+    def schedule(self, timezone, show_date, show_time):
+        cinema = Cinema.objects.create(name=f'Cinema {timezone}', timezone=timezone)
+        room = ScreeningRoom.objects.create(cinema=cinema, name='Room 1', capacity=20, seats_per_row=5)
+        return Showtime.objects.create(movie=self.movie, room=room, show_date=show_date, show_time=show_time)
+
+    def listed_showtimes(self, now, url='/api/v1/movies/'):
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            movies = self.client.get(url).json()
+        return [showtime['id'] for movie in movies for showtime in movie['showtimes']]
+
+    def test_late_show_west_of_utc_is_still_upcoming(self):
+        # 20:00 on the 18th in los angeles is already the 19th in utc
+        now = datetime.datetime(2026, 10, 19, 3, 0, tzinfo=datetime.timezone.utc)
+        late_show = self.schedule('America/Los_Angeles', datetime.date(2026, 10, 18), datetime.time(22, 0))
+
+        self.assertEqual(self.listed_showtimes(now), [late_show.id])
+        self.assertEqual(self.listed_showtimes(now, '/api/v1/movies/search/?search=test'), [late_show.id])
+
+    def test_show_after_local_midnight_east_of_utc_is_gone_once_started(self):
+        # 01:00 on the 19th in tokyo, the 00:30 show started but the 02:00 show is still to come
+        now = datetime.datetime(2026, 10, 18, 16, 0, tzinfo=datetime.timezone.utc)
+        started = self.schedule('Asia/Tokyo', datetime.date(2026, 10, 19), datetime.time(0, 30))
+        upcoming = Showtime.objects.create(
+            movie=self.movie, room=started.room, show_date=started.show_date, show_time=datetime.time(2, 0),
+        )
+
+        self.assertEqual(self.listed_showtimes(now), [upcoming.id])
+        self.assertEqual(self.listed_showtimes(now, '/api/v1/movies/search/?search=test'), [upcoming.id])
@@ -0,0 +1,16 @@
+from django.contrib import admin
+from outbox.models import OutboundEmail
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = [
+        'id',
+        'subject',
+        'status',
+        'attempts',
+        'next_attempt_at',
+        'created_at',
+        'sent_at',
+    ]
+    list_filter = ['status']
+    readonly_fields = ['created_at', 'sent_at', 'locked_at']
@@ -0,0 +1,8 @@
+from jobs.queue import job
+from outbox.sender import send_pending
+
+
+@job('outbox.send_pending')
+def send_outbox():
+    """drain the email outbox, mails that fail are rescheduled inside the outbox itself"""
+    send_pending()
@@ -0,0 +1,34 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from outbox.sender import send_batch, send_pending, outbox_stats
+
+
+class Command(BaseCommand):
+    help = "Send queued outbox emails in batches over one smtp connection, keeps polling unless --once"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="send the emails that are due and exit")
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE, help="emails sent per smtp connection")
+        parser.add_argument('--sleep', type=float, default=5.0, help="seconds to wait when the outbox is empty")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            sent, failed = send_pending(options['batch_size'])
+            stats = outbox_stats()
+            self.stdout.write(self.style.SUCCESS(
+                f"Sent {sent} email(s), {failed} failed ({stats['mails_per_second']} mails/s, "
+                f"{stats['pending']} pending, {stats['failed_permanently']} failed permanently)"
+            ))
+            return
+
+        self.stdout.write("Outbox sender started")
+        try:
+            while True:
+                close_old_connections()
+                sent, failed = send_batch(options['batch_size'])
+                if sent + failed == 0:
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write("Outbox sender stopped")
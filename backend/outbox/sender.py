@@ -0,0 +1,183 @@
+import time
+import logging
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import storages
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Min, Q
+from django.utils import timezone
+from jobs.models import Job
+from jobs.queue import enqueue
+from outbox.models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# EMAIL OUTBOX
+# mails are stored first and sent later in batches over ONE smtp connection (get_connection) instead of a
+# fresh smtp/tls handshake per booking. failed sends stay in the table and are retried with backoff
+_stats_lock = threading.Lock()
+_stats = {
+    "batches": 0,
+    "sent": 0,
+    "failed": 0,
+    "seconds": 0.0,
+}
+
+
+def queue_email(subject, body, to, attachments=None, from_email=None, content_subtype='html'):
+    """store a mail in the outbox, call it inside the transaction of the data it belongs to"""
+    email = OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        content_subtype=content_subtype,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+        attachments=attachments or [],
+        max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+    )
+    schedule_drain()
+    return email
+
+
+def schedule_drain(run_after=None):
+    """make sure a drain job runs by run_after (now by default)"""
+    run_after = run_after or timezone.now()
+    # one pending drain job that is due by then is enough, it sends everything that is due.
+    # a drain waiting for a later retry does not count, it would leave this mail sitting until then
+    if not Job.objects.filter(
+        name='outbox.send_pending', status=Job.STATUS_PENDING, run_after__lte=run_after,
+    ).exists():
+        enqueue('outbox.send_pending', run_after=run_after)
+
+
+def _claimable():
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    return (
+        Q(status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=now)
+        | Q(status=OutboundEmail.STATUS_SENDING, locked_at__lt=stale)
+    )
+
+
+def _claim_batch(batch_size):
+    candidates = list(
+        OutboundEmail.objects.filter(_claimable()).order_by('next_attempt_at').values_list('pk', flat=True)[:batch_size]
+    )
+    claimed = []
+    for email_id in candidates:
+        # compare and set so two senders never send the same mail
+        if OutboundEmail.objects.filter(pk=email_id).filter(_claimable()).update(
+            status=OutboundEmail.STATUS_SENDING, locked_at=timezone.now()
+        ):
+            claimed.append(email_id)
+    return OutboundEmail.objects.filter(pk__in=claimed).order_by('next_attempt_at')
+
+
+def _build_message(email, connection):
+    message = EmailMessage(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.to,
+        connection=connection,
+    )
+    message.content_subtype = email.content_subtype
+    for attachment in email.attachments:
+        with storages[attachment['storage']].open(attachment['name'], 'rb') as attachment_file:
+            message.attach(attachment['filename'], attachment_file.read(), attachment['mimetype'])
+    return message
+
+
+def _mark_failed(email, error):
+    email.attempts += 1
+    email.last_error = str(error)
+    email.locked_at = None
+    if email.attempts >= email.max_attempts:
+        email.status = OutboundEmail.STATUS_FAILED
+        logger.error("email %s failed permanently: %s", email.pk, error)
+    else:
+        # backoff 1, 2, 4, 8 ... minutes
+        email.status = OutboundEmail.STATUS_PENDING
+        email.next_attempt_at = timezone.now() + timedelta(minutes=2 ** (email.attempts - 1))
+        logger.warning("email %s failed, retrying at %s: %s", email.pk, email.next_attempt_at, error)
+    email.save(update_fields=['status', 'attempts', 'last_error', 'locked_at', 'next_attempt_at'])
+
+
+def send_batch(batch_size=None):
+    """send up to batch_size due mails over one connection, returns (sent, failed)"""
+    batch = list(_claim_batch(batch_size or settings.OUTBOX_BATCH_SIZE))
+    if not batch:
+        return 0, 0
+
+    started = time.monotonic()
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+        for email in batch:
+            try:
+                _build_message(email, connection).send()
+            except Exception as error:
+                failed += 1
+                _mark_failed(email, error)
+                # the smtp session may be broken now, start a clean one for the rest of the batch
+                connection.close()
+                connection.open()
+                continue
+
+            sent += 1
+            email.status = OutboundEmail.STATUS_SENT
+            email.attempts += 1
+            email.sent_at = timezone.now()
+            email.locked_at = None
+            email.last_error = ''
+            email.save(update_fields=['status', 'attempts', 'sent_at', 'locked_at', 'last_error'])
+    except Exception as error:
+        # could not even connect, everything left in the batch goes back to the queue
+        for email in batch:
+            if email.status == OutboundEmail.STATUS_SENDING:
+                failed += 1
+                _mark_failed(email, error)
+    finally:
+        connection.close()
+
+    elapsed = time.monotonic() - started
+    with _stats_lock:
+        _stats["batches"] += 1
+        _stats["sent"] += sent
+        _stats["failed"] += failed
+        _stats["seconds"] += elapsed
+    logger.info("outbox batch: %s sent, %s failed in %.2fs (%.1f mails/s)", sent, failed, elapsed, sent / elapsed if elapsed else 0)
+    return sent, failed
+
+
+def send_pending(batch_size=None):
+    """drain every due mail batch by batch, returns (sent, failed)"""
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = send_batch(batch_size)
+        total_sent += sent
+        total_failed += failed
+        if sent + failed == 0:
+            break
+
+    # failed mails wait for their backoff, without a drain job at that time nothing would pick them up
+    # again until the next mail is queued
+    next_attempt_at = OutboundEmail.objects.filter(status=OutboundEmail.STATUS_PENDING).aggregate(
+        next_attempt_at=Min('next_attempt_at')
+    )['next_attempt_at']
+    if next_attempt_at is not None:
+        schedule_drain(next_attempt_at)
+    return total_sent, total_failed
+
+
+def outbox_stats():
+    """delivery counters and throughput of this process"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["mails_per_second"] = round(stats["sent"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+    stats["seconds"] = round(stats["seconds"], 2)
+    stats["pending"] = OutboundEmail.objects.filter(status=OutboundEmail.STATUS_PENDING).count()
+    stats["failed_permanently"] = OutboundEmail.objects.filter(status=OutboundEmail.STATUS_FAILED).count()
+    return stats
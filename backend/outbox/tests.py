@@ -0,0 +1,78 @@
+from datetime import timedelta
+from unittest import mock
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from jobs.models import Job
+from jobs.queue import run_pending
+from outbox.models import OutboundEmail
+from outbox.sender import queue_email, send_pending
+
+
+def drain_jobs():
+    return Job.objects.filter(name='outbox.send_pending', status=Job.STATUS_PENDING)
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    JOBS_RUN_EAGERLY=False,
+    OUTBOX_MAX_ATTEMPTS=3,
+)
+class OutboxTest(TestCase):
+    def fail_sends(self):
+        return mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('smtp down'))
+
+    def test_queued_mails_share_one_drain_job(self):
+        queue_email('Ticket', '<p>hi</p>', ['a@example.com'])
+        queue_email('Ticket', '<p>hi</p>', ['b@example.com'])
+        self.assertEqual(drain_jobs().count(), 1)
+
+        run_pending()
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(set(OutboundEmail.objects.values_list('status', flat=True)), {OutboundEmail.STATUS_SENT})
+        self.assertFalse(drain_jobs().exists())
+
+    def test_failed_send_schedules_a_retry_drain(self):
+        email = queue_email('Ticket', '<p>hi</p>', ['a@example.com'])
+        with self.fail_sends():
+            run_pending()
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboundEmail.STATUS_PENDING, 1))
+        # nothing else is queued, the drain job at the retry time is what sends it again
+        retry = drain_jobs().get()
+        self.assertEqual(retry.run_after, email.next_attempt_at)
+        self.assertEqual(run_pending(), 0)
+
+        Job.objects.filter(pk=retry.pk).update(run_after=timezone.now())
+        OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        run_pending()
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.STATUS_SENT)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_new_mail_does_not_wait_for_a_retry_drain(self):
+        with self.fail_sends():
+            queue_email('Ticket', '<p>hi</p>', ['a@example.com'])
+            run_pending()
+        self.assertEqual(drain_jobs().count(), 1)
+
+        queue_email('Ticket', '<p>hi</p>', ['b@example.com'])
+
+        self.assertEqual(drain_jobs().filter(run_after__lte=timezone.now()).count(), 1)
+        run_pending()
+        self.assertEqual([message.to for message in mail.outbox], [['b@example.com']])
+
+    def test_mail_fails_permanently_after_max_attempts(self):
+        email = queue_email('Ticket', '<p>hi</p>', ['a@example.com'])
+        with self.fail_sends():
+            for _ in range(3):
+                send_pending()
+                OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboundEmail.STATUS_FAILED, 3))
+        self.assertIn('smtp down', email.last_error)
+        self.assertEqual(len(mail.outbox), 0)
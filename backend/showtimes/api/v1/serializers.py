@@ -1,8 +1,13 @@
 from rest_framework import serializers
-from showtimes.models import Showtime, ScreeningRoom, Cinema
+from showtimes.models import Showtime, ScreeningRoom, Cinema, is_valid_timezone
 from movies.models import Movie
 from movies.api.v1.serializers import GenreSerializer
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from showtimes.holds import get_held_seats
+from showtimes.layouts import booked_upcoming_showtime
+from showtimes.scheduling import showtime_window, find_conflict, conflict_message
 
 
 class ScreeningRoomSerializer(serializers.ModelSerializer):
@@ -31,6 +36,15 @@ class ScreeningRoomSerializer(serializers.ModelSerializer):
         if seats_per_row > capacity:
             raise serializers.ValidationError({"seats_per_row": "Seats per row cannot exceed capacity."})
 
+        # same rule as ScreeningRoom.clean, upcoming bookings would lose their seats on a new layout
+        if self.instance and (capacity, seats_per_row) != (self.instance.capacity, self.instance.seats_per_row):
+            showtime = booked_upcoming_showtime(self.instance)
+            if showtime:
+                raise serializers.ValidationError(
+                    f"Cannot change room layout - showtime '{showtime}' has booked seats. "
+                    "Wait for all shows to complete or remove showtimes with bookings."
+                )
+
         return data
 
 class ShowtimeSerializer(serializers.ModelSerializer):
@@ -38,11 +52,12 @@ class ShowtimeSerializer(serializers.ModelSerializer):
     movie_id = serializers.IntegerField(source='movie.id', read_only=True)
     room = ScreeningRoomSerializer(read_only=True)
     room_id = serializers.PrimaryKeyRelatedField(
-        queryset=ScreeningRoom.objects.all(),
+        queryset=ScreeningRoom.objects.select_related("cinema"),  # the conflict check needs the cinema time zone
         source="room",
         write_only=True
     )
     is_full = serializers.SerializerMethodField()
+    seats_data = serializers.SerializerMethodField()
 
     class Meta:
         model = Showtime
@@ -62,9 +77,11 @@ class ShowtimeSerializer(serializers.ModelSerializer):
         ]
     
     def get_is_full(self, obj):
-        if not obj.seats_data:
-            return False
-        return all(not seat_info.get("available", True) for seat_info in obj.seats_data.values())
+        return obj.is_full
+
+    # seat states are owned by the reservation engine (showtimes/reservations.py)
+    def get_seats_data(self, obj):
+        return obj.get_seat_map()
 
     def validate(self, data):
         # get the movie duration and calculate end time
@@ -76,56 +93,66 @@ class ShowtimeSerializer(serializers.ModelSerializer):
         if not all([movie, room, show_date, show_time]):
             return data
 
-        # calculate showtime end (start time + duration + 30min grace)
-        from datetime import timedelta
-        import datetime
-        
-        show_datetime = datetime.datetime.combine(show_date, show_time)
-        end_datetime = show_datetime + timedelta(minutes=movie.duration + 30)
-        
-        # check for ANY showtimes in the same room on the same date
-        # regardless of movie if same room, same date, check time conflicts
-        existing_showtimes = Showtime.objects.filter(
-            room=room,
-            show_date=show_date,
-            is_active=True
-        ).exclude(id=getattr(self.instance, 'id', None))
-
-        for existing_showtime in existing_showtimes:
-            existing_start = datetime.datetime.combine(
-                existing_showtime.show_date, 
-                existing_showtime.show_time
-            )
-            existing_end = existing_start + timedelta(
-                minutes=existing_showtime.movie.duration + 30
-            )
-            
-            # check if time ranges overlap
-            if (show_datetime < existing_end) and (end_datetime > existing_start):
-                # format times beautifully (12-hour format with am/pm)
-                existing_start_formatted = existing_start.strftime('%I:%M %p').lstrip('0')
-                existing_end_formatted = existing_end.strftime('%I:%M %p').lstrip('0')
-                
-                # calculate total runtime in hours and minutes for friendly display
-                total_minutes = movie.duration + 30
-                hours = total_minutes // 60
-                minutes = total_minutes % 60
-                
-                if hours > 0 and minutes > 0:
-                    gap_display = f"{hours} hour{'s' if hours > 1 else ''} and {minutes} minutes"
-                elif hours > 0:
-                    gap_display = f"{hours} hour{'s' if hours > 1 else ''}"
-                else:
-                    gap_display = f"{minutes} minutes"
-                
-                raise serializers.ValidationError({
-                    "show_time": f"This time conflicts with '{existing_showtime.movie.title}' "
-                            f"({existing_start_formatted} - {existing_end_formatted}). "
-                            f"Please allow at least {gap_display} between showtimes in the same room."
-                })
+        # one indexed overlap query on the stored starts_at / ends_at window (start + duration + 30min grace),
+        # any movie, also catches a late show of the previous day running past midnight
+        starts_at, ends_at = showtime_window(show_date, show_time, movie.duration, room.cinema.tzinfo)
+        existing_showtime = find_conflict(room, starts_at, ends_at, exclude_id=getattr(self.instance, 'id', None))
+        if existing_showtime is not None:
+            raise serializers.ValidationError({"show_time": conflict_message(
+                existing_showtime.movie.title, existing_showtime.starts_at, existing_showtime.ends_at, movie.duration,
+                room.cinema.tzinfo,
+            )})
         
         return data
 
+    # on postgres the showtime_no_room_overlap exclusion constraint rejects a conflicting showtime that
+    # slipped in between validate() and the insert (two staff members scheduling the same room at once)
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError({"show_time": "This time conflicts with another showtime in the same room."})
+
+    def update(self, instance, validated_data):
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except ValidationError as error:
+            # Showtime.save refuses to move a showtime with booked seats to another room
+            raise serializers.ValidationError(serializers.as_serializer_error(error))
+        except IntegrityError:
+            raise serializers.ValidationError({"show_time": "This time conflicts with another showtime in the same room."})
+
+# bulk scheduling: plain ids here, movies and rooms are resolved for the whole batch in one query each
+# and conflicts are checked across the batch by showtimes/scheduling.py
+class ShowtimeBulkItemSerializer(serializers.Serializer):
+    movie = serializers.IntegerField(min_value=1)
+    room_id = serializers.IntegerField(min_value=1)
+    show_date = serializers.DateField()
+    show_time = serializers.TimeField()
+    ticket_price = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=0, required=False)
+    is_active = serializers.BooleanField(default=True)
+
+
+class ShowtimeCloneSerializer(serializers.Serializer):
+    source_date = serializers.DateField()
+    target_date = serializers.DateField()
+    days = serializers.IntegerField(default=7, min_value=1)
+    cinema = serializers.IntegerField(required=False, min_value=1)
+    room = serializers.IntegerField(required=False, min_value=1)
+
+
+class ShowtimeBulkSerializer(serializers.Serializer):
+    showtimes = ShowtimeBulkItemSerializer(many=True, required=False)
+    clone = ShowtimeCloneSerializer(required=False)
+    dry_run = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if bool(data.get("showtimes")) == bool(data.get("clone")):
+            raise serializers.ValidationError("Send either a list of showtimes or a clone period.")
+        return data
+
 class MovieBasicSerializer(serializers.ModelSerializer):
     genre_detail = GenreSerializer(source='genre', read_only=True)
 
@@ -158,21 +185,22 @@ class ShowtimeListSerializer(serializers.ModelSerializer):
             "movie",
             "show_date",
             "show_time",
+            "starts_at",
             "room",
             "is_full",
+            "seats_available",
             "ticket_price",
             "is_active",
         ]
     
     def get_is_full(self, obj):
-        if not obj.seats_data:
-            return False
-        return all(not seat_info.get("available", True) for seat_info in obj.seats_data.values())
+        return obj.is_full
 
 
 class ShowtimeDetailSerializer(serializers.ModelSerializer):
     movie = MovieBasicSerializer(read_only=True)
     room = ScreeningRoomSerializer(read_only=True)
+    seats_data = serializers.SerializerMethodField()
     is_full = serializers.SerializerMethodField()
     available_seats = serializers.SerializerMethodField()
 
@@ -183,6 +211,7 @@ class ShowtimeDetailSerializer(serializers.ModelSerializer):
             "movie",
             "show_date",
             "show_time",
+            "starts_at",
             "ticket_price",
             "is_active",
             "created_at",
@@ -194,14 +223,19 @@ class ShowtimeDetailSerializer(serializers.ModelSerializer):
         ]
     
     def get_is_full(self, obj):
-        if not obj.seats_data:
-            return False
-        return all(not seat_info.get("available", True) for seat_info in obj.seats_data.values())
+        return obj.is_full
     
+    def _get_held_seats(self, obj):
+        # seats held in the cache (see showtimes/holds.py) show as taken but are not booked in the db yet
+        if not hasattr(obj, "_held_seats"):
+            obj._held_seats = get_held_seats(obj.id, obj.get_seat_codes()) if obj.seats_available else set()
+        return obj._held_seats
+
+    def get_seats_data(self, obj):
+        return obj.get_seat_map(self._get_held_seats(obj))
+
     def get_available_seats(self, obj):
-        if not obj.seats_data:
-            return 0
-        return sum(1 for seat_info in obj.seats_data.values() if seat_info.get("available", True))
+        return max(obj.seats_available - len(self._get_held_seats(obj)), 0)
 
 class CinemaSerializer(serializers.ModelSerializer):
     class Meta:
@@ -210,7 +244,13 @@ class CinemaSerializer(serializers.ModelSerializer):
             "id",
             "name",
             "location",
+            "timezone",
         ]
+
+    def validate_timezone(self, value):
+        if not is_valid_timezone(value):
+            raise serializers.ValidationError(f"Unknown time zone '{value}'.")
+        return value
     
     def validate_name(self, value):
         value = value.strip()
@@ -233,5 +273,18 @@ class CinemaDetailSerializer(serializers.ModelSerializer):
             "id",
             "name",
             "location",
+            "timezone",
             "screening_rooms",
-        ]
\ No newline at end of file
+        ]
+
+
+class SeatHoldSerializer(serializers.Serializer):
+    seats = serializers.ListField(child=serializers.CharField(max_length=10), allow_empty=False)
+
+    def validate_seats(self, value):
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError("Each seat can only be selected once.")
+
+        if len(value) > settings.SEAT_HOLD_MAX_SEATS:
+            raise serializers.ValidationError(f"You can only hold up to {settings.SEAT_HOLD_MAX_SEATS} seats.")
+        return value
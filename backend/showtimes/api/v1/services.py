@@ -0,0 +1,96 @@
+import datetime
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+def parse_bool_param(value, name):
+    if value is None:
+        return None
+
+    value = value.strip().lower()
+    if value in ("true", "1"):
+        return True
+    if value in ("false", "0"):
+        return False
+    raise ValidationError({name: f"{name} must be true or false"})
+
+
+def parse_positive_int_param(value, name):
+    if value is None:
+        return None
+
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: f"{name} must be a positive integer"})
+
+    if value <= 0:
+        raise ValidationError({name: f"{name} must be a positive integer"})
+    return value
+
+
+def has_availability_filters(params):
+    return params.get("available") is not None or params.get("min_seats") is not None
+
+
+# filtering showtimes by seat availability using the seats_available counter column so it runs as
+# a plain sql predicate instead of decoding every seat map in python
+# prefix is for filtering through a relation like "showtimes__"
+def filter_by_availability(queryset, params, prefix=""):
+    available = parse_bool_param(params.get("available"), "available")
+    min_seats = parse_positive_int_param(params.get("min_seats"), "min_seats")
+
+    if available is True:
+        queryset = queryset.filter(**{f"{prefix}seats_available__gt": 0})
+    elif available is False:
+        queryset = queryset.filter(**{f"{prefix}seats_available": 0})
+
+    if min_seats:
+        queryset = queryset.filter(**{f"{prefix}seats_available__gte": min_seats})
+
+    return queryset
+
+
+def parse_datetime_param(value, name, tz=None, end_of_day=False):
+    """
+    YYYY-MM-DD or an iso datetime as an aware datetime, naive values are local to tz (default time zone).
+    a plain date is the start of that day, or the start of the next one with end_of_day so "to" includes it
+    """
+    if value is None:
+        return None
+
+    value = value.strip()
+    try:
+        # date first, parse_datetime also accepts a bare date (as midnight)
+        day = parse_date(value)
+        if day is not None:
+            if end_of_day:
+                day += datetime.timedelta(days=1)
+            parsed = datetime.datetime.combine(day, datetime.time.min)
+        else:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError
+    except ValueError:
+        raise ValidationError({name: f"{name} must be a date (YYYY-MM-DD) or an ISO 8601 datetime"})
+
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, tz)
+    return parsed
+
+
+# upcoming and ?from=&to= filters as one range on the stored starts_at column (index on is_active, starts_at),
+# instead of OR-ing show_date / show_time which also compared utc clock times with local show times
+def filter_by_start(queryset, params, tz=None, upcoming=False):
+    starts_from = parse_datetime_param(params.get("from"), "from", tz)
+    starts_to = parse_datetime_param(params.get("to"), "to", tz, end_of_day=True)
+
+    if upcoming:
+        now = timezone.now()
+        starts_from = max(starts_from, now) if starts_from else now
+    if starts_from:
+        queryset = queryset.filter(starts_at__gte=starts_from)
+    if starts_to:
+        queryset = queryset.filter(starts_at__lt=starts_to)
+    return queryset
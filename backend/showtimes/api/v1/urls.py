@@ -2,17 +2,25 @@ from django.urls import path
 from .views import (
     ShowtimeListView,
     ShowtimeDetailView,
+    ShowtimeBulkView,
     CinemaListView,
     CinemaDetailView,
     ScreeningRoomListView,
     ScreeningRoomDetailView,
     CinemaShowtimesView,
+    ShowtimeSeatsView,
+    SeatHoldView,
+    SeatHoldDetailView,
 )
 
 
 urlpatterns = [
     path('showtimes/', ShowtimeListView.as_view(), name='showtime-list'),
+    path('showtimes/bulk/', ShowtimeBulkView.as_view(), name='showtime-bulk'),
     path('showtimes/<int:pk>/', ShowtimeDetailView.as_view(), name='showtime-detail'),
+    path('showtimes/<int:pk>/seats/', ShowtimeSeatsView.as_view(), name='showtime-seats'),
+    path('showtimes/<int:pk>/holds/', SeatHoldView.as_view(), name='seat-hold'),
+    path('showtimes/<int:pk>/holds/<uuid:hold_token>/', SeatHoldDetailView.as_view(), name='seat-hold-detail'),
     path('cinemas/', CinemaListView.as_view(), name='cinema-list'),
     path('cinemas/<int:pk>/', CinemaDetailView.as_view(), name='cinema-detail'),
     path('cinemas/<int:cinema_id>/showtimes/', CinemaShowtimesView.as_view(), name='cinema-showtimes'),
@@ -1,6 +1,7 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from utils.base_views import BaseDetailView
 from showtimes.models import Showtime, Cinema, ScreeningRoom
 from .serializers import (
@@ -9,14 +10,25 @@ from .serializers import (
     ShowtimeDetailSerializer, 
     CinemaSerializer, 
     CinemaDetailSerializer,
-    ScreeningRoomSerializer
+    ScreeningRoomSerializer,
+    SeatHoldSerializer,
+    ShowtimeBulkSerializer,
 )
+from .services import filter_by_availability, filter_by_start
+from showtimes.scheduling import schedule_showtimes, clone_schedule
+from showtimes.seatfeed import seat_changes
+from showtimes.holds import hold_seats, extend_hold, release_hold
+from config.pagination import KeysetPagination
 from config.permissions import StaffUserOnly, AllowAny
 from config.throttles import AdminOperationThrottle, PublicEndpointThrottle
-from django.utils import timezone
-from django.db.models import Q
 
 # SHOWTIME VIEWS
+class ShowtimePagination(KeysetPagination):
+    ordering = ("starts_at", "id")
+    page_size = 50
+    max_page_size = 200
+
+
 class ShowtimeListView(APIView):
     def get_throttles(self):
         if self.request.method == 'GET':
@@ -29,13 +41,10 @@ class ShowtimeListView(APIView):
         return [StaffUserOnly()]
 
     def get(self, request):
-        # get current date and time
-        now = timezone.now()
-        current_date = now.date()
-        current_time = now.time()
-        
+        """schedule in show order, keyset paginated (?cursor= from the next link), optional ?from=&to="""
         # check if user is staff/admin if yes, show all showtimes
-        if request.user and (request.user.is_staff or request.user.is_superuser):
+        is_staff = request.user and (request.user.is_staff or request.user.is_superuser)
+        if is_staff:
             showtimes = Showtime.objects.all()
         else:
             # for public: only active showtimes and active movies and future showtimes
@@ -43,22 +52,29 @@ class ShowtimeListView(APIView):
                 is_active=True,
                 movie__is_active=True  # only include active movies
             )
-            showtimes = showtimes.filter(
-                Q(show_date__gt=current_date) |
-                Q(show_date=current_date, show_time__gte=current_time)
-            )
+        showtimes = filter_by_start(showtimes, request.query_params, upcoming=not is_staff)
         
         movie_id = request.query_params.get('movie')
         if movie_id:
             showtimes = showtimes.filter(movie_id=movie_id)
 
+        showtimes = filter_by_availability(showtimes, request.query_params)
+
+        # everything the serializers read in the same query, no lazy movie/genre/room/cinema per row
+        showtimes = showtimes.select_related('movie__genre', 'room__cinema').defer('movie__description')
+
         mode = request.query_params.get("detail", "summary").lower()
-        
+        if mode != "full":
+            # summary rows only need the seats_available counter, not the seat bitmap
+            showtimes = showtimes.defer('seats_bitmap')
+
+        paginator = ShowtimePagination()
+        page = paginator.paginate_queryset(showtimes, request)
         if mode == "full":
-            serializer = ShowtimeDetailSerializer(showtimes, many=True)
+            serializer = ShowtimeDetailSerializer(page, many=True)
         else:
-            serializer = ShowtimeListSerializer(showtimes, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            serializer = ShowtimeListSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request):
         serializer = ShowtimeSerializer(data=request.data)
@@ -112,6 +128,91 @@ class ShowtimeDetailView(BaseDetailView):
         showtime.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
     
+# BULK SCHEDULING
+# explanation: a whole week of showtimes (or a copy of an earlier week) in one request, see showtimes/scheduling.py
+class ShowtimeBulkView(APIView):
+    permission_classes = [StaffUserOnly]
+    throttle_classes = [AdminOperationThrottle]
+
+    def post(self, request):
+        serializer = ShowtimeBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        if data.get("clone"):
+            clone = data["clone"]
+            items = clone_schedule(
+                clone["source_date"],
+                clone["target_date"],
+                days=clone["days"],
+                cinema_id=clone.get("cinema"),
+                room_id=clone.get("room"),
+            )
+        else:
+            items = data["showtimes"]
+
+        showtimes = schedule_showtimes(items, dry_run=data["dry_run"])
+        return Response({
+            "created": 0 if data["dry_run"] else len(showtimes),
+            "dry_run": data["dry_run"],
+            "showtimes": ShowtimeListSerializer(showtimes, many=True).data,
+        }, status=status.HTTP_200_OK if data["dry_run"] else status.HTTP_201_CREATED)
+
+
+# SEAT AVAILABILITY FEED
+# explanation: cheap polling for the seat picker, only the seats that changed since the client's version
+# and 304 when nothing did, answered from the cache (see showtimes/seatfeed.py)
+class ShowtimeSeatsView(APIView):
+    permission_classes = [AllowAny]
+    throttle_classes = [PublicEndpointThrottle]
+
+    def get(self, request, pk):
+        since = request.query_params.get("since")
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                since = -1
+            if since < 0:
+                raise ValidationError({"since": "since must be a version number from a previous response"})
+
+        # tag of the held seats from the previous response, a new or expired hold also changes the answer
+        changes = seat_changes(pk, since, request.query_params.get("holds", "")[:64])
+        if changes is None:
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return Response(changes, status=status.HTTP_200_OK)
+
+
+# SEAT HOLD VIEWS
+# explanation: temporary cache backed seat holds while the customer fills the booking form (see showtimes/holds.py)
+class SeatHoldView(BaseDetailView):
+    model = Showtime
+    not_found_message = "Showtime not found"
+    select_related_fields = ["room"]
+    permission_classes = [AllowAny]
+    throttle_classes = [PublicEndpointThrottle]
+
+    def post(self, request, pk):
+        showtime = self.get_object(pk)
+        serializer = SeatHoldSerializer(data=request.data)
+        if serializer.is_valid():
+            hold = hold_seats(showtime, serializer.validated_data["seats"])
+            return Response(hold, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class SeatHoldDetailView(APIView):
+    permission_classes = [AllowAny]
+    throttle_classes = [PublicEndpointThrottle]
+
+    # extend the hold for another full ttl
+    def patch(self, request, pk, hold_token):
+        hold = extend_hold(pk, hold_token)
+        return Response(hold, status=status.HTTP_200_OK)
+
+    def delete(self, request, pk, hold_token):
+        release_hold(pk, hold_token)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 # CINEMA VIEWS
 class CinemaListView(APIView):
     def get_throttles(self):
@@ -199,13 +300,9 @@ class CinemaShowtimesView(BaseDetailView):
     def get(self, request, cinema_id):
         cinema = self.get_object(cinema_id)
         
-        # get current date and time
-        now = timezone.now()
-        current_date = now.date()
-        current_time = now.time()
-        
         # check if user is staff/admin  show all showtimes for management
-        if request.user and (request.user.is_staff or request.user.is_superuser):
+        is_staff = request.user and (request.user.is_staff or request.user.is_superuser)
+        if is_staff:
             showtimes = Showtime.objects.filter(room__cinema=cinema)  # all showtimes for admin
         else:
             # for public users: only active showtimes and active movies and future showtimes
@@ -214,22 +311,20 @@ class CinemaShowtimesView(BaseDetailView):
                 is_active=True,
                 movie__is_active=True  # only include active movies
             )
-            
-            # filter out past showtimes
-            showtimes = showtimes.filter(
-                Q(show_date__gt=current_date) |  # future dates
-                Q(show_date=current_date, show_time__gte=current_time)  # today but future times
-            )
         
-        showtimes = showtimes.select_related('room', 'movie').order_by('show_date', 'show_time')
-
+        # dates and naive times are local to the cinema, ?date= is one local day
+        showtimes = filter_by_start(showtimes, request.query_params, tz=cinema.tzinfo, upcoming=not is_staff)
         date_filter = request.query_params.get('date')
         if date_filter:
-            showtimes = showtimes.filter(show_date=date_filter)
+            showtimes = filter_by_start(showtimes, {'from': date_filter, 'to': date_filter}, tz=cinema.tzinfo)
+
+        showtimes = showtimes.select_related('movie__genre', 'room__cinema').defer('movie__description').order_by('starts_at', 'id')
 
         movie_id = request.query_params.get('movie')
         if movie_id:
             showtimes = showtimes.filter(movie_id=movie_id)
+
+        showtimes = filter_by_availability(showtimes, request.query_params)
         
         serializer = ShowtimeDetailSerializer(showtimes, many=True)
         
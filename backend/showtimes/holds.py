@@ -0,0 +1,97 @@
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from showtimes.reservations import SeatsUnavailable
+
+
+# TEMPORARY SEAT HOLDS
+# a hold reserves seats in the cache (redis in prod, locmem locally) for a few minutes while the customer
+# fills the booking form so losing the race shows up when picking seats and not on the final POST.
+# every seat is its own key with a ttl so expired holds clean themselves up and the database only ever
+# sees confirmed bookings
+def _seat_key(showtime_id, seat):
+    return f"seat-hold:{showtime_id}:{seat}"
+
+
+def _hold_key(hold_token):
+    return f"seat-hold-token:{hold_token}"
+
+
+def _hold_response(hold_token, showtime_id, seats, ttl):
+    return {
+        "hold_token": str(hold_token),
+        "showtime": showtime_id,
+        "seats": seats,
+        "expires_at": timezone.now() + timedelta(seconds=ttl),
+    }
+
+
+def get_held_seats(showtime_id, seat_codes, exclude_token=None):
+    """seats currently held by someone (other than exclude_token), one cache round trip"""
+    keys = {_seat_key(showtime_id, seat): seat for seat in seat_codes}
+    held = cache.get_many(keys.keys())
+    exclude_token = str(exclude_token) if exclude_token else None
+    return {keys[key] for key, token in held.items() if token != exclude_token}
+
+
+def hold_seats(showtime, seat_codes):
+    """hold all seats or none, raises SeatsUnavailable when any seat is booked or held"""
+    ttl = settings.SEAT_HOLD_TTL
+    indexes = showtime.get_seat_indexes()
+    bitmap = showtime.get_seat_bitmap()
+
+    booked = [seat for seat in seat_codes if seat not in indexes or bitmap.is_booked(indexes[seat])]
+    if booked:
+        raise SeatsUnavailable(booked)
+
+    # cache.add only sets a missing key (SET NX on redis) so two holds can never own the same seat,
+    # on the first conflict every seat added by this hold is given back
+    hold_token = str(uuid.uuid4())
+    acquired = []
+    for seat in seat_codes:
+        if not cache.add(_seat_key(showtime.id, seat), hold_token, ttl):
+            cache.delete_many([_seat_key(showtime.id, held) for held in acquired])
+            raise SeatsUnavailable(get_held_seats(showtime.id, seat_codes, exclude_token=hold_token) or [seat])
+        acquired.append(seat)
+
+    cache.set(_hold_key(hold_token), {"showtime": showtime.id, "seats": list(seat_codes)}, ttl)
+    return _hold_response(hold_token, showtime.id, list(seat_codes), ttl)
+
+
+def get_hold(showtime_id, hold_token):
+    hold = cache.get(_hold_key(hold_token))
+    if not hold or hold["showtime"] != showtime_id:
+        raise NotFound(detail="Seat hold not found or expired")
+    return hold
+
+
+def extend_hold(showtime_id, hold_token):
+    """push the expiry of a still valid hold back to a full ttl"""
+    ttl = settings.SEAT_HOLD_TTL
+    hold = get_hold(showtime_id, hold_token)
+    seat_keys = [_seat_key(showtime_id, seat) for seat in hold["seats"]]
+
+    # a seat key could have expired and been taken by another hold in the meantime
+    owners = cache.get_many(seat_keys)
+    if any(owners.get(key) != str(hold_token) for key in seat_keys):
+        release_hold(showtime_id, hold_token)
+        raise NotFound(detail="Seat hold not found or expired")
+
+    for key in seat_keys + [_hold_key(hold_token)]:
+        cache.touch(key, ttl)
+    return _hold_response(hold_token, showtime_id, hold["seats"], ttl)
+
+
+def release_hold(showtime_id, hold_token):
+    """give the seats back, only keys still owned by this hold are deleted"""
+    hold = cache.get(_hold_key(hold_token))
+    if not hold or hold["showtime"] != showtime_id:
+        return
+
+    seat_keys = [_seat_key(showtime_id, seat) for seat in hold["seats"]]
+    owners = cache.get_many(seat_keys)
+    cache.delete_many([key for key, token in owners.items() if token == str(hold_token)])
+    cache.delete(_hold_key(hold_token))
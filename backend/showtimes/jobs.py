@@ -0,0 +1,8 @@
+from jobs.queue import job
+from showtimes.layouts import sync_room_layout
+
+
+@job('showtimes.sync_room_layout')
+def sync_layout(room_id):
+    """rebuild the seat bitmaps of a resized room's upcoming showtimes"""
+    sync_room_layout(room_id)
@@ -0,0 +1,99 @@
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from showtimes.models import Showtime, ScreeningRoom, SEAT_STATE_FIELDS
+from showtimes.seatmap import SeatBitmap
+from showtimes.seatfeed import reset_seat_feed
+
+logger = logging.getLogger(__name__)
+
+
+# ROOM LAYOUT CHANGES
+# resizing a room bumps ScreeningRoom.layout_version, every upcoming showtime still on an older version
+# has its seat bitmap rebuilt for the new layout. shows that are over keep their old bitmap as history.
+# unbooked showtimes (all of them normally, the room can only be resized without upcoming bookings) are
+# reset with ONE update statement, booked ones (a booking that raced the resize) get their bitmap rebuilt
+# from the seat codes of their paid bookings and are written back with bulk_update.
+# rooms with many upcoming showtimes are synced by a background job, until it ran the reservation engine
+# syncs a stale showtime itself before claiming seats on it (see reservations.py)
+def upcoming_showtimes(room):
+    return Showtime.objects.filter(room=room).filter(Q(ends_at__gte=timezone.now()) | Q(ends_at=None))
+
+
+def booked_upcoming_showtime(room):
+    """first upcoming showtime of the room with booked seats or None, one query"""
+    return upcoming_showtimes(room).filter(seats_booked__gt=0).select_related("movie", "room__cinema").first()
+
+
+def _rebuild_bitmaps(showtimes, room):
+    from bookings.models import Booking
+
+    layout = room.seat_layout
+    booked = {showtime.id: SeatBitmap(len(layout)) for showtime in showtimes}
+    for showtime_id, seats in Booking.objects.filter(
+        showtime_id__in=booked.keys(),
+        payment_status=Booking.PAYMENT_STATUS_PAID,
+    ).values_list("showtime_id", "seats").iterator():
+        missing = [seat for seat in seats if seat not in layout.indexes]
+        if missing:
+            logger.warning("showtime %s: booked seats %s do not exist in the new room layout", showtime_id, missing)
+        booked[showtime_id].book(layout.indexes[seat] for seat in seats if seat in layout.indexes)
+
+    for showtime in showtimes:
+        bitmap = booked[showtime.id]
+        showtime.seats_bitmap = bitmap.to_bytes()
+        showtime.seats_booked = bitmap.booked_count
+        showtime.seats_available = bitmap.available_count
+        showtime.layout_version = room.layout_version
+        showtime.seats_version += 1
+
+
+def sync_showtime_layout(showtime):
+    """bring one (locked) showtime to its room's current layout, returns True when it was stale"""
+    room = showtime.room
+    if room is None or showtime.layout_version == room.layout_version:
+        return False
+    _rebuild_bitmaps([showtime], room)
+    showtime.save(update_fields=[*SEAT_STATE_FIELDS, "updated_at"])
+    reset_seat_feed([showtime.id])
+    return True
+
+
+def sync_room_layout(room_id, batch_size=500):
+    """rewrite the upcoming showtimes of a room that are not on its current layout, returns how many"""
+    room = ScreeningRoom.objects.get(pk=room_id)
+    stale = upcoming_showtimes(room).exclude(layout_version=room.layout_version)
+
+    with transaction.atomic():
+        reset_seat_feed(stale.values_list("id", flat=True))
+        updated = stale.filter(seats_booked=0).update(
+            seats_bitmap=b"",
+            seats_available=room.capacity,
+            layout_version=room.layout_version,
+            seats_version=F("seats_version") + 1,
+            updated_at=timezone.now(),
+        )
+
+        booked = list(stale.select_for_update(of=("self",)))
+        for start in range(0, len(booked), batch_size):
+            batch = booked[start:start + batch_size]
+            _rebuild_bitmaps(batch, room)
+            for showtime in batch:
+                showtime.updated_at = timezone.now()
+            Showtime.objects.bulk_update(batch, [*SEAT_STATE_FIELDS, "updated_at"])
+    return updated + len(booked)
+
+
+def schedule_room_layout_sync(room):
+    """sync right away for small rooms, hand big ones to the job queue (after the room change is committed)"""
+    from jobs.queue import enqueue
+
+    stale = upcoming_showtimes(room).exclude(layout_version=room.layout_version).count()
+    if not stale:
+        return
+    if stale <= settings.ROOM_LAYOUT_SYNC_LIMIT:
+        sync_room_layout(room.pk)
+    else:
+        enqueue("showtimes.sync_room_layout", room_id=room.pk)
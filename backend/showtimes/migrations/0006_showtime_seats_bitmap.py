@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:10
+
+from django.db import migrations, models
+from showtimes.seatmap import SeatBitmap, seat_indexes
+
+
+def backfill_seats_bitmap(apps, schema_editor):
+    Showtime = apps.get_model('showtimes', 'Showtime')
+    for showtime in Showtime.objects.select_related('room').exclude(room=None).iterator():
+        indexes = seat_indexes(showtime.room.capacity, showtime.room.seats_per_row)
+        bitmap = SeatBitmap(len(indexes))
+        bitmap.book(
+            indexes[seat] for seat, seat_info in (showtime.seats_data or {}).items()
+            if seat in indexes and not seat_info.get('available', True)
+        )
+        showtime.seats_bitmap = bitmap.to_bytes()
+        showtime.seats_booked = bitmap.booked_count
+        showtime.save(update_fields=['seats_bitmap', 'seats_booked'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('showtimes', '0005_alter_showtime_seats_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='showtime',
+            name='seats_bitmap',
+            field=models.BinaryField(blank=True, default=bytes),
+        ),
+        migrations.AddField(
+            model_name='showtime',
+            name='seats_booked',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_seats_bitmap, migrations.RunPython.noop),
+    ]
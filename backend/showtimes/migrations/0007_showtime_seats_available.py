@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:11
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def backfill_seats_available(apps, schema_editor):
+    Showtime = apps.get_model('showtimes', 'Showtime')
+    ScreeningRoom = apps.get_model('showtimes', 'ScreeningRoom')
+    capacity = ScreeningRoom.objects.filter(pk=OuterRef('room_id')).values('capacity')[:1]
+    Showtime.objects.exclude(room=None).update(
+        seats_available=Subquery(capacity) - F('seats_booked')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_alter_movie_title'),
+        ('showtimes', '0006_showtime_seats_bitmap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='showtime',
+            name='seats_available',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='showtime',
+            index=models.Index(fields=['is_active', 'seats_available'], name='showtimes_s_is_acti_cf4e30_idx'),
+        ),
+        migrations.RunPython(backfill_seats_available, migrations.RunPython.noop),
+    ]
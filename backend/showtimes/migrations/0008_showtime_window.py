@@ -0,0 +1,77 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:32
+
+import logging
+
+from django.db import migrations, models
+
+from showtimes.scheduling import showtime_window
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_windows(apps, schema_editor):
+    Showtime = apps.get_model('showtimes', 'Showtime')
+    showtimes = list(Showtime.objects.select_related('movie').only('show_date', 'show_time', 'movie__duration'))
+    for showtime in showtimes:
+        showtime.starts_at, showtime.ends_at = showtime_window(showtime.show_date, showtime.show_time, showtime.movie.duration)
+    Showtime.objects.bulk_update(showtimes, ['starts_at', 'ends_at'], batch_size=1000)
+
+
+# postgres only: let the database itself refuse two active showtimes overlapping in the same room.
+# skipped (the serializer check still applies) when the existing schedule already has overlaps
+# that would make the constraint fail to build, fix them and run `CREATE EXTENSION`/`ALTER TABLE` by hand
+def add_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT EXISTS (
+                SELECT 1 FROM showtimes_showtime a JOIN showtimes_showtime b
+                ON a.room_id = b.room_id AND a.id < b.id
+                AND a.starts_at < b.ends_at AND a.ends_at > b.starts_at
+                WHERE a.is_active AND b.is_active
+            )
+        """)
+        if cursor.fetchone()[0]:
+            logger.warning("showtime_no_room_overlap skipped: existing showtimes overlap in the same room")
+            return
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        cursor.execute("""
+            ALTER TABLE showtimes_showtime ADD CONSTRAINT showtime_no_room_overlap
+            EXCLUDE USING gist (room_id WITH =, tstzrange(starts_at, ends_at) WITH &&)
+            WHERE (is_active)
+        """)
+
+
+def drop_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("ALTER TABLE showtimes_showtime DROP CONSTRAINT IF EXISTS showtime_no_room_overlap")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_alter_movie_title'),
+        ('showtimes', '0007_showtime_seats_available'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='showtime',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='showtime',
+            name='starts_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='showtime',
+            index=models.Index(fields=['room', 'starts_at', 'ends_at'], name='showtimes_s_room_id_2df448_idx'),
+        ),
+        migrations.RunPython(backfill_windows, migrations.RunPython.noop),
+        migrations.RunPython(add_overlap_constraint, drop_overlap_constraint),
+    ]
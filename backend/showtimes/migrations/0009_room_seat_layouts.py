@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:36
+
+from django.db import migrations, models
+from showtimes.seatmap import SeatBitmap, seat_codes
+
+
+def restore_seats_data(apps, schema_editor):
+    # going back: rebuild the per showtime json seat maps from the booked bitmaps
+    Showtime = apps.get_model('showtimes', 'Showtime')
+    for showtime in Showtime.objects.select_related('room').exclude(room=None).iterator():
+        codes = seat_codes(showtime.room.capacity, showtime.room.seats_per_row)
+        bitmap = SeatBitmap(len(codes), showtime.seats_bitmap)
+        showtime.seats_data = {code: {'available': not bitmap.is_booked(index)} for index, code in enumerate(codes)}
+        showtime.save(update_fields=['seats_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('showtimes', '0008_showtime_window'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_seats_data),
+        migrations.RemoveField(
+            model_name='showtime',
+            name='seats_data',
+        ),
+        migrations.AddField(
+            model_name='screeningroom',
+            name='layout_version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('showtimes', '0009_room_seat_layouts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='showtime',
+            name='layout_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
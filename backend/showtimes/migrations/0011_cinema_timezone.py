@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:40
+
+import showtimes.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_alter_movie_title'),
+        ('showtimes', '0010_showtime_layout_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cinema',
+            name='timezone',
+            field=models.CharField(default=showtimes.models.default_timezone, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='showtime',
+            index=models.Index(fields=['is_active', 'starts_at'], name='showtimes_s_is_acti_439e04_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='showtime',
+            index=models.Index(fields=['movie', 'starts_at'], name='showtimes_s_movie_i_2656d6_idx'),
+        ),
+    ]
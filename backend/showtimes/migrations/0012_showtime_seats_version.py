@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('showtimes', '0011_cinema_timezone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='showtime',
+            name='seats_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,16 +1,54 @@
-from django.db import models
+import zoneinfo
+from django.conf import settings
+from django.db import models, transaction
 from movies.models import Movie
 from django.core.exceptions import ValidationError
-import math
+from showtimes.seatmap import SeatBitmap, get_seat_layout
+from showtimes.scheduling import showtime_window, refresh_showtime_windows
+
+
+def default_timezone():
+    return settings.TIME_ZONE
+
+
+def is_valid_timezone(name):
+    try:
+        zoneinfo.ZoneInfo(name)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
 
 
 class Cinema(models.Model):
     name = models.CharField(max_length=100, unique=True)
     location = models.CharField(max_length=255, blank=True, null=True)
+    timezone = models.CharField(max_length=64, default=default_timezone) # iana name, show dates and times are local wall clock times here
 
     def __str__(self):
         return self.name
 
+    @property
+    def tzinfo(self):
+        return zoneinfo.ZoneInfo(self.timezone)
+
+    def clean(self):
+        if not is_valid_timezone(self.timezone):
+            raise ValidationError({"timezone": f"Unknown time zone '{self.timezone}'."})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_timezone = dict(zip(field_names, values)).get("timezone")
+        return instance
+
+    def save(self, *args, **kwargs):
+        timezone_changed = self.pk is not None and getattr(self, "_loaded_timezone", self.timezone) != self.timezone
+        super().save(*args, **kwargs)
+        self._loaded_timezone = self.timezone
+        # the same local show time is another instant in the new zone
+        if timezone_changed:
+            refresh_showtime_windows(Showtime.objects.filter(room__cinema=self))
+
 
 class ScreeningRoom(models.Model):
     cinema = models.ForeignKey(
@@ -21,9 +59,14 @@ class ScreeningRoom(models.Model):
     name = models.CharField(max_length=50)
     capacity = models.PositiveIntegerField(default=100)
     seats_per_row = models.PositiveIntegerField()
+    layout_version = models.PositiveIntegerField(default=1, editable=False) # bumped whenever capacity or seats per row change
 
     def __str__(self):
         return f"{self.cinema.name} - {self.name}"
+
+    @property
+    def seat_layout(self):
+        return get_seat_layout(self.pk, self.layout_version, self.capacity, self.seats_per_row)
     
     def clean(self):
         if self.seats_per_row <= 0:
@@ -34,43 +77,54 @@ class ScreeningRoom(models.Model):
                 "seats_per_row": "Seats per row cannot exceed total capacity."
             })
         
-        if self.pk:
-            try:
-                old = ScreeningRoom.objects.get(pk=self.pk)
-                if (old.capacity != self.capacity or old.seats_per_row != self.seats_per_row):
-                    if self.showtimes.exists():
-                        # check if any showtime has booked seats
-                        for showtime in self.showtimes.all():
-                            has_booked_seats = any(
-                                not seat_info.get("available", True) 
-                                for seat_info in showtime.seats_data.values()
-                            )
-                            if has_booked_seats:
-                                raise ValidationError(
-                                    f"Cannot change room layout - showtime '{showtime}' has booked seats. "
-                                    "Wait for all shows to complete or remove showtimes with bookings."
-                                )
-            except ScreeningRoom.DoesNotExist:
-                pass
+        if self.layout_changed():
+            from showtimes.layouts import booked_upcoming_showtime
+
+            showtime = booked_upcoming_showtime(self)
+            if showtime:
+                raise ValidationError(
+                    f"Cannot change room layout - showtime '{showtime}' has booked seats. "
+                    "Wait for all shows to complete or remove showtimes with bookings."
+                )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remembered so save() knows whether the layout changed without reading the row again
+        row = dict(zip(field_names, values))
+        if "capacity" in row and "seats_per_row" in row:
+            instance._loaded_layout = (row["capacity"], row["seats_per_row"])
+        return instance
+
+    def layout_changed(self):
+        if not self.pk:
+            return False
+        loaded = getattr(self, "_loaded_layout", None)
+        if loaded is None:
+            loaded = ScreeningRoom.objects.filter(pk=self.pk).values_list("capacity", "seats_per_row").first()
+        return loaded is not None and loaded != (self.capacity, self.seats_per_row)
         
     def save(self, *args, **kwargs):
-        regenerate_seat_maps = False
-    
-        if self.pk:
-            try:
-                old = ScreeningRoom.objects.get(pk=self.pk)
-                if (old.capacity != self.capacity or old.seats_per_row != self.seats_per_row):
-                    regenerate_seat_maps = True
-            except ScreeningRoom.DoesNotExist:
-                pass
-        
+        layout_changed = self.layout_changed()
+        if layout_changed:
+            # F() so two concurrent resizes still end up on different versions
+            self.layout_version = models.F("layout_version") + 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "layout_version"}
+
         super().save(*args, **kwargs)
-        
-        # regenerate seat maps for all showtimes after saving
-        if regenerate_seat_maps:
-            for showtime in self.showtimes.all():
-                showtime.seats_data = showtime.generate_seat_map()
-                showtime.save()
+
+        if layout_changed:
+            from showtimes.layouts import schedule_room_layout_sync
+
+            self.refresh_from_db(fields=["layout_version"])
+            self._loaded_layout = (self.capacity, self.seats_per_row)
+            # upcoming showtimes get seat bitmaps for the new layout (in a background job for big rooms)
+            schedule_room_layout_sync(self)
+
+
+# written only by showtimes/reservations.py and showtimes/layouts.py (see Showtime.save)
+SEAT_STATE_FIELDS = ("seats_bitmap", "seats_booked", "seats_available", "seats_version", "layout_version")
 
 
 class Showtime(models.Model):
@@ -86,9 +140,17 @@ class Showtime(models.Model):
         blank=True,
         related_name="showtimes",
     )
-    seats_data = models.JSONField(default=dict,blank=True) # cinema room seats layout and code location, and availability status
+    seats_bitmap = models.BinaryField(default=bytes, blank=True) # packed booked flags indexed by the room layout (see seatmap.py)
+    seats_booked = models.PositiveIntegerField(default=0) # popcount of seats_bitmap kept in sync on every claim/release
+    seats_available = models.PositiveIntegerField(default=0) # room capacity - seats_booked, filterable in sql for sold out / min seats
+    layout_version = models.PositiveIntegerField(default=1) # the room layout version seats_bitmap is indexed by
+    seats_version = models.PositiveIntegerField(default=0) # bumped on every seat state change, clients poll deltas since a version (see seatfeed.py)
     show_date = models.DateField()
     show_time = models.TimeField()
+    # the interval the show blocks the room for as aware datetimes (show date + time in the cinema's time zone),
+    # kept in sync on save (see scheduling.py)
+    starts_at = models.DateTimeField(null=True, blank=True, editable=False)
+    ends_at = models.DateTimeField(null=True, blank=True, editable=False)
     ticket_price = models.DecimalField(max_digits=8, decimal_places=2, default=150.00)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -97,41 +159,113 @@ class Showtime(models.Model):
     class Meta:
         ordering = ["show_date", "show_time"]
         unique_together = ["movie", "room", "show_date", "show_time"]
+        indexes = [
+            models.Index(fields=["is_active", "seats_available"]),
+            # overlap lookups: room = x AND starts_at < end AND ends_at > start, also serves room + starts_at ranges
+            models.Index(fields=["room", "starts_at", "ends_at"]),
+            # upcoming / date range listings: one range scan on starts_at
+            models.Index(fields=["is_active", "starts_at"]),
+            models.Index(fields=["movie", "starts_at"]),
+        ]
 
     def __str__(self):
         return f"{self.movie.title} @ {self.room} - {self.show_date} {self.show_time}"
     
-    # generating seat maps based on capacity and seats per row for the grid
-    def generate_seat_map(self):
+    def reset_seats(self):
+        """every seat available again (new showtime or room layout changed)"""
+        self.seats_bitmap = b""
+        self.seats_booked = 0
+        self.seats_available = self.total_seats
+        if self.room:
+            self.layout_version = self.room.layout_version
+
+    def get_seat_layout(self):
+        return self.room.seat_layout if self.room else None
+
+    def get_seat_codes(self):
+        if not self.room:
+            return ()
+        return self.room.seat_layout.codes
+
+    def get_seat_indexes(self):
         if not self.room:
             return {}
-        
-        total_seats = self.room.capacity
-        seats_per_row = self.room.seats_per_row
-        rows =  math.ceil(total_seats / seats_per_row)
+        return self.room.seat_layout.indexes
 
-        seat_map = {}
-        seat_count = 0
-        for row in range(rows):
-            row_letter = chr(65 + row) # for letter codes row A, B, C ...
+    def get_seat_bitmap(self):
+        return SeatBitmap(len(self.get_seat_codes()), self.seats_bitmap)
 
-            for seat_number in range(1, seats_per_row + 1):
-                seat_count += 1
+    # the full seat map for the api, the room layout with this showtime's booked seats (and held ones) taken
+    def get_seat_map(self, held_seats=()):
+        if not self.room:
+            return {}
+        return self.room.seat_layout.seat_map(self.get_seat_bitmap(), held_seats)
 
-                if seat_count > total_seats:
-                    break
+    @property
+    def total_seats(self):
+        return self.room.capacity if self.room else 0
 
-                seat_code = f"{row_letter}{seat_number}" # final seats codes A1, A2, A3 ...
-                seat_map[seat_code] = {"available": True}
-                
-            if seat_count >= total_seats:
-                break
+    @property
+    def is_full(self):
+        return self.room_id is not None and self.seats_available == 0
 
-        return seat_map
-    
+    def set_window(self):
+        """recompute starts_at / ends_at from the show date, time (cinema local time) and movie duration"""
+        tz = self.room.cinema.tzinfo if self.room else None
+        self.starts_at, self.ends_at = showtime_window(self.show_date, self.show_time, self.movie.duration, tz)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the room the seat state belongs to, a staff edit moving the show resets it (see save)
+        instance._loaded_room_id = dict(zip(field_names, values)).get("room_id")
+        return instance
 
     def save(self, *args, **kwargs):
-        if (not self.seats_data or len(self.seats_data) == 0) and self.room:
-            self.seats_data = self.generate_seat_map()
-        super().save(*args, **kwargs)
-        
+        if self._state.adding:
+            # new showtime: every seat of the room is available
+            if self.room_id and not self.seats_booked:
+                self.reset_seats()
+            self.set_window()
+            super().save(*args, **kwargs)
+            self._loaded_room_id = self.room_id
+            return
+
+        # seat state is written only by the reservation engine and the layout sync, always through update_fields
+        # under the row lock. any other save (staff edits) leaves it out so an instance loaded before a rush can
+        # never write back its old seats over the ones claimed in the meantime
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            update_fields = {
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in SEAT_STATE_FIELDS
+            }
+        update_fields = set(update_fields)
+
+        if {"show_date", "show_time", "movie", "room"} & update_fields:
+            self.set_window()
+            update_fields |= {"starts_at", "ends_at"}
+
+        with transaction.atomic():
+            if "room" in update_fields and self.room_id != getattr(self, "_loaded_room_id", None):
+                update_fields |= self._reset_seats_for_new_room()
+            kwargs["update_fields"] = update_fields
+            super().save(*args, **kwargs)
+        self._loaded_room_id = self.room_id
+
+    def _reset_seats_for_new_room(self):
+        from showtimes.seatfeed import reset_seat_feed
+
+        # under the row lock so no claim can land between the check and the reset
+        locked = Showtime.objects.select_for_update().filter(pk=self.pk).values(
+            "room_id", "seats_booked", "seats_version",
+        ).first()
+        if locked is None or locked["room_id"] == self.room_id:
+            return set()
+        if locked["seats_booked"]:
+            raise ValidationError({"room": "Cannot move a showtime with booked seats to another room."})
+        self.reset_seats()
+        # every seat changed, clients polling the seat feed reload a full snapshot of the new room
+        self.seats_version = locked["seats_version"] + 1
+        reset_seat_feed([self.pk])
+        return set(SEAT_STATE_FIELDS)
@@ -0,0 +1,67 @@
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from showtimes.models import Showtime, SEAT_STATE_FIELDS
+from showtimes.layouts import sync_showtime_layout
+from showtimes.seatfeed import publish_seat_change
+
+
+class SeatsUnavailable(ValidationError):
+    """raised when one or more requested seats are already taken (or dont exist in the room)"""
+    def __init__(self, seats):
+        self.seats = list(seats)
+        super().__init__({"seats": [f"Seats {self.seats} are not available."]})
+
+
+# SEAT RESERVATION ENGINE
+# every claim/release locks ONLY the showtime row (select_for_update of self, not the joined room) so
+# two bookings for the same showtime are serialized but bookings for different showtimes still run in parallel.
+# the lock is held only for the check + flip + single UPDATE so keep slow work (qr, pdf, email) outside of it.
+# no savepoint of their own: a failed claim rolls back the caller's whole transaction (the booking) anyway.
+# these (and the layout sync) are the only writers of SEAT_STATE_FIELDS, see Showtime.save
+
+
+def claim_seats(showtime_id, seat_codes):
+    """mark all seats as booked or none of them, returns the locked showtime"""
+    with transaction.atomic(savepoint=False):
+        showtime = Showtime.objects.select_for_update(of=("self",)).select_related("room").get(pk=showtime_id)
+        # the room was resized and the layout sync job did not reach this showtime yet
+        sync_showtime_layout(showtime)
+        indexes = showtime.get_seat_indexes()
+        bitmap = showtime.get_seat_bitmap()
+
+        # unknown seat codes count as unavailable too
+        unavailable = [
+            seat for seat in seat_codes
+            if seat not in indexes or bitmap.is_booked(indexes[seat])
+        ]
+        if unavailable or len(set(seat_codes)) != len(seat_codes):
+            raise SeatsUnavailable(unavailable or seat_codes)
+
+        bitmap.book(indexes[seat] for seat in seat_codes)
+        _store_bitmap(showtime, bitmap)
+        publish_seat_change(showtime, seat_codes, available=False)
+        return showtime
+
+
+def release_seats(showtime_id, seat_codes):
+    """free the given seats again (cancellations), unknown seat codes are ignored"""
+    with transaction.atomic(savepoint=False):
+        showtime = Showtime.objects.select_for_update(of=("self",)).select_related("room").get(pk=showtime_id)
+        # the room was resized and the layout sync job did not reach this showtime yet
+        sync_showtime_layout(showtime)
+        indexes = showtime.get_seat_indexes()
+        bitmap = showtime.get_seat_bitmap()
+
+        seat_codes = [seat for seat in seat_codes if seat in indexes]
+        bitmap.release(indexes[seat] for seat in seat_codes)
+        _store_bitmap(showtime, bitmap)
+        publish_seat_change(showtime, seat_codes, available=True)
+        return showtime
+
+
+def _store_bitmap(showtime, bitmap):
+    showtime.seats_bitmap = bitmap.to_bytes()
+    showtime.seats_booked = bitmap.booked_count
+    showtime.seats_available = bitmap.available_count
+    showtime.seats_version += 1  # safe, the row is locked
+    showtime.save(update_fields=[*SEAT_STATE_FIELDS, "updated_at"])
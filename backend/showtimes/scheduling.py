@@ -0,0 +1,270 @@
+import datetime
+import heapq
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import DateTimeField, Exists, ExpressionWrapper, F, OuterRef
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+CLEANUP_MINUTES = 30  # grace between two shows in the same room (cleaning, ads, seating)
+MAX_BULK_SHOWTIMES = 1000
+MAX_CLONE_DAYS = 31
+
+
+# SHOWTIME WINDOWS
+# every showtime stores the real interval it blocks its room for: starts_at (show date + time) and
+# ends_at (start + movie duration + cleanup). conflicts are then one indexed overlap query
+# (starts_at < other end AND ends_at > other start) that also works for shows running past midnight
+def showtime_window(show_date, show_time, duration, tz=None):
+    """(starts_at, ends_at) aware datetimes a show blocks its room for, show date and time are local to tz"""
+    starts_at = timezone.make_aware(datetime.datetime.combine(show_date, show_time), tz)
+    return starts_at, starts_at + datetime.timedelta(minutes=duration + CLEANUP_MINUTES)
+
+
+def refresh_showtime_windows(showtimes, batch_size=500):
+    """recompute the stored windows of a showtime queryset (a cinema moved to another time zone)"""
+    from showtimes.models import Showtime
+
+    showtimes = list(showtimes.select_related("movie", "room__cinema"))
+    for showtime in showtimes:
+        showtime.set_window()
+    Showtime.objects.bulk_update(showtimes, ["starts_at", "ends_at"], batch_size=batch_size)
+
+
+def find_conflict(room, starts_at, ends_at, exclude_id=None):
+    """first active showtime in the room overlapping the window or None, one query"""
+    from showtimes.models import Showtime
+
+    return Showtime.objects.filter(
+        room=room,
+        is_active=True,
+        starts_at__lt=ends_at,
+        ends_at__gt=starts_at,
+    ).exclude(id=exclude_id).select_related("movie").order_by("starts_at").first()
+
+
+def duration_conflicts(movie_id, duration):
+    """
+    active showtimes of a movie that would run into the next show of their room with the new duration,
+    one query. the other showtimes of the movie are compared with their stored (old) window, an earlier
+    one that grows into a later one is found as the earlier one
+    """
+    from showtimes.models import Showtime
+
+    new_ends_at = ExpressionWrapper(
+        F("starts_at") + datetime.timedelta(minutes=duration + CLEANUP_MINUTES), output_field=DateTimeField(),
+    )
+    blocking = Showtime.objects.filter(
+        room=OuterRef("room"),
+        is_active=True,
+        starts_at__lt=OuterRef("new_ends_at"),
+        ends_at__gt=OuterRef("starts_at"),
+    ).exclude(pk=OuterRef("pk"))
+    return list(
+        Showtime.objects.filter(movie_id=movie_id, is_active=True).exclude(starts_at=None)
+        .annotate(new_ends_at=new_ends_at)
+        .filter(Exists(blocking))
+        .select_related("room__cinema")
+        .order_by("starts_at")
+    )
+
+
+def duration_conflict_messages(showtimes):
+    return [
+        f"The showtime on {timezone.localtime(showtime.starts_at, showtime.room.cinema.tzinfo):%Y-%m-%d %I:%M %p} "
+        f"in {showtime.room.name} would overlap the next show in that room."
+        for showtime in showtimes
+    ]
+
+
+def _gap_display(duration):
+    total_minutes = duration + CLEANUP_MINUTES
+    hours = total_minutes // 60
+    minutes = total_minutes % 60
+
+    if hours > 0 and minutes > 0:
+        return f"{hours} hour{'s' if hours > 1 else ''} and {minutes} minutes"
+    elif hours > 0:
+        return f"{hours} hour{'s' if hours > 1 else ''}"
+    return f"{minutes} minutes"
+
+
+def conflict_message(title, starts_at, ends_at, duration, tz=None):
+    # format times beautifully (12-hour format with am/pm) in the cinema's time zone
+    existing_start = timezone.localtime(starts_at, tz).strftime('%I:%M %p').lstrip('0')
+    existing_end = timezone.localtime(ends_at, tz).strftime('%I:%M %p').lstrip('0')
+    return (
+        f"This time conflicts with '{title}' ({existing_start} - {existing_end}). "
+        f"Please allow at least {_gap_display(duration)} between showtimes in the same room."
+    )
+
+
+# BULK SCHEDULING
+# a week of programming in one request: movies and rooms are loaded with one query each, the existing
+# active showtimes of those rooms around the batch with one more, then per room every interval (existing
+# and new) is sorted by start and swept once keeping the interval that ends last so far. an interval
+# starting before that end overlaps it. all rows go in with one bulk_create, either the whole batch is
+# scheduled or nothing and every failing item gets its errors
+class _Slot:
+    __slots__ = ("index", "room_id", "starts_at", "ends_at", "title", "duration")
+
+    def __init__(self, index, room_id, starts_at, ends_at, title, duration=None):
+        self.index = index  # position in the batch, None for a showtime already in the database
+        self.room_id = room_id
+        self.starts_at = starts_at
+        self.ends_at = ends_at
+        self.title = title
+        self.duration = duration
+
+
+def _sweep(slots):
+    """{batch index: conflicting slot} for one room, existing showtimes never conflict with each other"""
+    conflicts = {}
+    latest_existing = None  # existing show ending last so far
+    latest_new = None  # accepted batch show ending last so far
+    running_new = []  # heap of accepted batch shows still running at the current start
+    # at equal start times put existing showtimes first so the new one is the one reported
+    for slot in sorted(slots, key=lambda slot: (slot.starts_at, slot.index is not None, slot.index or 0)):
+        while running_new and running_new[0][0] <= slot.starts_at:
+            heapq.heappop(running_new)
+
+        if slot.index is None:
+            # an existing show starting while batch shows still run: those started first and overlap it
+            for _, _, new in running_new:
+                conflicts.setdefault(new.index, slot)
+            if latest_existing is None or slot.ends_at > latest_existing.ends_at:
+                latest_existing = slot
+            continue
+
+        blocking = next((
+            other for other in (latest_existing, latest_new)
+            if other is not None and slot.starts_at < other.ends_at
+        ), None)
+        if blocking is not None:
+            conflicts[slot.index] = blocking
+            continue  # a rejected show does not block the ones after it
+
+        heapq.heappush(running_new, (slot.ends_at, slot.index, slot))
+        if latest_new is None or slot.ends_at > latest_new.ends_at:
+            latest_new = slot
+    return conflicts
+
+
+def _existing_slots(room_ids, starts_at, ends_at):
+    from showtimes.models import Showtime
+
+    rows = Showtime.objects.filter(
+        room_id__in=room_ids,
+        is_active=True,
+        starts_at__lt=ends_at,
+        ends_at__gt=starts_at,
+    ).values_list("room_id", "starts_at", "ends_at", "movie__title")
+    return [_Slot(None, room_id, start, end, title) for room_id, start, end, title in rows]
+
+
+def schedule_showtimes(items, dry_run=False):
+    """
+    validate and create many showtimes at once.
+    items are dicts with movie, room_id, show_date, show_time and optional ticket_price / is_active,
+    returns the created (unsaved on dry_run) showtimes, raises ValidationError with per item errors
+    """
+    from movies.models import Movie
+    from showtimes.models import Showtime, ScreeningRoom
+
+    if len(items) > MAX_BULK_SHOWTIMES:
+        raise ValidationError({"showtimes": f"At most {MAX_BULK_SHOWTIMES} showtimes can be scheduled at once."})
+
+    movies = Movie.objects.select_related("genre").in_bulk({item["movie"] for item in items})
+    rooms = ScreeningRoom.objects.select_related("cinema").in_bulk({item["room_id"] for item in items})
+
+    errors = defaultdict(dict)
+    showtimes = []
+    slots = defaultdict(list)
+    for index, item in enumerate(items):
+        movie = movies.get(item["movie"])
+        room = rooms.get(item["room_id"])
+        if movie is None:
+            errors[index]["movie"] = [f"Movie {item['movie']} does not exist."]
+        if room is None:
+            errors[index]["room_id"] = [f"Screening room {item['room_id']} does not exist."]
+        if movie is None or room is None:
+            continue
+
+        showtime = Showtime(
+            movie=movie,
+            room=room,
+            show_date=item["show_date"],
+            show_time=item["show_time"],
+            is_active=item.get("is_active", True),
+        )
+        if item.get("ticket_price") is not None:
+            showtime.ticket_price = item["ticket_price"]
+        showtime.set_window()
+        showtimes.append(showtime)
+        if showtime.is_active:
+            slots[room.id].append(_Slot(index, room.id, showtime.starts_at, showtime.ends_at, movie.title, movie.duration))
+
+    if slots:
+        batch = [slot for room_slots in slots.values() for slot in room_slots]
+        for slot in _existing_slots(slots.keys(), min(s.starts_at for s in batch), max(s.ends_at for s in batch)):
+            slots[slot.room_id].append(slot)
+        for room_slots in slots.values():
+            for index, existing in _sweep(room_slots).items():
+                errors[index]["show_time"] = [conflict_message(
+                    existing.title, existing.starts_at, existing.ends_at, movies[items[index]["movie"]].duration,
+                    rooms[existing.room_id].cinema.tzinfo,
+                )]
+
+    if errors:
+        # keyed by the position of the item in the batch
+        raise ValidationError({"showtimes": {index: errors[index] for index in sorted(errors)}})
+
+    # the seat grid lives on the room (one cached layout per room), a new showtime only needs empty counters
+    for showtime in showtimes:
+        showtime.reset_seats()
+
+    if dry_run:
+        return showtimes
+
+    try:
+        with transaction.atomic():
+            Showtime.objects.bulk_create(showtimes, batch_size=500)
+    except IntegrityError:
+        # the same movie/room/time twice or an overlap that got in concurrently (postgres exclusion constraint)
+        raise ValidationError({"showtimes": "Some of these showtimes conflict with showtimes that were just scheduled, please retry."})
+    return showtimes
+
+
+def clone_schedule(source_date, target_date, days=7, cinema_id=None, room_id=None):
+    """items for schedule_showtimes copying the active showtimes of days days from source_date to target_date"""
+    from showtimes.models import Showtime
+
+    if not 1 <= days <= MAX_CLONE_DAYS:
+        raise ValidationError({"days": f"days must be between 1 and {MAX_CLONE_DAYS}."})
+    if target_date < source_date + datetime.timedelta(days=days):
+        raise ValidationError({"target_date": "target_date must be after the copied period."})
+
+    source = Showtime.objects.filter(
+        show_date__gte=source_date,
+        show_date__lt=source_date + datetime.timedelta(days=days),
+        is_active=True,
+    ).exclude(room=None)
+    if cinema_id:
+        source = source.filter(room__cinema_id=cinema_id)
+    if room_id:
+        source = source.filter(room_id=room_id)
+
+    offset = target_date - source_date
+    return [
+        {
+            "movie": movie_id,
+            "room_id": showtime_room_id,
+            "show_date": show_date + offset,
+            "show_time": show_time,
+            "ticket_price": ticket_price,
+            "is_active": True,
+        }
+        for movie_id, showtime_room_id, show_date, show_time, ticket_price in source.order_by(
+            "show_date", "show_time", "room_id",
+        ).values_list("movie_id", "room_id", "show_date", "show_time", "ticket_price")
+    ]
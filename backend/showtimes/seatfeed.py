@@ -0,0 +1,164 @@
+import hashlib
+import time
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from showtimes.models import Showtime
+from showtimes.seatmap import SeatBitmap, get_seat_layout
+
+FEED_TTL = 60 * 60  # seconds a published change stays available for deltas
+MAX_DELTA_VERSIONS = 200  # clients further behind get a full snapshot instead
+LAG_PROBE = 2  # versions looked at past the head in case a later commit published before an earlier one
+HEAD_LOCK_TTL = 2  # seconds, a publisher that died holding the head lock blocks the others at most this long
+HEAD_LOCK_ATTEMPTS = 10
+HEAD_LOCK_WAIT = 0.005  # seconds between attempts
+
+
+# SEAT AVAILABILITY FEED
+# every claim/release bumps Showtime.seats_version under the row lock and, once committed, publishes the
+# seats it touched under their own cache key so concurrent commits cant overwrite each other's change.
+# the head (latest published version) is only raised under a short cache lock, never moved back
+# GET /showtimes/<id>/seats/?since=<version> then answers from the cache only: 304 when nothing changed,
+# the merged changes since that version, or a full snapshot (cached per version) for new or far behind
+# clients. the database is read only when the cache lost the head or a change.
+# seats held in the cache (holds.py) have no version of their own (they also expire silently), every answer
+# carries the seats held right now plus a short tag of that set. the client sends the tag back as ?holds=
+# and only gets a 304 when neither the version nor the holds changed
+def _head_key(showtime_id):
+    return f"seat-feed-head:{showtime_id}"
+
+
+def _change_key(showtime_id, version):
+    return f"seat-feed:{showtime_id}:{version}"
+
+
+def _snapshot_key(showtime_id):
+    return f"seat-feed-snapshot:{showtime_id}"
+
+
+def publish_seat_change(showtime, seat_codes, available):
+    """publish the seats a claim/release changed for showtime.seats_version after commit"""
+    showtime_id, version = showtime.id, showtime.seats_version
+    change = {seat: available for seat in seat_codes}
+
+    def publish():
+        cache.set(_change_key(showtime_id, version), change, FEED_TTL)
+        _raise_head(showtime_id, version)
+
+    transaction.on_commit(publish)
+
+
+def _raise_head(showtime_id, version):
+    # compare and set under a lock taken with cache.add (SET NX on redis) so two publishers committing
+    # at the same time cant move the head back to the older of their versions
+    lock_key = f"{_head_key(showtime_id)}:lock"
+    for _ in range(HEAD_LOCK_ATTEMPTS):
+        if cache.add(lock_key, 1, HEAD_LOCK_TTL):
+            try:
+                head = cache.get(_head_key(showtime_id))
+                if head is None or head < version:
+                    cache.set(_head_key(showtime_id), version, FEED_TTL)
+            finally:
+                cache.delete(lock_key)
+            return
+        time.sleep(HEAD_LOCK_WAIT)
+    # still locked: drop the head instead of guessing, the next poll rebuilds it from the database
+    cache.delete(_head_key(showtime_id))
+
+
+def reset_seat_feed(showtime_ids):
+    """seat states were rewritten wholesale (room layout changed), clients reload a full snapshot"""
+    keys = [_head_key(showtime_id) for showtime_id in showtime_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _load_snapshot(showtime_id):
+    row = Showtime.objects.filter(pk=showtime_id).values_list(
+        "seats_version", "seats_bitmap", "layout_version", "ends_at",
+        "room_id", "room__layout_version", "room__capacity", "room__seats_per_row",
+    ).first()
+    if row is None:
+        raise NotFound(detail="Showtime not found")
+
+    version, bitmap, layout_version, ends_at, room_id, room_version, capacity, seats_per_row = row
+    if room_id and layout_version != room_version and (ends_at is None or ends_at >= timezone.now()):
+        # the room was resized and the layout sync job did not reach this showtime yet, bring it over
+        # like the next claim would instead of reading its old bitmap with the new layout
+        version, bitmap, layout_version = _sync_layout(showtime_id)
+
+    seats = {}
+    # a show that was over before the resize keeps the bitmap of a layout that is gone, it has no seat map
+    if room_id and layout_version == room_version:
+        layout = get_seat_layout(room_id, layout_version, capacity, seats_per_row)
+        seats = {
+            seat: seat_info["available"]
+            for seat, seat_info in layout.seat_map(SeatBitmap(len(layout), bitmap)).items()
+        }
+    snapshot = {"version": version, "seats": seats}
+    cache.set(_snapshot_key(showtime_id), snapshot, FEED_TTL)
+    # never move the head back, a newer change may have been published meanwhile
+    cache.add(_head_key(showtime_id), version, FEED_TTL)
+    return snapshot
+
+
+def _sync_layout(showtime_id):
+    from showtimes.layouts import sync_showtime_layout
+
+    with transaction.atomic():
+        showtime = Showtime.objects.select_for_update(of=("self",)).select_related("room").get(pk=showtime_id)
+        sync_showtime_layout(showtime)
+    return showtime.seats_version, showtime.seats_bitmap, showtime.layout_version
+
+
+def _full(showtime_id, head):
+    snapshot = cache.get(_snapshot_key(showtime_id))
+    if snapshot is None or head is None or snapshot["version"] != head:
+        snapshot = _load_snapshot(showtime_id)
+    return {"showtime": showtime_id, "version": snapshot["version"], "full": True, "seats": snapshot["seats"]}
+
+
+def _current_holds(showtime_id):
+    """(sorted held seat codes, tag of that set), one cache round trip for the seat keys"""
+    from showtimes.holds import get_held_seats
+
+    snapshot = cache.get(_snapshot_key(showtime_id)) or _load_snapshot(showtime_id)
+    held = sorted(get_held_seats(showtime_id, snapshot["seats"]))
+    tag = hashlib.sha1(",".join(held).encode()).hexdigest()[:12] if held else ""
+    return held, tag
+
+
+def _with_holds(changes, held, tag):
+    changes.update({"held": held, "holds": tag})
+    return changes
+
+
+def seat_changes(showtime_id, since=None, holds=""):
+    """
+    None when the client is up to date (since is the current version and holds the current holds tag), else
+    {"showtime", "version", "full", "seats": {seat code: available}, "held": [seat codes], "holds": tag}
+    with only the changed seats unless full. held seats are taken whatever seats says
+    """
+    head = cache.get(_head_key(showtime_id))
+    if since is None or head is None or since > head + LAG_PROBE or head - since > MAX_DELTA_VERSIONS:
+        return _with_holds(_full(showtime_id, head), *_current_holds(showtime_id))
+
+    versions = range(since + 1, head + LAG_PROBE + 1)
+    found = cache.get_many([_change_key(showtime_id, version) for version in versions])
+
+    seats = {}
+    version = since
+    for next_version in versions:
+        change = found.get(_change_key(showtime_id, next_version))
+        if change is None:
+            break
+        seats.update(change)
+        version = next_version
+
+    if version < head:
+        # a change between since and the head expired or was evicted
+        return _with_holds(_full(showtime_id, head), *_current_holds(showtime_id))
+    held, tag = _current_holds(showtime_id)
+    if version == since and tag == (holds or ""):
+        return None
+    return _with_holds({"showtime": showtime_id, "version": version, "full": False, "seats": seats}, held, tag)
@@ -0,0 +1,114 @@
+import math
+from functools import lru_cache
+
+
+# SEAT LAYOUT
+# seat codes only depend on the room capacity and seats per row so its computed once per layout and reused
+# by every showtime in rooms with the same layout. the position of a code in this tuple is its bit index
+@lru_cache(maxsize=256)
+def seat_codes(capacity, seats_per_row):
+    """ordered seat codes A1, A2 ... for a room layout"""
+    if not capacity or not seats_per_row:
+        return ()
+
+    rows = math.ceil(capacity / seats_per_row)
+    codes = []
+    for row in range(rows):
+        row_letter = chr(65 + row)  # for letter codes row A, B, C ...
+        for seat_number in range(1, seats_per_row + 1):
+            if len(codes) >= capacity:
+                break
+            codes.append(f"{row_letter}{seat_number}")
+    return tuple(codes)
+
+
+@lru_cache(maxsize=256)
+def seat_indexes(capacity, seats_per_row):
+    """seat code -> bit index lookup for a room layout"""
+    return {code: index for index, code in enumerate(seat_codes(capacity, seats_per_row))}
+
+
+class SeatBitmap:
+    """
+    packed booked-seat flags for one showtime, bit N set means seat N of the layout is taken
+    stored as little endian bytes so a 300 seat room is 38 bytes instead of a ~6KB json map
+    """
+    def __init__(self, size, data=b""):
+        self.size = size
+        self.bits = int.from_bytes(bytes(data or b""), "little")
+
+    def is_booked(self, index):
+        return bool((self.bits >> index) & 1)
+
+    def book(self, indexes):
+        for index in indexes:
+            self.bits |= 1 << index
+
+    def release(self, indexes):
+        for index in indexes:
+            self.bits &= ~(1 << index)
+
+    @property
+    def booked_count(self):
+        return self.bits.bit_count()
+
+    @property
+    def available_count(self):
+        return self.size - self.booked_count
+
+    @property
+    def is_full(self):
+        return self.size > 0 and self.booked_count >= self.size
+
+    def booked_indexes(self):
+        indexes = []
+        bits = self.bits
+        while bits:
+            lowest = bits & -bits
+            indexes.append(lowest.bit_length() - 1)
+            bits ^= lowest
+        return indexes
+
+    def to_bytes(self):
+        return self.bits.to_bytes((self.size + 7) // 8, "little")
+
+
+# ROOM SEAT LAYOUTS
+# the seat grid belongs to the screening room, showtimes only keep their booked seat bits. a layout is
+# built once per room and layout version and kept in process, the full seat map of a showtime is this
+# layout with its booked (and held) seats overlaid. the seat info dicts are shared constants, dont mutate them
+SEAT_AVAILABLE = {"available": True}
+SEAT_BOOKED = {"available": False}
+SEAT_HELD = {"available": False, "held": True}
+
+
+class SeatLayout:
+    def __init__(self, capacity, seats_per_row):
+        self.capacity = capacity
+        self.seats_per_row = seats_per_row
+        self.codes = seat_codes(capacity, seats_per_row)
+        self.indexes = seat_indexes(capacity, seats_per_row)
+        self.empty_map = {code: SEAT_AVAILABLE for code in self.codes}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def seat_map(self, bitmap, held_seats=()):
+        """{seat code: seat info} for a showtime from its booked bitmap and the seats held in the cache"""
+        seat_map = dict(self.empty_map)
+        for index in bitmap.booked_indexes():
+            if index < len(self.codes):
+                seat_map[self.codes[index]] = SEAT_BOOKED
+        for seat in held_seats:
+            if seat_map.get(seat) is SEAT_AVAILABLE:
+                seat_map[seat] = SEAT_HELD
+        return seat_map
+
+
+@lru_cache(maxsize=512)
+def get_seat_layout(room_id, layout_version, capacity, seats_per_row):
+    """
+    in process layout cache, a new layout version (room resized) is a new key so stale layouts just fall out.
+    the dimensions are part of the key too so a row changed without bumping the version is never served stale
+    """
+    return SeatLayout(capacity, seats_per_row)
@@ -1,3 +1,649 @@
-from django.test import TestCase
+import datetime
+import time
+import zoneinfo
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.db import transaction
+from django.forms import modelform_factory
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from movies.models import Movie, Genre
+from showtimes.models import Cinema, ScreeningRoom, Showtime
+from showtimes.holds import hold_seats, release_hold
+from showtimes.reservations import SeatsUnavailable, claim_seats, release_seats
+from showtimes.seatfeed import _change_key, _head_key, _raise_head, publish_seat_change, seat_changes
+from showtimes.seatmap import SeatBitmap
+from showtimes.scheduling import _Slot, _sweep
 
-# Create your tests here.
+
+class ShowtimeTestMixin:
+    def setUp(self):
+        genre = Genre.objects.create(name='Action', description='Action movies')
+        self.movie = Movie.objects.create(
+            title='Test Movie',
+            description='Test',
+            genre=genre,
+            duration=120,
+            release_date=datetime.date(2025, 1, 1),
+        )
+        cinema = Cinema.objects.create(name='Test Cinema')
+        self.room = ScreeningRoom.objects.create(cinema=cinema, name='Room 1', capacity=20, seats_per_row=5)
+        self.show_date = datetime.date.today() + datetime.timedelta(days=1)
+        self.showtime = Showtime.objects.create(
+            movie=self.movie,
+            room=self.room,
+            show_date=self.show_date,
+            show_time=datetime.time(18, 0),
+        )
+        self.client = APIClient()
+
+    def login_staff(self):
+        staff = get_user_model().objects.create_user(username='staff', password='x', is_staff=True)
+        self.client.force_authenticate(staff)
+
+
+class SweepTest(TestCase):
+    def test_new_before_existing(self):
+        new, existing = _Slot(0, 1, 10, 12, 'new'), _Slot(None, 1, 11, 13, 'old')
+        self.assertEqual(_sweep([new, existing]), {0: existing})
+
+    def test_existing_before_new(self):
+        existing, new = _Slot(None, 1, 10, 12, 'old'), _Slot(0, 1, 11, 13, 'new')
+        self.assertEqual(_sweep([new, existing]), {0: existing})
+
+    def test_equal_starts(self):
+        existing, new = _Slot(None, 1, 10, 12, 'old'), _Slot(0, 1, 10, 11, 'new')
+        self.assertEqual(_sweep([new, existing]), {0: existing})
+
+    def test_new_vs_new(self):
+        first, second = _Slot(0, 1, 10, 12, 'first'), _Slot(1, 1, 11, 13, 'second')
+        self.assertEqual(_sweep([second, first]), {1: first})
+
+    def test_back_to_back_shows_do_not_conflict(self):
+        slots = [_Slot(None, 1, 10, 12, 'old'), _Slot(0, 1, 12, 14, 'new'), _Slot(1, 1, 8, 10, 'early')]
+        self.assertEqual(_sweep(slots), {})
+
+
+class BulkScheduleTest(ShowtimeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.login_staff()
+
+    def schedule(self, *times, **extra):
+        return self.client.post('/api/v1/showtimes/bulk/', {
+            'showtimes': [
+                {'movie': self.movie.id, 'room_id': self.room.id, 'show_date': str(self.show_date), 'show_time': show_time}
+                for show_time in times
+            ],
+            **extra,
+        }, format='json')
+
+    def test_new_show_starting_before_an_existing_one_is_rejected(self):
+        # 17:00 + 120 min + cleanup runs into the existing 18:00 show
+        response = self.schedule('10:00', '17:00')
+
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(list(response.json()['showtimes']), ['1'])
+        self.assertEqual(Showtime.objects.count(), 1)
+
+    def test_batch_is_created_in_one_go(self):
+        response = self.schedule('10:00', '13:00', dry_run=True)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Showtime.objects.count(), 1)
+
+        response = self.schedule('10:00', '13:00')
+        self.assertEqual(response.status_code, 201, response.content)
+        created = Showtime.objects.filter(show_time__in=[datetime.time(10), datetime.time(13)])
+        self.assertEqual([showtime.seats_available for showtime in created], [20, 20])
+
+    def test_every_failing_item_gets_its_errors(self):
+        other = ScreeningRoom.objects.create(cinema=self.room.cinema, name='Room 2', capacity=30, seats_per_row=6)
+        response = self.client.post('/api/v1/showtimes/bulk/', {'showtimes': [
+            {'movie': self.movie.id, 'room_id': self.room.id, 'show_date': str(self.show_date), 'show_time': '19:00'},
+            {'movie': self.movie.id, 'room_id': other.id, 'show_date': str(self.show_date), 'show_time': '10:00'},
+            {'movie': self.movie.id, 'room_id': other.id, 'show_date': str(self.show_date), 'show_time': '11:00'},
+            {'movie': 999, 'room_id': other.id, 'show_date': str(self.show_date), 'show_time': '20:00'},
+            {'movie': self.movie.id, 'room_id': other.id, 'show_date': str(self.show_date), 'show_time': '18:00'},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 400, response.content)
+        errors = response.json()['showtimes']
+        # 19:00 runs into the existing show, 11:00 into the 10:00 of the batch, 18:00 in the other room is fine
+        self.assertEqual(sorted(errors), ['0', '2', '3'])
+        self.assertIn('show_time', errors['0'])
+        self.assertIn('show_time', errors['2'])
+        self.assertIn('movie', errors['3'])
+        self.assertEqual(Showtime.objects.count(), 1)
+
+    def test_inactive_showtimes_do_not_block_the_room(self):
+        Showtime.objects.filter(pk=self.showtime.pk).update(is_active=False)
+        self.assertEqual(self.schedule('17:00').status_code, 201)
+
+    def test_batch_is_checked_with_a_fixed_number_of_queries(self):
+        times = ['08:00', '10:30', '13:00', '15:30', '21:00']
+        # movies, rooms, existing showtimes and one insert (inside a savepoint), however big the batch
+        with self.assertNumQueries(6):
+            response = self.schedule(*times)
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_clone_copies_a_period_once(self):
+        clone = {'clone': {'source_date': str(self.show_date), 'target_date': str(self.show_date + datetime.timedelta(days=7)), 'days': 1}}
+
+        response = self.client.post('/api/v1/showtimes/bulk/', clone, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        copy = Showtime.objects.get(show_date=self.show_date + datetime.timedelta(days=7))
+        self.assertEqual((copy.room_id, copy.show_time), (self.room.id, datetime.time(18, 0)))
+
+        self.assertEqual(self.client.post('/api/v1/showtimes/bulk/', clone, format='json').status_code, 400)
+        self.assertEqual(Showtime.objects.count(), 2)
+
+
+class RoomSeatLayoutTest(ShowtimeTestMixin, TestCase):
+    def test_showtimes_of_a_room_share_its_layout(self):
+        other = Showtime.objects.create(movie=self.movie, room=self.room, show_date=self.show_date, show_time=datetime.time(10, 0))
+        first = Showtime.objects.select_related('room').get(pk=self.showtime.pk)
+        second = Showtime.objects.select_related('room').get(pk=other.pk)
+
+        self.assertIs(first.get_seat_layout(), second.get_seat_layout())
+        self.assertEqual(first.get_seat_codes()[:6], ('A1', 'A2', 'A3', 'A4', 'A5', 'B1'))
+
+    def test_seat_map_overlays_booked_and_held_seats_on_the_layout(self):
+        claim_seats(self.showtime.pk, ['A1'])
+        self.showtime.refresh_from_db()
+
+        seat_map = self.showtime.get_seat_map(held_seats={'A1', 'A2'})
+
+        self.assertEqual(len(seat_map), 20)
+        self.assertEqual(seat_map['A1'], {'available': False})
+        self.assertEqual(seat_map['A2'], {'available': False, 'held': True})
+        self.assertEqual(seat_map['A3'], {'available': True})
+
+    def test_full_detail_shows_held_seats(self):
+        cache.clear()
+        claim_seats(self.showtime.pk, ['A1'])
+        hold_seats(Showtime.objects.get(pk=self.showtime.pk), ['A2'])
+
+        data = self.client.get(f'/api/v1/showtimes/{self.showtime.pk}/', {'detail': 'full'}).json()
+
+        self.assertEqual(data['seats_data']['A2'], {'available': False, 'held': True})
+        self.assertEqual(data['available_seats'], 18)
+
+    def test_resized_room_gets_a_new_layout(self):
+        layout = self.room.seat_layout
+        self.room.capacity = 25
+        self.room.save()
+
+        self.assertEqual(self.room.layout_version, 2)
+        self.assertIsNot(self.room.seat_layout, layout)
+        self.assertEqual(len(self.room.seat_layout), 25)
+
+
+class SeatBitmapTest(ShowtimeTestMixin, TestCase):
+    def test_bitmap_round_trips_through_bytes(self):
+        bitmap = SeatBitmap(20)
+        bitmap.book([0, 9, 19])
+        bitmap.release([9])
+
+        restored = SeatBitmap(20, bitmap.to_bytes())
+        self.assertEqual(len(bitmap.to_bytes()), 3)
+        self.assertEqual(restored.booked_indexes(), [0, 19])
+        self.assertEqual((restored.booked_count, restored.available_count), (2, 18))
+        self.assertTrue(restored.is_booked(19))
+        self.assertFalse(restored.is_booked(9))
+
+    def test_stored_bitmap_backs_the_seat_map(self):
+        claim_seats(self.showtime.pk, ['A1', 'B3'])
+        self.showtime.refresh_from_db()
+
+        self.assertEqual(len(bytes(self.showtime.seats_bitmap)), 3)
+        taken = [seat for seat, info in self.showtime.get_seat_map().items() if not info['available']]
+        self.assertEqual(taken, ['A1', 'B3'])
+
+    def test_full_showtime(self):
+        self.assertFalse(SeatBitmap(0).is_full)
+        claim_seats(self.showtime.pk, list(self.showtime.get_seat_codes()))
+        self.showtime.refresh_from_db()
+
+        self.assertTrue(self.showtime.is_full)
+        self.assertTrue(self.showtime.get_seat_bitmap().is_full)
+
+
+class SeatAvailabilityFilterTest(ShowtimeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.sold_out = Showtime.objects.create(
+            movie=self.movie, room=self.room, show_date=self.show_date, show_time=datetime.time(10, 0),
+        )
+        claim_seats(self.sold_out.pk, list(self.sold_out.get_seat_codes()))
+        claim_seats(self.showtime.pk, ['A1', 'A2', 'A3', 'A4', 'A5'])
+
+    def listed(self, **params):
+        response = self.client.get('/api/v1/showtimes/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [result['id'] for result in response.json()['results']]
+
+    def test_counters_follow_the_claims(self):
+        self.showtime.refresh_from_db()
+        self.sold_out.refresh_from_db()
+        self.assertEqual((self.showtime.seats_booked, self.showtime.seats_available), (5, 15))
+        self.assertEqual((self.sold_out.seats_booked, self.sold_out.seats_available), (20, 0))
+
+    def test_list_filters_on_the_counter(self):
+        self.assertEqual(self.listed(available='true'), [self.showtime.id])
+        self.assertEqual(self.listed(available='false'), [self.sold_out.id])
+        self.assertEqual(self.listed(min_seats=15), [self.showtime.id])
+        self.assertEqual(self.listed(min_seats=16), [])
+
+    def test_movie_list_keeps_only_movies_with_a_matching_showtime(self):
+        movies = self.client.get('/api/v1/movies/', {'min_seats': 10}).json()
+        self.assertEqual([showtime['id'] for showtime in movies[0]['showtimes']], [self.showtime.id])
+
+        self.assertEqual(self.client.get('/api/v1/movies/', {'min_seats': 16}).json(), [])
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.client.get('/api/v1/showtimes/', {'min_seats': 'lots'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ShowtimeSeatStateTest(ShowtimeTestMixin, TestCase):
+    def test_stale_save_keeps_claimed_seats(self):
+        stale = Showtime.objects.get(pk=self.showtime.pk)
+        claim_seats(self.showtime.pk, ['A1', 'A2'])
+
+        stale.ticket_price = 15
+        stale.save()
+
+        self.showtime.refresh_from_db()
+        self.assertEqual(self.showtime.ticket_price, 15)
+        self.assertEqual((self.showtime.seats_booked, self.showtime.seats_available), (2, 18))
+        self.assertFalse(self.showtime.get_seat_map()['A1']['available'])
+
+    def test_staff_edit_keeps_claimed_seats(self):
+        self.login_staff()
+        claim_seats(self.showtime.pk, ['A1'])
+
+        response = self.client.patch(f'/api/v1/showtimes/{self.showtime.pk}/', {'ticket_price': '12.00'}, format='json')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.showtime.refresh_from_db()
+        self.assertEqual(self.showtime.seats_booked, 1)
+
+    def test_room_change_resets_seats(self):
+        other = ScreeningRoom.objects.create(cinema=self.room.cinema, name='Room 2', capacity=30, seats_per_row=6)
+        self.showtime.room = other
+        self.showtime.save()
+
+        self.showtime.refresh_from_db()
+        self.assertEqual(self.showtime.seats_available, 30)
+
+    def test_room_change_with_booked_seats_is_rejected(self):
+        self.login_staff()
+        claim_seats(self.showtime.pk, ['A1'])
+        other = ScreeningRoom.objects.create(cinema=self.room.cinema, name='Room 2', capacity=30, seats_per_row=6)
+
+        response = self.client.patch(f'/api/v1/showtimes/{self.showtime.pk}/', {'room_id': other.pk}, format='json')
+
+        self.assertEqual(response.status_code, 400, response.content)
+        self.showtime.refresh_from_db()
+        self.assertEqual((self.showtime.room_id, self.showtime.seats_booked), (self.room.pk, 1))
+
+
+    def test_claim_books_every_seat_or_none(self):
+        claim_seats(self.showtime.pk, ['A1'])
+
+        # the caller's transaction (the booking) is rolled back with a failed claim
+        with self.assertRaises(SeatsUnavailable) as raised, transaction.atomic():
+            claim_seats(self.showtime.pk, ['A2', 'A1'])
+
+        self.assertEqual(raised.exception.seats, ['A1'])
+        self.showtime.refresh_from_db()
+        self.assertEqual((self.showtime.seats_booked, self.showtime.seats_version), (1, 1))
+        self.assertTrue(self.showtime.get_seat_map()['A2']['available'])
+
+    def test_unknown_or_repeated_seats_are_rejected(self):
+        for seats in (['A1', 'Z9'], ['A1', 'A1']):
+            with self.subTest(seats=seats), self.assertRaises(SeatsUnavailable), transaction.atomic():
+                claim_seats(self.showtime.pk, seats)
+
+        self.showtime.refresh_from_db()
+        self.assertEqual(self.showtime.seats_booked, 0)
+
+    def test_release_frees_the_seats(self):
+        claim_seats(self.showtime.pk, ['A1', 'A2'])
+        release_seats(self.showtime.pk, ['A1', 'Z9'])
+
+        self.showtime.refresh_from_db()
+        self.assertEqual((self.showtime.seats_booked, self.showtime.seats_available, self.showtime.seats_version), (1, 19, 2))
+        claim_seats(self.showtime.pk, ['A1'])
+
+
+class MovieDurationTest(ShowtimeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # 18:00 show blocks the room until 20:30, the next one starts at 21:00
+        self.later = Showtime.objects.create(
+            movie=self.movie, room=self.room, show_date=self.show_date, show_time=datetime.time(21, 0),
+        )
+
+    def test_duration_change_moves_the_showtime_windows(self):
+        self.movie.duration = 140
+        self.movie.save()
+
+        self.showtime.refresh_from_db()
+        self.assertEqual(self.showtime.ends_at - self.showtime.starts_at, datetime.timedelta(minutes=170))
+
+    def test_duration_running_into_the_next_show_is_rejected(self):
+        self.movie.duration = 160
+        with self.assertRaises(ValidationError) as raised:
+            self.movie.full_clean()
+
+        self.assertEqual(len(raised.exception.message_dict['duration']), 1)
+        self.movie.refresh_from_db()
+        self.showtime.refresh_from_db()
+        self.assertEqual(self.movie.duration, 120)
+        self.assertEqual(self.showtime.ends_at - self.showtime.starts_at, datetime.timedelta(minutes=150))
+
+    def test_save_of_a_loaded_movie_does_not_read_it_again(self):
+        movie = Movie.objects.get(pk=self.movie.pk)
+        movie.title = 'Renamed'
+        with self.assertNumQueries(1):
+            movie.save()
+
+        movie.duration = 140
+        # UPDATE movie and UPDATE its showtime windows in one savepoint
+        with self.assertNumQueries(4):
+            movie.save()
+
+    def test_admin_form_reports_the_conflict(self):
+        form_class = modelform_factory(Movie, fields=['duration'])
+        form = form_class({'duration': 160}, instance=Movie.objects.get(pk=self.movie.pk))
+
+        self.assertFalse(form.is_valid())
+        self.assertIn('duration', form.errors)
+
+    def test_api_reports_the_conflicting_showtimes(self):
+        self.login_staff()
+        response = self.client.patch(f'/api/v1/movies/{self.movie.pk}/', {'duration': 160}, format='json')
+
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertIn('duration', response.json())
+
+
+@override_settings(ROOM_LAYOUT_SYNC_LIMIT=0, JOBS_RUN_EAGERLY=False)
+class SeatFeedResizeTest(ShowtimeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        self.past = Showtime.objects.create(movie=self.movie, room=self.room, show_date=yesterday, show_time=datetime.time(18, 0))
+        claim_seats(self.past.pk, ['A1'])
+        # the layout sync of the upcoming showtimes is left to the job queue
+        self.room.capacity, self.room.seats_per_row = 30, 6
+        self.room.save()
+
+    def test_stale_upcoming_showtime_is_synced_for_the_snapshot(self):
+        snapshot = seat_changes(self.showtime.pk)
+
+        self.assertTrue(snapshot['full'])
+        self.assertEqual(len(snapshot['seats']), 30)
+        self.assertIn('E6', snapshot['seats'])
+        self.showtime.refresh_from_db()
+        self.assertEqual((self.showtime.layout_version, self.showtime.seats_available), (self.room.layout_version, 30))
+
+    def test_show_over_before_the_resize_has_no_seat_map(self):
+        snapshot = seat_changes(self.past.pk)
+
+        self.assertEqual(snapshot['seats'], {})
+        self.past.refresh_from_db()
+        self.assertEqual((self.past.layout_version, self.past.seats_booked), (1, 1))
+
+
+class SeatFeedTest(ShowtimeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def claim(self, seats):
+        with self.captureOnCommitCallbacks(execute=True):
+            claim_seats(self.showtime.pk, seats)
+
+    def test_first_poll_gets_a_full_snapshot(self):
+        snapshot = seat_changes(self.showtime.pk)
+
+        self.assertEqual((snapshot['version'], snapshot['full']), (0, True))
+        self.assertEqual(len(snapshot['seats']), 20)
+        self.assertTrue(all(snapshot['seats'].values()))
+
+    def test_up_to_date_client_gets_304(self):
+        version = seat_changes(self.showtime.pk)['version']
+
+        response = self.client.get(f'/api/v1/showtimes/{self.showtime.pk}/seats/?since={version}')
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_since_a_version_are_merged_into_one_delta(self):
+        version = seat_changes(self.showtime.pk)['version']
+        self.claim(['A1', 'A2'])
+        with self.captureOnCommitCallbacks(execute=True):
+            release_seats(self.showtime.pk, ['A2'])
+
+        changes = self.client.get(f'/api/v1/showtimes/{self.showtime.pk}/seats/?since={version}').json()
+
+        self.assertEqual(changes, {
+            'showtime': self.showtime.pk, 'version': 2, 'full': False, 'seats': {'A1': False, 'A2': True},
+            'held': [], 'holds': '',
+        })
+
+    def test_held_seats_show_as_taken(self):
+        first = seat_changes(self.showtime.pk)
+        hold = hold_seats(Showtime.objects.get(pk=self.showtime.pk), ['B1', 'B2'])
+
+        url = f'/api/v1/showtimes/{self.showtime.pk}/seats/?since={first["version"]}&holds={first["holds"]}'
+        changes = self.client.get(url).json()
+        self.assertEqual((changes['version'], changes['seats'], changes['held']), (first['version'], {}, ['B1', 'B2']))
+
+        # nothing changed since: 304, until the hold is given back
+        url = f'/api/v1/showtimes/{self.showtime.pk}/seats/?since={changes["version"]}&holds={changes["holds"]}'
+        self.assertEqual(self.client.get(url).status_code, 304)
+        release_hold(self.showtime.pk, hold['hold_token'])
+        self.assertEqual(self.client.get(url).json()['held'], [])
+
+    def test_evicted_change_falls_back_to_a_full_snapshot(self):
+        seat_changes(self.showtime.pk)
+        self.claim(['A1'])
+        self.claim(['A2'])
+        cache.delete(_change_key(self.showtime.pk, 1))
+
+        changes = seat_changes(self.showtime.pk, 0)
+
+        self.assertEqual((changes['version'], changes['full']), (2, True))
+        self.assertFalse(changes['seats']['A1'])
+        self.assertFalse(changes['seats']['A2'])
+
+    def test_lost_head_falls_back_to_a_full_snapshot(self):
+        self.claim(['A1'])
+        cache.clear()
+
+        changes = seat_changes(self.showtime.pk, 0)
+
+        self.assertEqual((changes['version'], changes['full']), (1, True))
+
+    def test_room_change_bumps_the_version_and_resets_the_feed(self):
+        version = seat_changes(self.showtime.pk)['version']
+        other = ScreeningRoom.objects.create(cinema=self.room.cinema, name='Room 2', capacity=30, seats_per_row=6)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.showtime.room = other
+            self.showtime.save()
+
+        changes = seat_changes(self.showtime.pk, version)
+        self.assertEqual((changes['version'], changes['full']), (version + 1, True))
+        self.assertEqual(len(changes['seats']), 30)
+
+    def test_head_never_moves_back_when_commits_publish_out_of_order(self):
+        showtime = Showtime.objects.get(pk=self.showtime.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            for version, seat in ((1, 'A1'), (2, 'A2')):
+                showtime.seats_version = version
+                publish_seat_change(showtime, [seat], available=False)
+        for callback in reversed(callbacks):
+            callback()
+
+        self.assertEqual(cache.get(_head_key(self.showtime.pk)), 2)
+
+    def test_head_is_dropped_when_its_lock_stays_taken(self):
+        cache.set(_head_key(self.showtime.pk), 1)
+        cache.add(f'{_head_key(self.showtime.pk)}:lock', 1)
+
+        with mock.patch('showtimes.seatfeed.time.sleep'):
+            _raise_head(self.showtime.pk, 2)
+
+        self.assertIsNone(cache.get(_head_key(self.showtime.pk)))
+
+    def test_invalid_since_is_rejected(self):
+        response = self.client.get(f'/api/v1/showtimes/{self.showtime.pk}/seats/?since=abc')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(SEAT_HOLD_TTL=600)
+class SeatHoldTest(ShowtimeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def hold(self, *seats):
+        return self.client.post(f'/api/v1/showtimes/{self.showtime.pk}/holds/', {'seats': list(seats)}, format='json')
+
+    def book(self, seats, hold_token=None):
+        data = {
+            'showtime': self.showtime.pk,
+            'customer_name': 'Test Customer',
+            'customer_email': 'customer@example.com',
+            'seats': seats,
+            'number_of_tickets': len(seats),
+        }
+        if hold_token:
+            data['hold_token'] = hold_token
+        return self.client.post('/api/v1/bookings/', data, format='json')
+
+    def later(self, seconds):
+        # locmem cache expiry reads time.time()
+        now = time.time()
+        return mock.patch('django.core.cache.backends.locmem.time.time', return_value=now + seconds)
+
+    def test_held_seats_are_taken_for_everyone_else(self):
+        token = self.hold('A1', 'A2').json()['hold_token']
+
+        self.assertEqual(self.hold('A2', 'B1').status_code, 400)
+        # all or nothing, B1 was given back when A2 failed
+        self.assertEqual(self.hold('B1').status_code, 201)
+
+        self.assertEqual(self.book(['A1']).status_code, 400)
+        self.assertEqual(self.book(['A1'], hold_token=token).status_code, 201)
+
+    def test_booked_seat_cannot_be_held(self):
+        claim_seats(self.showtime.pk, ['A1'])
+        self.assertEqual(self.hold('A1').status_code, 400)
+
+    def test_hold_expires_after_its_ttl(self):
+        token = self.hold('A1').json()['hold_token']
+
+        with self.later(601):
+            self.assertEqual(self.hold('A1').status_code, 201)
+            self.assertEqual(self.client.patch(f'/api/v1/showtimes/{self.showtime.pk}/holds/{token}/').status_code, 404)
+
+    def test_extend_pushes_the_expiry_back(self):
+        token = self.hold('A1').json()['hold_token']
+
+        with self.later(500):
+            self.assertEqual(self.client.patch(f'/api/v1/showtimes/{self.showtime.pk}/holds/{token}/').status_code, 200)
+        with self.later(900):
+            self.assertEqual(self.hold('A1').status_code, 400)
+
+    def test_release_frees_the_seats(self):
+        token = self.hold('A1', 'A2').json()['hold_token']
+
+        response = self.client.delete(f'/api/v1/showtimes/{self.showtime.pk}/holds/{token}/')
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.hold('A1', 'A2').status_code, 201)
+        self.assertEqual(self.client.patch(f'/api/v1/showtimes/{self.showtime.pk}/holds/{token}/').status_code, 404)
+
+
+class ShowtimeListQueryTest(ShowtimeTestMixin, TestCase):
+    """the schedule list is one query per page whatever the page size, detail mode or missing rooms"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        # every other show has no room yet, the serializers must not go looking for one
+        for hour in range(8, 14):
+            Showtime.objects.create(
+                movie=self.movie,
+                room=self.room if hour % 2 else None,
+                show_date=self.show_date,
+                show_time=datetime.time(hour, 0),
+            )
+
+    def test_one_query_per_page(self):
+        for mode in ('summary', 'full'):
+            for page_size in (1, 3, 50):
+                with self.subTest(mode=mode, page_size=page_size), self.assertNumQueries(1):
+                    response = self.client.get('/api/v1/showtimes/', {'detail': mode, 'page_size': page_size})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.json()['results']), min(page_size, 7))
+
+    def test_rooms_are_serialized_when_present(self):
+        results = self.client.get('/api/v1/showtimes/', {'detail': 'full'}).json()['results']
+
+        with_room = [result for result in results if result['room']]
+        without_room = [result for result in results if not result['room']]
+        self.assertEqual((len(with_room), len(without_room)), (4, 3))
+        self.assertEqual(with_room[0]['room']['id'], self.room.id)
+        self.assertEqual(without_room[0]['seats_data'], {})
+
+    def test_next_links_walk_the_schedule_in_show_order(self):
+        seen = []
+        url = '/api/v1/showtimes/?page_size=2'
+        while url:
+            with self.assertNumQueries(1):
+                page = self.client.get(url).json()
+            seen += [result['id'] for result in page['results']]
+            url = page['next']
+
+        expected = Showtime.objects.order_by('starts_at', 'id').values_list('id', flat=True)
+        self.assertEqual(seen, list(expected))
+
+
+class CinemaTimeZoneTest(ShowtimeTestMixin, TestCase):
+    def test_new_zone_moves_the_stored_windows(self):
+        length = self.showtime.ends_at - self.showtime.starts_at
+        cinema = self.room.cinema
+        cinema.timezone = 'Europe/Berlin'
+        cinema.save()
+
+        self.showtime.refresh_from_db()
+        expected = datetime.datetime.combine(self.show_date, datetime.time(18, 0), tzinfo=zoneinfo.ZoneInfo('Europe/Berlin'))
+        self.assertEqual(self.showtime.starts_at, expected)
+        self.assertEqual(self.showtime.ends_at - self.showtime.starts_at, length)
+
+    def test_saving_other_fields_leaves_the_windows_alone(self):
+        cinema = Cinema.objects.get(pk=self.room.cinema_id)
+        cinema.name = 'Renamed'
+        # the cinema UPDATE only, no showtime read or bulk update
+        with self.assertNumQueries(1):
+            cinema.save()
+
+    def test_unknown_zone_is_rejected(self):
+        cinema = Cinema(name='Nowhere', timezone='Mars/Olympus_Mons')
+        with self.assertRaises(ValidationError):
+            cinema.full_clean()
+
+        self.login_staff()
+        response = self.client.post('/api/v1/cinemas/', {'name': 'Nowhere', 'timezone': 'Mars/Olympus_Mons'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('timezone', response.json())
+        self.assertFalse(Cinema.objects.filter(name='Nowhere').exists())
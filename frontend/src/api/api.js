@@ -165,10 +165,32 @@ export const showtimeAPI = {
   // GET all showtimes
   getShowtimes: (detail = 'summary') => api.get(`showtimes/?detail=${detail}`),
 
+  // GET every page of a paginated showtime list (keyset pagination, follows `next` until the last page)
+  getAllPages: async (firstPage) => {
+    const response = await firstPage;
+    if (!response.data.results) return response.data;
+
+    const showtimes = [...response.data.results];
+    let next = response.data.next;
+    while (next) {
+      const page = await api.get(next);
+      showtimes.push(...page.data.results);
+      next = page.data.next;
+    }
+    return showtimes;
+  },
+
   // GET showtime by ID
   getShowtimeDetails: (id, detail = 'summary') =>
     api.get(`showtimes/${id}/?detail=${detail}`),
 
+  // GET seat availability changes since a version and holds tag (304 when nothing changed)
+  getSeatChanges: (id, since, holds = '') =>
+    api.get(`showtimes/${id}/seats/`, {
+      params: since != null ? { since, holds } : {},
+      validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+    }),
+
   // GET showtimes for a specific movie
   getMovieShowtimes: (movieId) => api.get(`showtimes/?movie=${movieId}`),
 
@@ -16,8 +16,10 @@ const useMovieShowtimes = (movieId) => {
     try {
       setLoading(true);
       setError(null);
-      const response = await showtimeAPI.getMovieShowtimes(id);
-      setShowtimes(response.data || []);
+      const showtimeData = await showtimeAPI.getAllPages(
+        showtimeAPI.getMovieShowtimes(id)
+      );
+      setShowtimes(showtimeData || []);
     } catch (err) {
       console.error('Error fetching showtimes:', err);
 
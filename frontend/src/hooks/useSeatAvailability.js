@@ -1,10 +1,19 @@
-import { useState, useCallback } from 'react';
+import { useState, useCallback, useRef } from 'react';
 import { showtimeAPI } from '../api/api';
 
 const useSeatAvailability = () => {
   const [availableSeats, setAvailableSeats] = useState([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  // last seat states per showtime and their version, polls only fetch what changed since.
+  // seats held by other customers come as a separate list (with a tag sent back on the next poll)
+  const seatState = useRef({
+    showtimeId: null,
+    version: null,
+    seats: {},
+    held: [],
+    holds: '',
+  });
 
   const clearError = useCallback(() => setError(null), []);
 
@@ -46,14 +55,28 @@ const useSeatAvailability = () => {
         setLoading(true);
         setError(null);
 
-        const response = await showtimeAPI.getShowtimeDetails(
+        const state = seatState.current;
+        const sameShowtime = state.showtimeId === showtimeId;
+        const response = await showtimeAPI.getSeatChanges(
           showtimeId,
-          'full'
+          sameShowtime ? state.version : null,
+          sameShowtime ? state.holds : ''
         );
 
-        const seatsData = response.data.seats_data || {};
-        const available = Object.entries(seatsData)
-          .filter(([_, seatInfo]) => seatInfo.available)
+        if (response.status !== 304) {
+          const { version, full, seats, held, holds } = response.data;
+          seatState.current = {
+            showtimeId,
+            version,
+            seats: full ? seats : { ...state.seats, ...seats },
+            held: held || [],
+            holds: holds || '',
+          };
+        }
+
+        const held = new Set(seatState.current.held);
+        const available = Object.entries(seatState.current.seats)
+          .filter(([seatCode, isAvailable]) => isAvailable && !held.has(seatCode))
           .map(([seatCode]) => seatCode);
 
         setAvailableSeats(available);
@@ -69,8 +69,9 @@ const useShowtimesCRUD = (user = null) => {
         setLoading(true);
         setError(null);
 
-        const response = await showtimeAPI.getShowtimes(detail);
-        const showtimeData = response.data.results || response.data;
+        const showtimeData = await showtimeAPI.getAllPages(
+          showtimeAPI.getShowtimes(detail)
+        );
         setShowtimes(showtimeData);
         return showtimeData;
       } catch (err) {
@@ -111,8 +112,9 @@ const useShowtimesCRUD = (user = null) => {
         setLoading(true);
         setError(null);
 
-        const response = await showtimeAPI.getMovieShowtimes(movieId);
-        const showtimeData = response.data.results || response.data;
+        const showtimeData = await showtimeAPI.getAllPages(
+          showtimeAPI.getMovieShowtimes(movieId)
+        );
         return showtimeData;
       } catch (err) {
         const errorMessage =